@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Join Stage Benchmark
+--------------------
+Compares the old iterrows()/at[] fill loop against entity_mapper.join on synthetic frames
+and checks that both produce the same CSV output.
+
+    python benchmarks/bench_join.py --rows 20000 --columns 100
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from entity_mapper.join import BQ_ID_RULES, as_key, left_join_prefixed  # noqa: E402
+
+
+def make_frames(rows, columns, match_rate=0.8, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, rows + 1)
+    pb_ids = ids.astype(str)
+    bq_ids = ids.astype(str)
+    # Some input BQ IDs carry leading zeros that only the fallback rules resolve
+    padded = rng.random(rows) < 0.2
+    bq_input = np.where(padded, np.char.zfill(bq_ids, 10), bq_ids)
+    input_df = pd.DataFrame({'pitchbook_id': pb_ids, 'bq_id': bq_input})
+    matched = rng.random(rows) < match_rate
+    data = {f"COL_{i}": rng.integers(0, 1000, matched.sum()) for i in range(columns - 1)}
+    pitchbook_df = pd.DataFrame({'COMPANY_ID': pb_ids[matched], **data})
+    voldemort_df = pd.DataFrame({'BQ_ID': bq_ids[matched], **data})
+    return input_df, pitchbook_df, voldemort_df
+
+
+def legacy_join(input_df, pitchbook_df, voldemort_df):
+    # Copy of the old create_complete_csv loops; the "" columns are pinned to object dtype
+    # because pandas >= 3 would otherwise infer a str column and reject non-string values.
+    blank = pd.Series("", index=input_df.index, dtype=object)
+    result_df = pd.DataFrame()
+    result_df['pitchbook_id'] = input_df.iloc[:, 0].astype(str)
+    result_df['bq_id'] = input_df.iloc[:, 1].astype(str).str.replace("'", "")
+    pb_dict = {}
+    for _, row in pitchbook_df.iterrows():
+        pb_dict[str(row.get('COMPANY_ID', ''))] = row.to_dict()
+    for col in pitchbook_df.columns:
+        result_df[f"pb_{col}"] = blank
+    for idx, row in result_df.iterrows():
+        pb_id = str(row['pitchbook_id'])
+        if pb_id in pb_dict:
+            for col in pitchbook_df.columns:
+                result_df.at[idx, f"pb_{col}"] = pb_dict[pb_id].get(col, '')
+    vd_dict = {}
+    for _, row in voldemort_df.iterrows():
+        vd_dict[str(row.get('BQ_ID', '')).strip()] = row.to_dict()
+    for col in voldemort_df.columns:
+        result_df[f"vd_{col}"] = blank
+    for idx, row in result_df.iterrows():
+        vd_id = str(row['bq_id']).strip()
+        matched_id = None
+        if vd_id in vd_dict:
+            matched_id = vd_id
+        elif vd_id.lstrip('0') in vd_dict:
+            matched_id = vd_id.lstrip('0')
+        elif vd_id.isdigit() and str(int(vd_id)) in vd_dict:
+            matched_id = str(int(vd_id))
+        if matched_id:
+            for col in voldemort_df.columns:
+                result_df.at[idx, f"vd_{col}"] = vd_dict[matched_id].get(col, '')
+    return result_df
+
+
+def vectorized_join(input_df, pitchbook_df, voldemort_df):
+    result_df = pd.DataFrame()
+    result_df['pitchbook_id'] = input_df.iloc[:, 0].astype(str)
+    result_df['bq_id'] = input_df.iloc[:, 1].astype(str).str.replace("'", "")
+    pb_joined, _ = left_join_prefixed(as_key(result_df['pitchbook_id']), pitchbook_df, 'COMPANY_ID', 'pb_')
+    vd_joined, _ = left_join_prefixed(as_key(result_df['bq_id']), voldemort_df, 'BQ_ID', 'vd_',
+                                      strip=True, rules=BQ_ID_RULES)
+    return pd.concat([result_df, pb_joined, vd_joined], axis=1)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def to_csv_text(df):
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the legacy loop join against the vectorized join")
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--columns', type=int, default=50)
+    parser.add_argument('--skip-legacy', action='store_true', help="Only time the vectorized join")
+    args = parser.parse_args()
+
+    frames = make_frames(args.rows, args.columns)
+    print(f"Synthetic input: {args.rows} rows, {args.columns} columns per side table")
+    new_df, new_secs = timed(vectorized_join, *frames)
+    print(f"vectorized: {new_secs:8.3f}s")
+    if args.skip_legacy:
+        return 0
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+        old_df, old_secs = timed(legacy_join, *frames)
+    print(f"legacy:     {old_secs:8.3f}s")
+    print(f"speedup:    {old_secs / new_secs:8.1f}x")
+    if to_csv_text(old_df) != to_csv_text(new_df):
+        print("ERROR: vectorized output differs from legacy output")
+        return 1
+    print("outputs identical")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Pipeline Benchmarks
+-------------------
+Runs the excel, crosswalk and pitchbook-only pipelines end to end against a
+local Snowflake stand-in (benchmarks/standin.py) at fixed synthetic sizes and
+records wall time, throughput, peak memory and per-stage seconds from each
+run report. Results are appended to a JSONL file and compared against the
+last run with the same pipeline, size and options, so regressions show up.
+
+    python benchmarks/bench_pipelines.py --sizes 10k,100k
+    python benchmarks/bench_pipelines.py --sizes 1M --pipelines crosswalk --extra-args="--stream"
+
+Each pipeline runs in its own subprocess so peak RSS is per run. Generated
+databases and input files are cached under --data-dir and reused across runs.
+Input files are .xlsx up to Excel's row limit and Parquet above it, unless
+--input-format says otherwise; the parsed-workbook cache is disabled so every
+run pays the same input_load cost.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks import standin  # noqa: E402
+
+PIPELINES = ('excel', 'crosswalk', 'pitchbook-only')
+INPUT_PIPELINES = ('excel', 'pitchbook-only')
+# Largest data row count an .xlsx sheet can hold below its header
+EXCEL_MAX_ROWS = 1_048_575
+INPUT_FORMATS = ('auto', 'xlsx', 'csv', 'parquet')
+DEFAULT_SIZES = '10k,100k'
+DEFAULT_DATA_DIR = os.path.join(ROOT, 'benchmarks', '.data')
+DEFAULT_RESULTS = os.path.join(ROOT, 'benchmarks', 'results', 'pipelines.jsonl')
+
+
+def parse_size(value):
+    value = value.strip().lower().replace('_', '')
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    try:
+        return int(float(value[:-1] if multiplier > 1 else value) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size {value!r}; use e.g. 10000, 100k or 1M")
+
+
+def parse_sizes(value):
+    return [parse_size(size) for size in value.split(',') if size.strip()]
+
+
+def parse_pipelines(value):
+    pipelines = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = sorted(set(pipelines) - set(PIPELINES))
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown pipeline(s) {unknown}; expected {PIPELINES}")
+    return pipelines
+
+
+def resolve_input_format(input_format, rows):
+    if input_format == 'auto':
+        return 'xlsx' if rows <= EXCEL_MAX_ROWS else 'parquet'
+    if input_format == 'xlsx' and rows > EXCEL_MAX_ROWS:
+        raise ValueError(f"{rows:,} rows don't fit in an Excel sheet; use --input-format csv or parquet")
+    return input_format
+
+
+def input_path(data_dir, rows, input_format):
+    return os.path.join(data_dir, f"input-v{standin.DATA_VERSION}-{rows}.{input_format}")
+
+
+def build_input(db_path, backend, rows, data_dir, input_format):
+    """Write the crosswalk pairs as the two-column ID file the excel pipelines read."""
+    path = input_path(data_dir, rows, input_format)
+    if os.path.exists(path):
+        return path
+    cursor = standin.connector(db_path, backend)(None).cursor()
+    cursor.execute("SELECT PITCHBOOK_ID, BQ_ID FROM PROD.FORAGE.VOLDEMORT_PITCHBOOK_CROSSWALK_TO_VERIFY")
+    pairs = pd.DataFrame(cursor.fetchall(), columns=['pitchbook_id', 'bq_id'])
+    temp_path = f"{path}.tmp.{input_format}"
+    if input_format == 'xlsx':
+        pairs.to_excel(temp_path, index=False)
+    elif input_format == 'csv':
+        pairs.to_csv(temp_path, index=False)
+    else:
+        pairs.to_parquet(temp_path, index=False)
+    os.replace(temp_path, path)
+    return path
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_pipeline(pipeline, rows, db_path, backend, input_file, extra_args, work_dir):
+    """Run one pipeline in a worker subprocess and return its metrics."""
+    output_file = os.path.join(work_dir, f"{pipeline}-{rows}.csv")
+    cli_args = [pipeline, '-o', output_file, '--log-file', '', '--cache-dir', ''] + extra_args
+    if pipeline in INPUT_PIPELINES:
+        cli_args += ['-i', input_file, '--no-input-cache']
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--db', db_path, '--backend', backend,
+               '--', *cli_args]
+    start = time.perf_counter()
+    completed = subprocess.run(command, capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"{pipeline} at {rows} rows failed:\n{completed.stderr[-2000:]}")
+    with open(f"{output_file}.report.json", encoding='utf-8') as f:
+        report = json.load(f)
+    return {
+        'wall_seconds': round(wall_seconds, 3),
+        'run_seconds': report['wall_seconds'],
+        'rows_per_second': round(rows / report['wall_seconds'], 1) if report['wall_seconds'] else None,
+        'peak_rss_mb': report['peak_rss_mb'],
+        'output_bytes': os.path.getsize(output_file),
+        'stages': {name: stats['seconds'] for name, stats in report['stages'].items()},
+    }
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_result(path, record):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def previous_result(results, record):
+    """The most recent earlier run of the same pipeline, size, backend and options."""
+    key = ('pipeline', 'rows', 'backend', 'options')
+    matches = [r for r in results if all(r.get(k) == record[k] for k in key)]
+    return matches[-1] if matches else None
+
+
+def compare(record, previous, threshold):
+    """Print the change against the previous run; returns True if it is a regression."""
+    metrics = record['metrics']
+    line = (f"{record['pipeline']:<15} {record['rows']:>10,} rows  {metrics['run_seconds']:8.2f}s  "
+            f"{metrics['rows_per_second'] or 0:12,.0f} rows/s  {metrics['peak_rss_mb'] or 0:8.1f} MB")
+    if previous is None:
+        print(line)
+        return False
+    before = previous['metrics']['run_seconds']
+    change = (metrics['run_seconds'] - before) / before if before else 0.0
+    regressed = change > threshold
+    print(f"{line}  {change:+.1%} vs {previous.get('commit') or 'previous'}" + ("  REGRESSION" if regressed else ""))
+    if regressed:
+        stage_before = previous['metrics'].get('stages', {})
+        for name, seconds in metrics['stages'].items():
+            if name in stage_before and seconds - stage_before[name] > 0.1:
+                print(f"    {name}: {stage_before[name]:.2f}s -> {seconds:.2f}s")
+    return regressed
+
+
+def worker(argv):
+    """Subprocess entry point: run the CLI against the stand-in database."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--backend', required=True)
+    parser.add_argument('cli_args', nargs=argparse.REMAINDER)
+    args = parser.parse_args(argv)
+    cli_args = args.cli_args[1:] if args.cli_args[:1] == ['--'] else args.cli_args
+    from entity_mapper.cli import main as cli_main
+    return cli_main(cli_args, connect=standin.connector(args.db, args.backend))
+
+
+def main():
+    if sys.argv[1:2] == ['--worker']:
+        return worker(sys.argv[2:])
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=parse_sizes, default=parse_sizes(DEFAULT_SIZES),
+                        help="Comma-separated row counts, e.g. 10k,100k,1M,10M")
+    parser.add_argument('--pipelines', type=parse_pipelines, default=list(PIPELINES))
+    parser.add_argument('--backend', choices=(standin.DUCKDB, standin.SQLITE), default=standin.default_backend())
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="Where generated databases are cached")
+    parser.add_argument('--filler-columns', type=int, default=standin.DEFAULT_FILLER_COLUMNS,
+                        help="Extra columns per source table, to make rows realistically wide")
+    parser.add_argument('--input-format', choices=INPUT_FORMATS, default='auto',
+                        help="ID file for the excel pipelines; auto is xlsx up to Excel's row limit, Parquet above")
+    parser.add_argument('--extra-args', default='', help="Extra entity_mapper CLI arguments, e.g. '--stream'")
+    parser.add_argument('--results', default=DEFAULT_RESULTS, help="JSONL file results are appended to")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Slowdown vs the previous run that counts as a regression")
+    parser.add_argument('--fail-on-regression', action='store_true', help="Exit 1 if any run regressed")
+    parser.add_argument('--no-save', action='store_true', help="Compare without appending results")
+    args = parser.parse_args()
+
+    extra_args = shlex.split(args.extra_args)
+    results = load_results(args.results)
+    regressions = 0
+    commit = git_commit()
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in args.sizes:
+            start = time.perf_counter()
+            db_path = standin.build_database(
+                standin.database_path(args.data_dir, rows, args.backend, args.filler_columns),
+                rows, args.backend, args.filler_columns)
+            input_file = None
+            input_format = resolve_input_format(args.input_format, rows)
+            if any(p in INPUT_PIPELINES for p in args.pipelines):
+                input_file = build_input(db_path, args.backend, rows, args.data_dir, input_format)
+            print(f"# {rows:,} rows: data ready in {time.perf_counter() - start:.1f}s ({db_path})")
+            for pipeline in args.pipelines:
+                metrics = run_pipeline(pipeline, rows, db_path, args.backend, input_file, extra_args, work_dir)
+                record = {
+                    'timestamp': datetime.now(timezone.utc).isoformat(),
+                    'commit': commit,
+                    'python': platform.python_version(),
+                    'backend': args.backend,
+                    'pipeline': pipeline,
+                    'rows': rows,
+                    'options': {'filler_columns': args.filler_columns, 'extra_args': extra_args,
+                                'input_format': input_format if pipeline in INPUT_PIPELINES else None},
+                    'metrics': metrics,
+                }
+                regressions += compare(record, previous_result(results, record), args.threshold)
+                if not args.no_save:
+                    append_result(args.results, record)
+                    results.append(record)
+    if regressions and args.fail_on_regression:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Local Snowflake Stand-in
+------------------------
+A DuckDB (or, without duckdb, SQLite) database file loaded with synthetic
+COMPANY_DATA_FEED, COMPANY_COMMON, VOLDEMORT_FIRMOGRAPHICS and crosswalk
+tables, plus a connect(config) that mimics snowflake.connector closely enough
+for entity_mapper: %s parameters, cursor.description, fetchall/fetchmany,
+fetch_pandas_batches (DuckDB only) and cursor.sfqid.
+
+    from benchmarks.standin import build_database, connector
+    path = build_database('bench-100k.duckdb', rows=100_000)
+    main(['crosswalk', '-o', 'out.csv'], connect=connector(path))
+"""
+
+import functools
+import os
+import re
+import sqlite3
+import uuid
+
+DUCKDB = 'duckdb'
+SQLITE = 'sqlite'
+# Bumped whenever the generated data changes, so cached databases are rebuilt
+DATA_VERSION = 1
+DEFAULT_FILLER_COLUMNS = 20
+
+# PROD.<SCHEMA>.<TABLE> -> <SCHEMA>__<TABLE>; neither backend needs a PROD catalog then
+_TABLE_RE = re.compile(r'\b(?:PROD\.)?(PITCHBOOK|VOLDEMORT|FORAGE)\.(\w+)', re.IGNORECASE)
+
+PITCHBOOK_FEED = 'PITCHBOOK__COMPANY_DATA_FEED'
+PITCHBOOK_COMMON = 'PITCHBOOK__COMPANY_COMMON'
+VOLDEMORT = 'VOLDEMORT__VOLDEMORT_FIRMOGRAPHICS'
+CROSSWALK = 'FORAGE__VOLDEMORT_PITCHBOOK_CROSSWALK_TO_VERIFY'
+
+
+def default_backend():
+    try:
+        import duckdb  # noqa: F401
+        return DUCKDB
+    except ImportError:
+        return SQLITE
+
+
+def translate(query):
+    """Rewrite a Snowflake query from entity_mapper into the stand-in's dialect."""
+    query = _TABLE_RE.sub(lambda m: f"{m.group(1).upper()}__{m.group(2).upper()}", query)
+    # SEQ8() numbers rows as they are read; both backends number an unordered window in scan order
+    return query.replace('SEQ8()', '(ROW_NUMBER() OVER () - 1)').replace('%s', '?')
+
+
+def _rows_sql(rows, backend):
+    if backend == DUCKDB:
+        # DuckDB's recursive CTEs are slow at millions of rows; range() is not
+        return f"SELECT range AS i FROM range({rows})"
+    return f"""
+    WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i < {rows - 1})
+    SELECT i FROM seq
+    """
+
+
+def _filler_sql(count):
+    columns = []
+    for n in range(count):
+        if n % 2:
+            columns.append(f"'v' || CAST((i * {n + 7}) % 1000 AS VARCHAR) AS F{n:02d}")
+        else:
+            columns.append(f"(i * {n + 3}) % 100000 AS F{n:02d}")
+    return (', ' + ', '.join(columns)) if columns else ''
+
+
+def _table_sql(rows, filler_columns, backend):
+    """CREATE TABLE ... AS SELECT statements for the synthetic tables."""
+    seq = _rows_sql(rows, backend)
+    word = "CASE i % 5 WHEN 0 THEN 'Labs' WHEN 1 THEN 'Systems' WHEN 2 THEN 'Capital' WHEN 3 THEN 'Health' ELSE 'Data' END"
+    country = "CASE i % 4 WHEN 0 THEN 'US' WHEN 1 THEN 'GB' WHEN 2 THEN 'DE' ELSE 'FR' END"
+    filler = _filler_sql(filler_columns)
+    pitchbook = f"""
+    SELECT CAST(100000 + i AS VARCHAR) || '-' || CAST(10 + i % 90 AS VARCHAR) AS COMPANY_ID,
+           'Company ' || CAST(i AS VARCHAR) || ' ' || {word} || ', Inc.' AS COMPANY_NAME,
+           'https://www.company' || CAST(i AS VARCHAR) || '.com' AS WEBSITE,
+           {country} AS HQ_COUNTRY,
+           'City ' || CAST(i % 500 AS VARCHAR) AS HQ_CITY,
+           1950 + i % 70 AS YEAR_FOUNDED,
+           1 + (i * 37) % 20000 AS EMPLOYEES{filler}
+    FROM ({seq}) s
+    """
+    voldemort = f"""
+    SELECT CAST(i AS VARCHAR) AS BQ_ID,
+           'COMPANY ' || CAST(i AS VARCHAR) || ' ' || {word} AS NAME,
+           'company' || CAST(i AS VARCHAR) || '.com' AS DOMAIN,
+           {country} AS COUNTRY,
+           'City ' || CAST(i % 500 AS VARCHAR) AS CITY,
+           CAST(1950 + (i + i % 3) % 70 AS VARCHAR) AS FOUNDED_YEAR,
+           1 + (i * 41) % 20000 AS EMPLOYEE_COUNT{filler}
+    FROM ({seq}) s
+    """
+    # Every 10th pair carries a zero-padded BQ_ID and every 20th points at an ID that doesn't exist
+    crosswalk = f"""
+    SELECT CAST(100000 + i AS VARCHAR) || '-' || CAST(10 + i % 90 AS VARCHAR) AS PITCHBOOK_ID,
+           CASE WHEN i % 20 = 1 THEN CAST(i + {rows * 2} AS VARCHAR)
+                WHEN i % 10 = 0 THEN '00' || CAST(i AS VARCHAR)
+                ELSE CAST(i AS VARCHAR) END AS BQ_ID
+    FROM ({seq}) s
+    """
+    return {
+        PITCHBOOK_FEED: pitchbook,
+        PITCHBOOK_COMMON: pitchbook,
+        VOLDEMORT: voldemort,
+        CROSSWALK: crosswalk,
+    }
+
+
+def database_path(data_dir, rows, backend, filler_columns=DEFAULT_FILLER_COLUMNS):
+    extension = 'duckdb' if backend == DUCKDB else 'sqlite'
+    return os.path.join(data_dir, f"standin-v{DATA_VERSION}-{rows}-f{filler_columns}.{extension}")
+
+
+def build_database(path, rows, backend=None, filler_columns=DEFAULT_FILLER_COLUMNS):
+    """Create the synthetic tables at path unless it already exists; returns path."""
+    backend = backend or default_backend()
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    conn = _open(temp_path, backend, read_only=False)
+    try:
+        for table, select in _table_sql(rows, filler_columns, backend).items():
+            conn.execute(f"CREATE TABLE {table} AS {select}")
+        if backend == SQLITE:
+            # DuckDB scans fast enough without; SQLite needs indexes for the IN-list lookups
+            for table, column in ((PITCHBOOK_FEED, 'COMPANY_ID'), (PITCHBOOK_COMMON, 'COMPANY_ID'), (VOLDEMORT, 'BQ_ID')):
+                conn.execute(f"CREATE INDEX {table}_{column} ON {table} ({column})")
+            conn.commit()
+    finally:
+        conn.close()
+    os.replace(temp_path, path)
+    return path
+
+
+def _open(path, backend, read_only=True):
+    if backend == DUCKDB:
+        import duckdb
+        return duckdb.connect(path, read_only=read_only)
+    uri = f"file:{path}?mode=ro" if read_only else f"file:{path}"
+    return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+
+class StandinCursor:
+    def __init__(self, conn, backend):
+        self._backend = backend
+        self._cursor = conn.cursor()
+        self.description = None
+        self.sfqid = None
+
+    def execute(self, query, params=None):
+        self.sfqid = str(uuid.uuid4())
+        self._cursor.execute(translate(query), list(params) if params else [])
+        self.description = self._cursor.description
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    def fetch_pandas_batches(self, **kwargs):
+        if self._backend != DUCKDB:
+            raise NotImplementedError("Arrow batches need the DuckDB backend")
+        reader = self._cursor.fetch_record_batch(50000)
+        options = {'integer_object_nulls': kwargs.get('integer_object_nulls', False)}
+        return (batch.to_pandas(**options) for batch in reader)
+
+    def close(self):
+        self._cursor.close()
+
+
+class StandinConnection:
+    def __init__(self, path, backend):
+        self._backend = backend
+        self._conn = _open(path, backend)
+
+    def cursor(self):
+        return StandinCursor(self._conn, self._backend)
+
+    def close(self):
+        self._conn.close()
+
+
+def _connect(path, backend, config):
+    return StandinConnection(path, backend)
+
+
+def connector(path, backend=None):
+    """
+    A connect(config) for entity_mapper.cli.main / ConnectionPool that opens the stand-in at path.
+    It is a partial of a module-level function, so --shards worker processes can unpickle it.
+    """
+    return functools.partial(_connect, path, backend or default_backend())
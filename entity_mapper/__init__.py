@@ -0,0 +1,5 @@
+"""
+Entity Mapper
+-------------
+Shared building blocks for the Pitchbook / Voldemort mapping scripts.
+"""
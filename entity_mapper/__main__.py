@@ -0,0 +1,4 @@
+import sys
+from entity_mapper.cli import main
+
+sys.exit(main())
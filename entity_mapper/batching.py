@@ -0,0 +1,86 @@
+"""
+ID Batching
+-----------
+Splits long ID lists into fixed-size chunks and fetches them with bound
+parameters instead of one giant f-string IN (...) literal. Chunks run
+concurrently on separate cursors, so statement size, compile time and
+per-query memory stay flat as the ID list grows. A failed chunk is retried
+with backoff, and with a checkpoint every completed chunk is kept on disk so
+a rerun only queries the rest.
+"""
+
+import logging
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from entity_mapper.cache import fetch_through_cache
+from entity_mapper.connection import DEFAULT_QUERY_RETRIES, DEFAULT_RETRY_BACKOFF, call_with_retries
+from entity_mapper.report import in_context
+from entity_mapper.streaming import concat_frames
+
+# Snowflake caps an IN list at 16,384 expressions; stay well below it
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_MAX_WORKERS = 4
+
+
+def unique_ids(ids):
+    """Drop duplicate IDs while keeping first-seen order."""
+    return list(dict.fromkeys(ids))
+
+
+def chunked(items, size):
+    if size < 1:
+        raise ValueError(f"Chunk size must be at least 1, got {size}")
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def in_list_query(select_sql, id_col, count, extra_where=None):
+    """Append a parameterized WHERE id_col IN (%s, ...) clause with count placeholders."""
+    placeholders = ', '.join(['%s'] * count)
+    query = f"{select_sql.rstrip()}\n    WHERE {id_col} IN ({placeholders})"
+    if extra_where:
+        query += f" AND {extra_where}"
+    return query
+
+
+def fetch_by_ids(conn, execute_query, select_sql, id_col, ids, description,
+                 chunk_size=DEFAULT_CHUNK_SIZE, max_workers=DEFAULT_MAX_WORKERS,
+                 cache=None, cache_table=None, watermark_col=None,
+                 retries=DEFAULT_QUERY_RETRIES, retry_backoff=DEFAULT_RETRY_BACKOFF, checkpoint=None):
+    """
+    Run select_sql once per chunk of ids and concatenate the results in chunk order.
+    execute_query(conn, query, description, params) is the calling script's query helper
+    and must raise on failure. With a cache, only IDs missing from (or stale in) cache_table
+    are queried; with a checkpoint, chunks completed by an earlier attempt are not.
+    """
+    def execute_batch(query, batch_description, params):
+        return call_with_retries(lambda: execute_query(conn, query, batch_description, params),
+                                 retries, retry_backoff, batch_description)
+    if checkpoint is not None:
+        execute_batch = partial(checkpoint.run, execute_batch)
+    if cache is not None:
+        def fetch_rows(missing_ids, since=None):
+            extra = {} if since is None else {'extra_where': f"{watermark_col} > %s", 'extra_params': [since]}
+            return _fetch_batches(execute_batch, select_sql, id_col, missing_ids, description,
+                                  chunk_size, max_workers, **extra)
+        return fetch_through_cache(cache, cache_table, id_col, ids, fetch_rows, watermark_col=watermark_col)
+    return _fetch_batches(execute_batch, select_sql, id_col, ids, description, chunk_size, max_workers)
+
+
+def _fetch_batches(execute_batch, select_sql, id_col, ids, description, chunk_size, max_workers,
+                   extra_where=None, extra_params=()):
+    ids = unique_ids(ids)
+    if not ids:
+        return pd.DataFrame()
+    chunks = list(chunked(ids, chunk_size))
+    logging.info(f"{description}: {len(ids)} IDs in {len(chunks)} batches of up to {chunk_size}")
+    workers = max(1, min(max_workers, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='id-batch') as pool:
+        futures = [
+            pool.submit(in_context(execute_batch), in_list_query(select_sql, id_col, len(chunk), extra_where),
+                        f"{description} (batch {i + 1}/{len(chunks)})", list(chunk) + list(extra_params))
+            for i, chunk in enumerate(chunks)
+        ]
+        frames = [future.result() for future in futures]
+    return concat_frames(frames)
@@ -0,0 +1,224 @@
+"""
+Source Table Cache
+------------------
+On-disk cache of Snowflake rows keyed by table and ID, stored as Parquet
+segments plus a per-table key index. Fetch functions read fresh entries from
+here and only query Snowflake for IDs that are missing or older than the TTL.
+When a table has a watermark column (e.g. a last-updated timestamp), stale
+IDs are refreshed with a delta query that only returns rows changed since
+the oldest of their cached watermarks.
+
+Every index read-modify-write holds an flock on the table's index.lock, so
+processes sharing a cache directory (--shards workers) don't lose each
+other's updates. Without fcntl (Windows) the lock only covers this process.
+
+Layout:
+    <cache_dir>/<TABLE>/index.parquet       key, segment, fetched_at, found
+    <cache_dir>/<TABLE>/index.lock          held while the index or segments change
+    <cache_dir>/<TABLE>/seg-<ts>-<id>.parquet   cached rows plus a __key column
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import pandas as pd
+from entity_mapper.streaming import concat_frames
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+KEY_COL = '__key'
+INDEX_FILE = 'index.parquet'
+LOCK_FILE = 'index.lock'
+_process_lock = threading.Lock()
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+
+
+class TableCache:
+    def __init__(self, cache_dir, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+    def _table_dir(self, table):
+        path = os.path.join(self.cache_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', table))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @contextmanager
+    def _locked(self, table, exclusive=True):
+        """Hold the table's index lock (shared for reads) for the duration of the block."""
+        if fcntl is None:
+            with _process_lock:
+                yield
+            return
+        with open(os.path.join(self._table_dir(table), LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load_index(self, table):
+        path = os.path.join(self._table_dir(table), INDEX_FILE)
+        if not os.path.exists(path):
+            return pd.DataFrame({'key': pd.Series(dtype=object), 'segment': pd.Series(dtype=object),
+                                 'fetched_at': pd.Series(dtype='float64'), 'found': pd.Series(dtype=bool)})
+        return pd.read_parquet(path)
+
+    def _save_index(self, table, index):
+        path = os.path.join(self._table_dir(table), INDEX_FILE)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        index.reset_index(drop=True).to_parquet(temp_path, index=False)
+        os.replace(temp_path, path)
+
+    def lookup(self, table, keys):
+        """Split keys into (fresh, stale, missing) lists by their cache state."""
+        with self._locked(table, exclusive=False):
+            index = self._load_index(table).set_index('key')
+        cached = index.reindex(pd.Index(keys, dtype=object))
+        known = cached['fetched_at'].notna()
+        fresh = known & (time.time() - cached['fetched_at'] <= self.ttl_seconds)
+        keys = pd.Series(cached.index, dtype=object)
+        return (keys[fresh.to_numpy()].tolist(),
+                keys[(known & ~fresh).to_numpy()].tolist(),
+                keys[(~known).to_numpy()].tolist())
+
+    def read_rows(self, table, keys):
+        """Return the cached rows for keys (IDs cached as not-found contribute no rows)."""
+        import pyarrow.parquet as pq
+        if not keys:
+            return pd.DataFrame()
+        table_dir = self._table_dir(table)
+        frames = []
+        # Shared lock: another process's eviction can't delete a segment mid-read
+        with self._locked(table, exclusive=False):
+            index = self._load_index(table)
+            index = index[index['key'].isin(keys) & index['found']]
+            for segment, segment_keys in index.groupby('segment')['key']:
+                rows = pq.read_table(os.path.join(table_dir, segment),
+                                     filters=[(KEY_COL, 'in', segment_keys.tolist())]).to_pandas()
+                frames.append(rows.drop(columns=[KEY_COL]))
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def store(self, table, keys, df, key_col):
+        """Cache the rows of df for keys; keys without a row are cached as not found."""
+        if not keys:
+            return
+        now = time.time()
+        table_dir = self._table_dir(table)
+        segment = None
+        found_keys = set()
+        entries = pd.DataFrame({'key': pd.Series(keys, dtype=object)})
+        # The segment is written under the lock too, so no eviction sees it unreferenced
+        with self._locked(table):
+            if len(df):
+                row_keys = df[key_col].map(str)
+                found_keys = set(row_keys)
+                segment = f"seg-{int(now)}-{uuid.uuid4().hex[:8]}.parquet"
+                temp_path = os.path.join(table_dir, f"{segment}.tmp")
+                df.assign(**{KEY_COL: row_keys.to_numpy()}).to_parquet(temp_path, index=False)
+                os.replace(temp_path, os.path.join(table_dir, segment))
+            entries['found'] = entries['key'].isin(found_keys)
+            entries['segment'] = pd.Series(segment, index=entries.index, dtype=object).where(entries['found'], None)
+            entries['fetched_at'] = now
+            index = self._load_index(table)
+            index = index[~index['key'].isin(entries['key'])]
+            self._save_index(table, pd.concat([index, entries[index.columns]], ignore_index=True))
+            self._evict(table)
+
+    def touch(self, table, keys):
+        """Mark keys as freshly verified without rewriting their rows."""
+        if not keys:
+            return
+        with self._locked(table):
+            index = self._load_index(table)
+            index.loc[index['key'].isin(keys), 'fetched_at'] = time.time()
+            self._save_index(table, index)
+
+    def evict(self, table):
+        """Delete unreferenced segments, then the oldest segments until the cache fits max_bytes."""
+        with self._locked(table):
+            self._evict(table)
+
+    def _evict(self, table):
+        table_dir = self._table_dir(table)
+        index = self._load_index(table)
+        referenced = set(index['segment'].dropna())
+        for name in os.listdir(table_dir):
+            if name.startswith('seg-') and name.endswith('.parquet') and name not in referenced:
+                os.remove(os.path.join(table_dir, name))
+        sizes = {segment: os.path.getsize(os.path.join(table_dir, segment)) for segment in referenced}
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+        age = index.dropna(subset=['segment']).groupby('segment')['fetched_at'].max().sort_values()
+        evicted = []
+        for segment in age.index:
+            if total <= self.max_bytes:
+                break
+            total -= sizes[segment]
+            evicted.append(segment)
+        index = index[~index['segment'].isin(evicted)]
+        self._save_index(table, index)
+        for segment in evicted:
+            os.remove(os.path.join(table_dir, segment))
+        logging.info(f"Cache eviction for {table}: removed {len(evicted)} segments")
+
+
+def fetch_through_cache(cache, table, key_col, ids, fetch_rows, watermark_col=None):
+    """
+    Return rows for ids, reading fresh entries from the cache and calling
+    fetch_rows(ids, since=None) for the rest. With a watermark column, stale
+    IDs are refreshed by fetch_rows(stale_ids, since=<oldest of their cached
+    watermarks>), so each ID's own changes are included. IDs absent from that
+    delta keep their cached rows; IDs in it, and stale IDs with no cached
+    watermark, get a full fetch (an ID may have several rows, only some of
+    them changed).
+    """
+    ids = list(dict.fromkeys(str(i) for i in ids))
+    if cache is None:
+        return fetch_rows(ids)
+    fresh, stale, missing = cache.lookup(table, ids)
+    frames = [cache.read_rows(table, fresh)]
+    to_fetch = missing + stale
+    stale_rows = cache.read_rows(table, stale) if stale and watermark_col else pd.DataFrame()
+    if watermark_col in stale_rows.columns:
+        row_keys = stale_rows[key_col].map(str)
+        # IDs with a watermark on every cached row; the rest (and IDs cached as not found) get a full fetch
+        unmarked = set(row_keys[stale_rows[watermark_col].isna()])
+        marked = [key for key in stale if key in set(row_keys) and key not in unmarked]
+        if marked:
+            marked_rows = row_keys.isin(marked)
+            delta = fetch_rows(marked, since=stale_rows.loc[marked_rows, watermark_col].min())
+            changed = set(delta[key_col].map(str)) if len(delta) else set()
+            unchanged_rows = stale_rows[marked_rows & ~row_keys.isin(changed)]
+            unchanged = set(unchanged_rows[key_col].map(str))
+            # A changed ID is fetched in full: the delta only has its changed rows, not its unchanged ones
+            to_fetch = missing + [key for key in stale if key not in marked or key in changed]
+            cache.touch(table, sorted(unchanged))
+            frames.append(unchanged_rows)
+    logging.info(f"Cache for {table}: {len(fresh)} fresh, {len(stale)} stale, {len(missing)} missing IDs")
+    if to_fetch:
+        fetched = fetch_rows(to_fetch)
+        # A column-less frame means no batch ran; don't cache its IDs as not found
+        if len(fetched.columns):
+            cache.store(table, to_fetch, fetched, key_col)
+        frames.append(fetched)
+    return concat_frames([frame for frame in frames if len(frame.columns)])
+
+
+def open_cache(cache_dir, ttl_hours=DEFAULT_TTL_SECONDS / 3600, max_gb=DEFAULT_MAX_BYTES / 1024 ** 3):
+    """Return a TableCache for cache_dir, or None when caching is disabled."""
+    if not cache_dir:
+        return None
+    return TableCache(cache_dir, ttl_seconds=ttl_hours * 3600, max_bytes=int(max_gb * 1024 ** 3))
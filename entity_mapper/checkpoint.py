@@ -0,0 +1,133 @@
+"""
+Batch Checkpoints
+-----------------
+Persists the result of every ID batch query as it completes, with a JSON
+manifest, so a run that dies halfway (dropped connection, killed process)
+picks up where it left off: rerunning the same command with the same
+checkpoint directory loads completed batches from disk and only queries the
+rest. Batches are keyed by a hash of their SQL and bound parameters, so a
+batch is reused only when it would run the exact same query.
+
+Results are pickled rather than written as Parquet so dtypes round-trip
+exactly and a resumed run writes byte-identical output. The directory is
+removed once the run succeeds.
+
+Layout:
+    <checkpoint_dir>/manifest.json      batch key -> description, rows, file, completed_at
+    <checkpoint_dir>/<key>.pkl          the batch's DataFrame
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+import pandas as pd
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# One instance per directory, so concurrent side fetches share a manifest
+_open_checkpoints = {}
+_open_lock = threading.Lock()
+
+
+def batch_key(query, params):
+    payload = json.dumps([query, [str(param) for param in params or ()]])
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+class BatchCheckpoint:
+    def __init__(self, checkpoint_dir):
+        self.checkpoint_dir = checkpoint_dir
+        self._lock = threading.Lock()
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self._manifest = self._load_manifest()
+        self.resumed = 0
+
+    def _manifest_path(self):
+        return os.path.join(self.checkpoint_dir, MANIFEST_FILE)
+
+    def _load_manifest(self):
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return {'version': MANIFEST_VERSION, 'batches': {}}
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            logging.warning(f"Ignoring checkpoint manifest {path} from another version")
+            return {'version': MANIFEST_VERSION, 'batches': {}}
+        return manifest
+
+    def _save_manifest(self):
+        path = self._manifest_path()
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._manifest, f, indent=1)
+        os.replace(temp_path, path)
+
+    def __len__(self):
+        return len(self._manifest['batches'])
+
+    def load(self, query, params):
+        """The checkpointed result of a batch, or None if it has not completed."""
+        entry = self._manifest['batches'].get(batch_key(query, params))
+        if entry is None:
+            return None
+        path = os.path.join(self.checkpoint_dir, entry['file'])
+        try:
+            df = pd.read_pickle(path)
+        except (OSError, EOFError, ValueError) as e:
+            logging.warning(f"Checkpointed batch {entry['file']} is unreadable, fetching it again: {e}")
+            return None
+        with self._lock:
+            self.resumed += 1
+        return df
+
+    def save(self, query, params, description, df):
+        key = batch_key(query, params)
+        file_name = f"{key}.pkl"
+        path = os.path.join(self.checkpoint_dir, file_name)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        df.to_pickle(temp_path)
+        os.replace(temp_path, path)
+        # The manifest only lists batches whose file is complete
+        with self._lock:
+            self._manifest['batches'][key] = {'description': description, 'rows': len(df), 'file': file_name,
+                                              'completed_at': time.time()}
+            self._save_manifest()
+
+    def run(self, execute, query, description, params):
+        """execute(query, description, params) unless the batch is already checkpointed."""
+        df = self.load(query, params)
+        if df is not None:
+            logging.info(f"{description}: resumed {len(df)} rows from checkpoint")
+            return df
+        df = execute(query, description, params)
+        self.save(query, params, description, df)
+        return df
+
+
+def open_checkpoint(checkpoint_dir):
+    """Return a BatchCheckpoint for checkpoint_dir, or None when checkpointing is disabled."""
+    if not checkpoint_dir:
+        return None
+    path = os.path.abspath(checkpoint_dir)
+    with _open_lock:
+        if path not in _open_checkpoints:
+            _open_checkpoints[path] = BatchCheckpoint(path)
+        return _open_checkpoints[path]
+
+
+def clear_checkpoint(checkpoint_dir):
+    """Remove a finished run's checkpoints."""
+    if not checkpoint_dir:
+        return
+    with _open_lock:
+        _open_checkpoints.pop(os.path.abspath(checkpoint_dir), None)
+    if os.path.isdir(checkpoint_dir):
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        logging.info(f"Removed checkpoint directory {checkpoint_dir}")
@@ -0,0 +1,373 @@
+"""
+Entity Mapper CLI
+-----------------
+One entry point for all mapping jobs:
+
+    python -m entity_mapper excel -i input.xlsx -o output.csv -a ACCOUNT -u USER -p PASSWORD -w WAREHOUSE -r ROLE
+    python -m entity_mapper crosswalk -u USER -p PASSWORD
+    python -m entity_mapper crosswalk --verify
+    python -m entity_mapper pitchbook-only -i input.xlsx
+    python -m entity_mapper fuzzy-match --top-k 3 --min-score 0.6
+    python -m entity_mapper serve --port 8765
+
+Credentials fall back to the SNOWFLAKE_ACCOUNT/USER/PASSWORD/WAREHOUSE/ROLE
+environment variables.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from entity_mapper.checkpoint import clear_checkpoint
+from entity_mapper.config import DEFAULT_LOG_FILE, MapperConfig, default_output_file, resolve_table
+from entity_mapper.connection import ConnectionPool, connect_to_snowflake
+from entity_mapper.inputs import load_input_data
+from entity_mapper.join import ALL, LAST, parse_dedup_policy
+from entity_mapper.outofcore import JOIN_BACKENDS, PANDAS, require_backend
+from entity_mapper.pipeline import MATCH_SIDES, run_crosswalk, run_excel, run_fuzzy_match, run_pitchbook_only
+from entity_mapper.report import PROFILERS, RunReport, default_report_file, log_summary, stage
+from entity_mapper.service import run_service
+from entity_mapper.sharding import SHARDED_COMMANDS, run_sharded
+from entity_mapper.sources import check_columns
+from entity_mapper.verify import VERIFY_FIELD_CANDIDATES
+
+# Subcommand -> (default output prefix, Snowflake application name, description)
+SUBCOMMANDS = {
+    'excel': ('entity_mapping', 'EntityMapper',
+              "Pitchbook COMPANY_DATA_FEED + Voldemort VOLDEMORT_FIRMOGRAPHICS rows for the IDs in an input sheet"),
+    'crosswalk': ('crosswalk_entity_mapping', 'EntityMapper',
+                  "Pitchbook COMPANY_COMMON + Voldemort VOLDEMORT_FIRMOGRAPHICS rows for every crosswalk pair"),
+    'pitchbook-only': ('pitchbook_only_mapping', 'PitchbookOnlyMapper',
+                       "Pitchbook COMPANY_DATA_FEED rows for the IDs in an input sheet"),
+    'fuzzy-match': ('crosswalk_fuzzy_candidates', 'EntityMapper',
+                    "Scored name/domain/country candidates for crosswalk rows whose ID has no match on one side"),
+    'serve': ('entity_lookup', 'EntityMapperService',
+              "Resident HTTP lookup service for COMPANY_DATA_FEED and VOLDEMORT_FIRMOGRAPHICS rows by ID, "
+              "with warm connections and an LRU cache"),
+}
+# Subcommands that read an input sheet
+INPUT_SUBCOMMANDS = ('excel', 'pitchbook-only')
+
+
+def configure_logging(log_file, verbose=False):
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.insert(0, logging.FileHandler(log_file))
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        handlers=handlers
+    )
+
+
+def parse_watermark(value):
+    table, sep, column = value.partition('=')
+    if not sep or not table or not column:
+        raise argparse.ArgumentTypeError(f"Expected TABLE=COLUMN, got {value!r}")
+    return table, column
+
+
+def parse_dedup(value):
+    """(full table name or None for every table, policy) from POLICY or TABLE=POLICY."""
+    table, sep, policy = value.rpartition('=')
+    try:
+        parse_dedup_policy(policy)
+        return (resolve_table(table.strip()) if sep else None), policy.strip()
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_columns(value):
+    table, sep, columns = value.partition('=')
+    columns = [column.strip() for column in columns.split(',') if column.strip()]
+    if not sep or not columns:
+        raise argparse.ArgumentTypeError(f"Expected TABLE=COL1,COL2,..., got {value!r}")
+    try:
+        table = resolve_table(table.strip())
+        return table, check_columns(table, columns)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def load_columns_file(path, command):
+    """Projections from a JSON file of {"<subcommand>" or "*": {"TABLE": ["COL", ...]}}."""
+    with open(path) as f:
+        spec = json.load(f)
+    columns = {}
+    for key in ('*', command):
+        for table, table_columns in spec.get(key, {}).items():
+            table = resolve_table(table)
+            columns[table] = check_columns(table, table_columns)
+    return columns
+
+
+def parse_match_field(value):
+    target, sep, column = value.partition('=')
+    side, _, field = target.partition('.')
+    if not sep or not column or side not in MATCH_SIDES or field not in VERIFY_FIELD_CANDIDATES:
+        raise argparse.ArgumentTypeError(f"Expected SIDE.FIELD=COLUMN with SIDE in {list(MATCH_SIDES)} "
+                                         f"and FIELD in {list(VERIFY_FIELD_CANDIDATES)}, got {value!r}")
+    return side, field, column
+
+
+def build_parser():
+    defaults = MapperConfig()
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('-o', '--output', help="Output file; .csv, .csv.gz, .csv.zst or .parquet "
+                                               "(default: <prefix>_YYYYMMDD.csv)")
+    common.add_argument('-a', '--account', default=defaults.account, help="Snowflake account")
+    common.add_argument('-u', '--user', default=defaults.user, help="Snowflake user")
+    common.add_argument('-p', '--password', default=defaults.password,
+                        help="Snowflake password (prefer the SNOWFLAKE_PASSWORD environment variable)")
+    common.add_argument('-w', '--warehouse', default=defaults.warehouse, help="Snowflake warehouse")
+    common.add_argument('-r', '--role', default=defaults.role, help="Snowflake role")
+    common.add_argument('--pool-size', type=int, default=defaults.pool_size, help="Pooled Snowflake connections")
+    common.add_argument('--batch-size', type=int, default=defaults.id_batch_size, help="IDs bound per IN-list query")
+    common.add_argument('--workers', type=int, default=defaults.query_workers, help="ID batches fetched concurrently")
+    common.add_argument('--retries', type=int, default=defaults.query_retries,
+                        help="Retries per failed query batch, with exponential backoff")
+    common.add_argument('--retry-backoff', type=float, default=defaults.retry_backoff,
+                        help="Seconds before the first retry; doubles on each attempt")
+    common.add_argument('--checkpoint-dir', help="Keep each completed query batch here so a rerun of the same "
+                                                 "command resumes after a failure; removed on success")
+    common.add_argument('--stream', action='store_true', help="Fetch Arrow batches and fetch/join/write in row chunks")
+    common.add_argument('--chunk-rows', type=int, default=defaults.chunk_rows, help="Rows per chunk when streaming")
+    common.add_argument('--no-compact-dtypes', dest='compact_dtypes', action='store_false',
+                        help="Keep fetched columns as object dtype and fill unmatched cells with '' instead of NA")
+    common.add_argument('--dedup', type=parse_dedup, action='append', default=[], metavar='[TABLE=]POLICY',
+                        help="Side tables with several rows per ID keep one: last (default), first, latest:COLUMN, "
+                             "aggregate (distinct values joined with ' | ') or error; all keeps every row and fans "
+                             "the output out. TABLE= sets it for one table (repeatable)")
+    common.add_argument('--max-fanout', type=float, default=defaults.max_fanout,
+                        help="With --dedup all, abort if the output would exceed this many times the input rows")
+    common.add_argument('--columns', type=parse_columns, action='append', default=[], metavar='TABLE=COL1,COL2',
+                        help="Fetch only these columns of TABLE (e.g. COMPANY_COMMON=COMPANY_NAME,WEBSITE; repeatable)")
+    common.add_argument('--columns-file', help='JSON of per-subcommand projections: {"crosswalk": {"TABLE": [...]}, "*": {...}}')
+    common.add_argument('--cache-dir', default=defaults.cache_dir, help="Local Parquet cache of fetched rows")
+    common.add_argument('--cache-ttl-hours', type=float, default=defaults.cache_ttl_hours)
+    common.add_argument('--cache-max-gb', type=float, default=defaults.cache_max_gb)
+    common.add_argument('--watermark', type=parse_watermark, action='append', default=[], metavar='TABLE=COLUMN',
+                        help="Watermark column for incremental cache refresh (repeatable)")
+    common.add_argument('--report-file', help="JSON run report with per-stage timings, rows, bytes, peak RSS and "
+                                              "query IDs (default: <output>.report.json; empty string to disable)")
+    common.add_argument('--profile', choices=PROFILERS, help="Profile the join stage; writes <output>.join.prof "
+                                                             "(cprofile) or <output>.join.html (pyinstrument)")
+    common.add_argument('--log-file', default=DEFAULT_LOG_FILE, help="Log file (empty string to disable)")
+    common.add_argument('-v', '--verbose', action='store_true', help="Debug logging")
+
+    parser = argparse.ArgumentParser(prog='entity_mapper', description="Map Pitchbook and Voldemort entities from Snowflake")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, (_, _, description) in SUBCOMMANDS.items():
+        sub = subparsers.add_parser(name, parents=[common], help=description, description=description)
+        if name in INPUT_SUBCOMMANDS:
+            sub.add_argument('-i', '--input', default=defaults.input_file,
+                             help="Input file with the IDs: .xlsx, .csv or .parquet")
+            sub.add_argument('--no-input-cache', dest='input_cache', action='store_false',
+                             help="Don't read or write the <input>.ids.parquet cache of a parsed workbook")
+        if name == 'crosswalk':
+            sub.add_argument('--verify', action='store_true',
+                             help="Append a verification confidence and reason vector for each pair")
+            join_mode = sub.add_mutually_exclusive_group()
+            join_mode.add_argument('--server-join', action='store_true',
+                                   help="Join the crosswalk to both metadata tables in Snowflake and stream only "
+                                        "the result (bypasses the local cache)")
+            join_mode.add_argument('--previous', metavar='OUTPUT',
+                                   help="Earlier crosswalk output: only fetch and join pairs it doesn't have, and "
+                                        "merge them into a copy of it")
+            sub.add_argument('--delta-only', action='store_true',
+                             help="With --previous, write only the added and removed pairs, with a change column")
+            sub.add_argument('--snapshot', action='store_true',
+                             help="Save the output's pairs as <output>.pairs.parquet so a later --previous run "
+                                  "doesn't have to read them back from the output (runs with --previous always do)")
+        if name in SHARDED_COMMANDS:
+            sub.add_argument('--shards', type=int, default=defaults.shards,
+                             help="Worker processes, each with its own connections, that fetch, join and write a "
+                                  "slice of the rows; the output is the same as with one process")
+            sub.add_argument('--partitioned', action='store_true',
+                             help="With --shards, write the output as a directory of part-NNNNN files")
+            sub.add_argument('--join-backend', choices=JOIN_BACKENDS, default=defaults.join_backend,
+                             help="duckdb materializes the joined rows in DuckDB, across all cores and spilling to "
+                                  "disk, and streams them to the output; same output as pandas")
+            sub.add_argument('--join-memory-limit', help="With --join-backend duckdb, memory DuckDB may use before "
+                                                         "spilling, e.g. 8GB (default: 80%% of RAM)")
+            sub.add_argument('--join-temp-dir', help="With --join-backend duckdb, where it spills "
+                                                     "(default: the output directory)")
+            sub.add_argument('--join-threads', type=int, help="With --join-backend duckdb, threads it may use "
+                                                              "(default: all cores)")
+            sub.add_argument('--no-missing-report', dest='missing_report', action='store_false',
+                             help="Don't write <output>.missing.csv, the IDs that matched only after "
+                                  "normalization or not at all")
+        if name == 'fuzzy-match':
+            sub.add_argument('--top-k', type=int, default=defaults.fuzzy_top_k, help="Candidates kept per entity")
+            sub.add_argument('--min-score', type=float, default=defaults.fuzzy_min_score,
+                             help="Minimum combined score (0-1) for a candidate")
+        if name == 'serve':
+            sub.add_argument('--host', default=defaults.service_host, help="Address to listen on")
+            sub.add_argument('--port', type=int, default=defaults.service_port, help="Port to listen on")
+            sub.add_argument('--socket', help="Listen on this Unix socket instead of host:port")
+            sub.add_argument('--lookup-cache-entries', type=int, default=defaults.lookup_cache_entries,
+                             help="Rows kept in memory per table (0 disables the in-memory cache)")
+            sub.add_argument('--lookup-ttl-seconds', type=float, default=defaults.lookup_ttl_seconds,
+                             help="Seconds a cached row (or a cached miss) is served before it is fetched again")
+            sub.add_argument('--coalesce-ms', type=float, default=defaults.coalesce_ms,
+                             help="How long a cache miss waits for concurrent requests to join its query")
+        if name in ('crosswalk', 'fuzzy-match'):
+            sub.add_argument('--match-field', type=parse_match_field, action='append', default=[],
+                             metavar='SIDE.FIELD=COLUMN',
+                             help="Source column for a match/verify field, e.g. voldemort.name=LEGAL_NAME (repeatable)")
+    return parser
+
+
+def config_from_args(args):
+    output_prefix, application, _ = SUBCOMMANDS[args.command]
+    match_fields = {}
+    for side, field, column in getattr(args, 'match_field', []):
+        match_fields.setdefault(side, {})[field] = column
+    columns = load_columns_file(args.columns_file, args.command) if args.columns_file else {}
+    columns.update(dict(args.columns))
+    dedup_policies = dict(args.dedup)
+    return MapperConfig(
+        account=args.account,
+        user=args.user,
+        password=args.password,
+        warehouse=args.warehouse,
+        role=args.role,
+        application=application,
+        pool_size=args.pool_size,
+        input_file=getattr(args, 'input', None),
+        input_cache=getattr(args, 'input_cache', True),
+        output_file=args.output or default_output_file(output_prefix),
+        id_batch_size=args.batch_size,
+        query_workers=args.workers,
+        query_retries=args.retries,
+        retry_backoff=args.retry_backoff,
+        checkpoint_dir=args.checkpoint_dir,
+        stream=args.stream,
+        chunk_rows=args.chunk_rows,
+        compact_dtypes=args.compact_dtypes,
+        join_backend=getattr(args, 'join_backend', PANDAS),
+        join_memory_limit=getattr(args, 'join_memory_limit', None),
+        join_temp_dir=getattr(args, 'join_temp_dir', None),
+        join_threads=getattr(args, 'join_threads', None),
+        missing_report=getattr(args, 'missing_report', True),
+        dedup_policy=dedup_policies.pop(None, LAST),
+        dedup_policies=dedup_policies,
+        max_fanout=args.max_fanout,
+        shards=getattr(args, 'shards', 1),
+        partitioned=getattr(args, 'partitioned', False),
+        columns=columns,
+        cache_dir=args.cache_dir,
+        cache_ttl_hours=args.cache_ttl_hours,
+        cache_max_gb=args.cache_max_gb,
+        cache_watermarks=dict(args.watermark),
+        fuzzy_top_k=getattr(args, 'top_k', MapperConfig.fuzzy_top_k),
+        fuzzy_min_score=getattr(args, 'min_score', MapperConfig.fuzzy_min_score),
+        match_fields=match_fields,
+        verify=getattr(args, 'verify', False),
+        server_join=getattr(args, 'server_join', False),
+        previous_output=getattr(args, 'previous', None),
+        delta_only=getattr(args, 'delta_only', False),
+        pair_snapshot=getattr(args, 'snapshot', False),
+        service_host=getattr(args, 'host', MapperConfig.service_host),
+        service_port=getattr(args, 'port', MapperConfig.service_port),
+        service_socket=getattr(args, 'socket', None),
+        lookup_cache_entries=getattr(args, 'lookup_cache_entries', MapperConfig.lookup_cache_entries),
+        lookup_ttl_seconds=getattr(args, 'lookup_ttl_seconds', MapperConfig.lookup_ttl_seconds),
+        coalesce_ms=getattr(args, 'coalesce_ms', MapperConfig.coalesce_ms),
+        # The service has no output file to put a run report next to
+        report_file='' if args.command == 'serve' and args.report_file is None else args.report_file,
+        profile=args.profile,
+    )
+
+
+def write_run_report(report, config):
+    if config.report_file == '':
+        return
+    try:
+        log_summary(report)
+        path = report.write(config.report_file or default_report_file(config.output_file))
+        logging.info(f"Run report saved to {path}")
+        if config.profile:
+            suffix = '.join.prof' if config.profile == 'cprofile' else '.join.html'
+            profile_path = report.write_profile(config.output_file + suffix)
+            if profile_path:
+                logging.info(f"Join profile saved to {profile_path}")
+    except Exception as e:
+        logging.error(f"Failed to write run report: {e}")
+
+
+def main(argv=None, connect=connect_to_snowflake):
+    """Run a subcommand; connect(config) opens each pooled connection (swappable for a local stand-in)."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'delta_only', False) and not args.previous:
+        parser.error("--delta-only requires --previous")
+    if args.command == 'serve' and args.checkpoint_dir:
+        parser.error("--checkpoint-dir can't be used with serve, whose lookups must see fresh rows")
+    if getattr(args, 'snapshot', False) and args.server_join:
+        parser.error("--snapshot can't be combined with --server-join")
+    if getattr(args, 'shards', 1) > 1 and (getattr(args, 'server_join', False) or getattr(args, 'previous', None)):
+        parser.error("--shards can't be combined with --server-join or --previous")
+    if getattr(args, 'partitioned', False) and args.shards < 2:
+        parser.error("--partitioned requires --shards 2 or more")
+    if getattr(args, 'join_backend', PANDAS) != PANDAS and getattr(args, 'server_join', False):
+        parser.error("--join-backend has no effect with --server-join, which joins in Snowflake")
+    if args.dedup and getattr(args, 'server_join', False):
+        parser.error("--dedup needs the client-side join; --server-join always keeps the last row per ID")
+    if getattr(args, 'previous', None) and any(parse_dedup_policy(policy)[0] == ALL for _, policy in args.dedup):
+        parser.error("--dedup all can't be combined with --previous")
+    configure_logging(args.log_file, args.verbose)
+    config = config_from_args(args)
+    logging.info(f"Starting Entity Mapper: {args.command}")
+    try:
+        require_backend(config.join_backend)
+        report = RunReport(args.command, config.output_file, profile=config.profile)
+    except ImportError as e:
+        logging.error(str(e))
+        return 1
+    with report.activate():
+        status = run_command(args, config, connect)
+    report.status = 'succeeded' if status == 0 else 'failed'
+    write_run_report(report, config)
+    return status
+
+
+def run_command(args, config, connect=connect_to_snowflake):
+    pool = ConnectionPool(config, size=config.pool_size, connect=connect)
+    try:
+        input_df = None
+        if args.command in INPUT_SUBCOMMANDS:
+            with stage('input_load') as timed:
+                input_df = load_input_data(config.input_file, config.input_cache)
+                timed.add(rows_out=len(input_df))
+        # Connect up front (in parallel) so credential problems fail fast
+        with stage('connect'):
+            pool.warm(1 if args.command == 'pitchbook-only' or config.shards > 1 else None)
+        if args.command == 'serve':
+            run_service(pool, config)
+            return 0
+        if config.shards > 1:
+            success = run_sharded(args.command, pool, config, input_df, connect, args.log_file, args.verbose)
+        elif args.command == 'excel':
+            success = run_excel(pool, config, input_df)
+        elif args.command == 'pitchbook-only':
+            success = run_pitchbook_only(pool, config, input_df)
+        elif args.command == 'fuzzy-match':
+            success = run_fuzzy_match(pool, config)
+        else:
+            success = run_crosswalk(pool, config)
+        if not success:
+            logging.error("Failed to create entity mapping output.")
+            return 1
+        logging.info(f"Entity mapping completed successfully. Output saved to {config.output_file}")
+        clear_checkpoint(config.checkpoint_dir)
+    except Exception as e:
+        logging.error(f"An error occurred: {e}", exc_info=True)
+        return 1
+    finally:
+        pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Run Configuration
+-----------------
+Settings shared by every subcommand. Defaults mirror the values that used to
+be hardcoded at the top of each script; the CLI overrides them from flags and
+SNOWFLAKE_* environment variables.
+"""
+
+import os
+from dataclasses import dataclass, field
+from datetime import datetime
+from entity_mapper.batching import DEFAULT_CHUNK_SIZE, DEFAULT_MAX_WORKERS
+from entity_mapper.connection import DEFAULT_POOL_SIZE, DEFAULT_QUERY_RETRIES, DEFAULT_RETRY_BACKOFF
+from entity_mapper.fuzzy import DEFAULT_MIN_SCORE, DEFAULT_TOP_K
+
+PITCHBOOK_FEED_TABLE = 'PROD.PITCHBOOK.COMPANY_DATA_FEED'
+PITCHBOOK_COMMON_TABLE = 'PROD.PITCHBOOK.COMPANY_COMMON'
+VOLDEMORT_TABLE = 'PROD.VOLDEMORT.VOLDEMORT_FIRMOGRAPHICS'
+CROSSWALK_TABLE = 'PROD.FORAGE.VOLDEMORT_PITCHBOOK_CROSSWALK_TO_VERIFY'
+SOURCE_TABLES = (PITCHBOOK_FEED_TABLE, PITCHBOOK_COMMON_TABLE, VOLDEMORT_TABLE, CROSSWALK_TABLE)
+
+DEFAULT_ACCOUNT = "TWHRMQQ-EIA98922"
+DEFAULT_WAREHOUSE = "FORAGE_AI_WH"
+DEFAULT_ROLE = "FORAGE_AI_USER"
+DEFAULT_INPUT_FILE = "test1_new.xlsx"
+DEFAULT_LOG_FILE = "entity_mapper.log"
+DEFAULT_SERVICE_HOST = "127.0.0.1"
+DEFAULT_SERVICE_PORT = 8765
+DEFAULT_LOOKUP_CACHE_ENTRIES = 100_000
+DEFAULT_LOOKUP_TTL_SECONDS = 3600
+DEFAULT_COALESCE_MS = 5
+
+
+def default_output_file(prefix):
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d')}.csv"
+
+
+def resolve_table(name):
+    """Full table name for a full or bare (e.g. 'COMPANY_COMMON') source table name."""
+    for table in SOURCE_TABLES:
+        if name.upper() in (table, table.rsplit('.', 1)[-1]):
+            return table
+    raise ValueError(f"Unknown table {name!r}; expected one of {list(SOURCE_TABLES)}")
+
+
+@dataclass
+class MapperConfig:
+    # Snowflake connection
+    account: str = field(default_factory=lambda: os.environ.get('SNOWFLAKE_ACCOUNT', DEFAULT_ACCOUNT))
+    user: str = field(default_factory=lambda: os.environ.get('SNOWFLAKE_USER'))
+    password: str = field(default_factory=lambda: os.environ.get('SNOWFLAKE_PASSWORD'))
+    warehouse: str = field(default_factory=lambda: os.environ.get('SNOWFLAKE_WAREHOUSE', DEFAULT_WAREHOUSE))
+    role: str = field(default_factory=lambda: os.environ.get('SNOWFLAKE_ROLE', DEFAULT_ROLE))
+    database: str = 'PROD'
+    application: str = 'EntityMapper'
+    # Pooled connections; the Pitchbook and Voldemort fetches each borrow one and run concurrently
+    pool_size: int = DEFAULT_POOL_SIZE
+    # Input and output files (output extension picks the format: .csv, .csv.gz, .csv.zst, .parquet)
+    input_file: str = DEFAULT_INPUT_FILE
+    output_file: str = None
+    # Reuse a Parquet sidecar of the parsed input workbook while the workbook is unchanged
+    input_cache: bool = True
+    # ID batching for the IN-list queries
+    id_batch_size: int = DEFAULT_CHUNK_SIZE
+    query_workers: int = DEFAULT_MAX_WORKERS
+    # Retries per failed query batch, with exponential backoff starting at retry_backoff seconds
+    query_retries: int = DEFAULT_QUERY_RETRIES
+    retry_backoff: float = DEFAULT_RETRY_BACKOFF
+    # Completed batch results and manifest for resuming an interrupted run (None disables it)
+    checkpoint_dir: str = None
+    # Streaming: fetch Arrow batches and fetch/join/write the input in row chunks
+    stream: bool = False
+    chunk_rows: int = 50000
+    # Worker processes, each fetching/joining/writing a contiguous slice of the rows; keep the
+    # shard files as a <output_file>/part-NNNNN dataset instead of concatenating them
+    shards: int = 1
+    partitioned: bool = False
+    # One row per ID for side tables that return several: last, first, latest:COLUMN, aggregate, error,
+    # or all (fan out, up to max_fanout times the input rows); per-table overrides by full table name
+    dedup_policy: str = 'last'
+    dedup_policies: dict = field(default_factory=dict)
+    max_fanout: float = 2.0
+    # Join backend: 'pandas', or 'duckdb' to materialize the joined rows out of core (spilling to
+    # join_temp_dir, default: the output directory, past join_memory_limit such as '8GB')
+    join_backend: str = 'pandas'
+    join_memory_limit: str = None
+    join_temp_dir: str = None
+    join_threads: int = None
+    # Write <output_file>.missing.csv: the IDs per side that matched only after normalization or not at all
+    missing_report: bool = True
+    # Convert fetched side tables to categorical / Arrow string / nullable dtypes before joining
+    compact_dtypes: bool = True
+    # Per-table column projection pushed into the SELECT (full table name -> columns; absent = SELECT *)
+    columns: dict = field(default_factory=dict)
+    # Local Parquet cache of fetched source rows (None disables it)
+    cache_dir: str = None
+    cache_ttl_hours: float = 24
+    cache_max_gb: float = 5
+    # Per-table watermark column for incremental refresh of stale cache entries
+    cache_watermarks: dict = field(default_factory=dict)
+    # Fuzzy matching of crosswalk rows whose ID has no metadata on one side
+    fuzzy_top_k: int = DEFAULT_TOP_K
+    fuzzy_min_score: float = DEFAULT_MIN_SCORE
+    # Per-side ('pitchbook'/'voldemort') {field: column} overrides for the match/verify fields
+    match_fields: dict = field(default_factory=dict)
+    # Append verification confidence and reason columns to the crosswalk output
+    verify: bool = False
+    # Crosswalk: join in Snowflake with one statement and stream only the joined rows
+    server_join: bool = False
+    # Crosswalk: diff against this earlier output's pairs and only fetch/join the new ones
+    previous_output: str = None
+    # With previous_output, write only the added and removed pairs instead of a merged output
+    delta_only: bool = False
+    # Crosswalk: save the output's pairs as <output_file>.pairs.parquet for a later previous_output
+    # run (always done when previous_output is set)
+    pair_snapshot: bool = False
+    # Lookup service: listen on service_host:service_port, or on a Unix socket when service_socket is set
+    service_host: str = DEFAULT_SERVICE_HOST
+    service_port: int = DEFAULT_SERVICE_PORT
+    service_socket: str = None
+    # Lookup service: LRU rows kept per side, seconds before a cached row is fetched again, and how
+    # long the first cache miss waits for concurrent requests to join its IN-list query
+    lookup_cache_entries: int = DEFAULT_LOOKUP_CACHE_ENTRIES
+    lookup_ttl_seconds: float = DEFAULT_LOOKUP_TTL_SECONDS
+    coalesce_ms: float = DEFAULT_COALESCE_MS
+    # JSON run report (None: <output_file>.report.json, '': disabled) and optional join profiler
+    report_file: str = None
+    profile: str = None
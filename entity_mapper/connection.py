@@ -0,0 +1,192 @@
+"""
+Snowflake Connection
+--------------------
+Connecting and running queries, shared by every subcommand.
+"""
+
+import logging
+import queue
+import random
+import threading
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from entity_mapper.report import frame_bytes, record_query, reporting
+from entity_mapper.streaming import concat_frames, iter_cursor_frames
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_QUERY_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 2.0
+# Errors that fail the same way however often they are retried (bad SQL, bad data)
+NON_RETRYABLE_ERRORS = ('ProgrammingError', 'IntegrityError', 'DataError', 'NotSupportedError')
+
+
+class QueryError(RuntimeError):
+    """A Snowflake query failed; raised instead of returning an empty frame."""
+
+
+def is_retryable(error):
+    while error is not None:
+        if type(error).__name__ in NON_RETRYABLE_ERRORS:
+            return False
+        error = error.__cause__
+    return True
+
+
+def call_with_retries(fn, retries=DEFAULT_QUERY_RETRIES, backoff=DEFAULT_RETRY_BACKOFF, description=None):
+    """Call fn(), retrying transient failures up to retries times with exponential backoff and jitter."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = backoff * 2 ** attempt * (0.5 + random.random() / 2)
+            logging.warning(f"Attempt {attempt + 1}/{retries + 1} of {description or 'query'} failed: {e}; "
+                            f"retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def connect_to_snowflake(config):
+    import snowflake.connector
+    try:
+        logging.info(f"Connecting to Snowflake with account: {config.account}, user: {config.user}, warehouse: {config.warehouse}")
+        conn = snowflake.connector.connect(
+            account=config.account,
+            user=config.user,
+            password=config.password,
+            warehouse=config.warehouse,
+            database=config.database,
+            role=config.role,
+            client_session_keep_alive=True,
+            application=config.application
+        )
+        cursor = conn.cursor()
+        cursor.execute("SELECT current_version()")
+        version = cursor.fetchone()[0]
+        logging.info(f"Connected to Snowflake successfully. Version: {version}")
+        return conn
+    except Exception as e:
+        logging.error(f"Failed to connect to Snowflake: {e}")
+        raise
+
+
+def execute_query(conn, query, description=None, params=None, stream=False):
+    try:
+        if description:
+            logging.info(f"Executing query: {description}")
+        logging.debug(f"Full query: {query}")
+        start = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        if stream:
+            # Arrow batches instead of tuples, but the whole result is still returned as one frame
+            df = concat_frames(iter_cursor_frames(cursor))
+        else:
+            columns = [col[0] for col in cursor.description]
+            data = cursor.fetchall()
+            df = pd.DataFrame(data, columns=columns)
+        logging.info(f"Query returned {len(df)} rows and {len(df.columns)} columns")
+        if reporting():
+            record_query(getattr(cursor, 'sfqid', None), description, len(df), frame_bytes(df),
+                         time.perf_counter() - start)
+        return df
+    except Exception as e:
+        logging.error(f"Error executing query: {e}")
+        logging.error(f"Query: {query}")
+        raise QueryError(f"{description or 'Query'} failed: {e}") from e
+
+
+class ConnectionPool:
+    """
+    Small thread-safe pool of Snowflake connections. Connections are opened
+    lazily up to size; callers borrow one with `with pool.connection() as conn:`
+    and block while all of them are in use.
+    """
+
+    def __init__(self, config, size=DEFAULT_POOL_SIZE, connect=connect_to_snowflake):
+        if size < 1:
+            raise ValueError(f"Connection pool size must be at least 1, got {size}")
+        self.config = config
+        self.size = size
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._opening = 0
+
+    def _reserve_slot(self):
+        with self._lock:
+            if len(self._connections) + self._opening < self.size:
+                self._opening += 1
+                return True
+            return False
+
+    def _open(self):
+        try:
+            conn = self._connect(self.config)
+        except Exception:
+            with self._lock:
+                self._opening -= 1
+            raise
+        with self._lock:
+            self._opening -= 1
+            self._connections.append(conn)
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        if self._reserve_slot():
+            return self._open()
+        return self._idle.get()
+
+    def release(self, conn):
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def ensure_size(self, size):
+        """Grow the pool so that at least size connections can be borrowed at once."""
+        with self._lock:
+            self.size = max(self.size, size)
+
+    def warm(self, count=None):
+        """Open up to count idle connections concurrently so the first fetches don't pay for connecting."""
+        count = min(count or self.size, self.size)
+        slots = [self._reserve_slot() for _ in range(count)]
+        slots = [slot for slot in slots if slot]
+        if not slots:
+            return
+        errors = []
+        with ThreadPoolExecutor(max_workers=len(slots), thread_name_prefix='connect') as executor:
+            futures = [executor.submit(self._open) for _ in slots]
+            # Hand every connection that did open to the pool before reporting a failed one
+            for future in futures:
+                try:
+                    self.release(future.result())
+                except Exception as e:
+                    errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logging.warning(f"Failed to close Snowflake connection: {e}")
+        self._idle = queue.LifoQueue()
+        if connections:
+            logging.info(f"Closed {len(connections)} Snowflake connection(s)")
@@ -0,0 +1,175 @@
+"""
+Incremental Crosswalk
+---------------------
+Diffs the current crosswalk against the pair set of a previous run so only
+new pairs go through the metadata fetch and join. A crosswalk run with
+--snapshot (or --previous) leaves a snapshot of its pitchbook_id/bq_id pairs
+next to its output (<output>.pairs.parquet); without one the pairs are read
+back from the output itself. A later run given that output with --previous
+either merges the freshly joined rows into it, dropping rows whose pair left
+the crosswalk, or with --delta-only writes just the added and removed pairs
+with a `change` column. A remapped ID shows up as one removed and one added
+pair.
+
+Pairs are compared as 64-bit hashes of both keys, with repeated copies of a
+pair counted separately. Only crosswalk changes are detected: metadata
+that changed in COMPANY_COMMON or VOLDEMORT_FIRMOGRAPHICS for an unchanged
+pair is picked up by the next full run.
+"""
+
+import logging
+import os
+import uuid
+from collections import Counter
+import numpy as np
+import pandas as pd
+from entity_mapper.writer import PARQUET, detect_format
+
+SNAPSHOT_SUFFIX = '.pairs.parquet'
+# Mixed into the hash of a repeated pair, so each copy is tracked separately
+_OCCURRENCE_MIX = np.uint64(0x9E3779B97F4A7C15)
+KEY_COLUMNS = ['pitchbook_id', 'bq_id']
+CHANGE_COLUMN = 'change'
+ADDED = 'added'
+REMOVED = 'removed'
+
+
+def snapshot_path(output_path):
+    return f"{output_path}{SNAPSHOT_SUFFIX}"
+
+
+def _key_text(values):
+    # Empty IDs are written as '' to CSV, so compare them as '' rather than 'nan'
+    values = pd.Series(values).astype(object)
+    return values.where(values.notna(), '').map(str)
+
+
+def pair_keys(crosswalk_df):
+    """The output's pitchbook_id/bq_id for each crosswalk row, as build_crosswalk_frame derives them."""
+    return pd.DataFrame({
+        'pitchbook_id': _key_text(crosswalk_df.iloc[:, 0]).to_numpy(),
+        'bq_id': _key_text(crosswalk_df.iloc[:, 1]).str.replace("'", "", regex=False).to_numpy(),
+    })
+
+
+def pair_hashes(pairs):
+    keys = pd.DataFrame({col: _key_text(pairs[col]).to_numpy() for col in KEY_COLUMNS})
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+class PairKeys:
+    """
+    Hash per pair, made distinct for the 2nd, 3rd... copy of a pair across
+    successive chunks, so a pair listed twice stays two rows.
+    """
+
+    def __init__(self):
+        self._counts = Counter()
+
+    def __call__(self, pairs):
+        hashes = pair_hashes(pairs)
+        series = pd.Series(hashes)
+        occurrence = series.groupby(series, sort=False).cumcount().to_numpy().astype(np.uint64)
+        if self._counts:
+            occurrence += np.fromiter((self._counts.get(h, 0) for h in hashes.tolist()), dtype=np.uint64,
+                                      count=len(hashes))
+        self._counts.update(hashes.tolist())
+        return hashes + occurrence * _OCCURRENCE_MIX
+
+
+def iter_output_chunks(output_path, chunk_rows):
+    """Read an output back in chunks; CSV as text so rewritten rows come out unchanged."""
+    if detect_format(output_path)[0] == PARQUET:
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(output_path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(output_path, dtype=str, keep_default_na=False, chunksize=chunk_rows)
+
+
+def load_previous_pairs(previous_output, chunk_rows):
+    """The previous run's pair snapshot, or the pairs read back from its output."""
+    path = snapshot_path(previous_output)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    if not os.path.exists(previous_output):
+        raise FileNotFoundError(f"Previous output {previous_output} not found")
+    logging.warning(f"No pair snapshot {path}; reading the pairs from {previous_output}")
+    frames = [chunk[KEY_COLUMNS] for chunk in iter_output_chunks(previous_output, chunk_rows)]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=KEY_COLUMNS)
+
+
+def write_snapshot(output_path, pairs):
+    path = snapshot_path(output_path)
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    pairs.to_parquet(temp_path, index=False)
+    os.replace(temp_path, path)
+    return path
+
+
+def remove_snapshot(output_path):
+    """Delete an earlier run's snapshot, which no longer describes a rewritten output; True if there was one."""
+    path = snapshot_path(output_path)
+    if not os.path.exists(path):
+        return False
+    os.remove(path)
+    return True
+
+
+class CrosswalkDelta:
+    """
+    Filters crosswalk chunks down to pairs the previous run didn't have,
+    remembering every pair seen so the removed ones are known once the
+    crosswalk has been read through. Without previous pairs (a full run with
+    --snapshot) it only collects the pairs for the snapshot.
+    """
+
+    def __init__(self, previous_pairs=None):
+        self.previous_pairs = previous_pairs
+        self._previous = None if previous_pairs is None else pd.Index(PairKeys()(previous_pairs))
+        self._keys = PairKeys()
+        self._seen = []
+        self._pairs = []
+        self.added = 0
+        self.unchanged = 0
+
+    def new_pairs(self, crosswalk_df):
+        pairs = pair_keys(crosswalk_df)
+        self._pairs.append(pairs)
+        if self._previous is None:
+            self.added += len(pairs)
+            return crosswalk_df
+        hashes = self._keys(pairs)
+        self._seen.append(hashes)
+        known = pd.Index(hashes).isin(self._previous)
+        self.added += int((~known).sum())
+        self.unchanged += int(known.sum())
+        return crosswalk_df[~known]
+
+    def current_pairs(self):
+        return pd.concat(self._pairs, ignore_index=True) if self._pairs else pd.DataFrame(columns=KEY_COLUMNS)
+
+    def removed_mask(self):
+        """Which previous pairs are no longer in the crosswalk."""
+        seen = np.concatenate(self._seen) if self._seen else np.empty(0, dtype=np.uint64)
+        return ~self._previous.isin(seen)
+
+    def removed_pairs(self):
+        return self.previous_pairs[KEY_COLUMNS][self.removed_mask()].reset_index(drop=True)
+
+    def removed_keys(self):
+        return self._previous[self.removed_mask()]
+
+    def log_summary(self):
+        logging.info(f"Crosswalk delta: {self.added} added, {int(self.removed_mask().sum())} removed, "
+                     f"{self.unchanged} unchanged pairs")
+
+
+def iter_kept_rows(previous_output, removed_keys, chunk_rows):
+    """Rows of the previous output whose pair is still in the crosswalk."""
+    file_keys = PairKeys()
+    for chunk in iter_output_chunks(previous_output, chunk_rows):
+        if CHANGE_COLUMN in chunk.columns:
+            raise ValueError(f"{previous_output} is a --delta-only file; merge into a full output instead")
+        yield chunk[~pd.Index(file_keys(chunk)).isin(removed_keys)]
+
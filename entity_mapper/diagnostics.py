@@ -0,0 +1,100 @@
+"""
+Match Diagnostics
+-----------------
+Which requested IDs found a row, which only matched after normalization and
+which found nothing, per side. The counts come from the join's own match
+results: the IN-list fetch already returns exactly the rows for the staged
+IDs, so the IDs without a match are the anti-join of the ID list against
+that result and cost no further query (the old "table access" probe scanned
+all of VOLDEMORT_FIRMOGRAPHICS with a COUNT(*) and named no IDs).
+
+Every run writes <output>.missing.csv next to its output, listing only the
+IDs that did not match exactly:
+
+    side,id,status,rows
+    voldemort,0042,lstrip_zeros,3      matched once leading zeros were dropped
+    pitchbook,12345-67,unmatched,1     no row in the table
+
+`rows` is the number of output rows carrying the ID. Blank IDs are counted in
+the log summary but not listed.
+"""
+
+import logging
+import os
+import uuid
+import pandas as pd
+from entity_mapper.join import EXACT
+
+MISSING_SUFFIX = '.missing.csv'
+UNMATCHED = 'unmatched'
+BLANK = 'blank'
+REPORT_COLUMNS = ['side', 'id', 'status', 'rows']
+# Keys a missing input cell stringifies to
+_BLANK_KEYS = ('', 'nan', 'None', '<NA>')
+
+
+def missing_report_path(output_path):
+    return f"{output_path}{MISSING_SUFFIX}"
+
+
+class MatchDiagnostics:
+    """Per-side (id, status) -> output row counts, accumulated chunk by chunk."""
+
+    def __init__(self):
+        self._counts = []
+
+    def add(self, side, keys, rule_hit):
+        """keys: the join key of each output row; rule_hit: the rule that matched it, or None."""
+        keys = pd.Series(pd.Series(keys).to_numpy(dtype=object), dtype=object).str.strip()
+        status = pd.Series(pd.Series(rule_hit).to_numpy(dtype=object), dtype=object)
+        status = status.where(status.notna(), UNMATCHED).where(~keys.isin(_BLANK_KEYS), BLANK)
+        counts = pd.DataFrame({'id': keys, 'status': status}).groupby(['id', 'status'], sort=False).size()
+        self._counts.append(counts.rename('rows').reset_index().assign(side=side))
+
+    def absorb(self, report):
+        """Add the rows of another run's missing-ID report (a --shards worker's)."""
+        self._counts.append(report.assign(id=report['id'].astype(str)))
+
+    def frame(self):
+        """Every (side, id, status) with its output row count, in first-seen order."""
+        if not self._counts:
+            return pd.DataFrame(columns=REPORT_COLUMNS)
+        counts = pd.concat(self._counts, ignore_index=True)
+        return counts.groupby(['side', 'id', 'status'], sort=False)['rows'].sum().reset_index()[REPORT_COLUMNS]
+
+    def summary(self, frame=None):
+        """side -> {'ids', status: distinct IDs} over non-blank IDs, plus the blank row count."""
+        frame = self.frame() if frame is None else frame
+        summary = {}
+        for side, side_frame in frame.groupby('side', sort=False):
+            blank = side_frame['status'] == BLANK
+            by_status = side_frame[~blank].groupby('status')['id'].nunique()
+            summary[side] = {'ids': int(side_frame.loc[~blank, 'id'].nunique()),
+                             **{status: int(count) for status, count in by_status.items()},
+                             'blank_rows': int(side_frame.loc[blank, 'rows'].sum())}
+        return summary
+
+    def log_summary(self, frame=None):
+        for side, counts in self.summary(frame).items():
+            rescued = {status: count for status, count in counts.items()
+                       if status not in ('ids', EXACT, UNMATCHED, 'blank_rows')}
+            logging.info(f"{side.capitalize()} IDs: {counts['ids']} distinct, {counts.get(EXACT, 0)} matched, "
+                         f"{sum(rescued.values())} rescued by normalization"
+                         + (f" ({', '.join(f'{rule}={count}' for rule, count in rescued.items())})" if rescued else "")
+                         + f", {counts.get(UNMATCHED, 0)} unmatched; {counts['blank_rows']} rows without an ID")
+
+    def write(self, output_path, log=True):
+        """Write the IDs that did not match exactly (logging the summary first); returns (path, rows written)."""
+        frame = self.frame()
+        if log:
+            self.log_summary(frame)
+        report = frame[~frame['status'].isin((EXACT, BLANK))]
+        path = missing_report_path(output_path)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        report.to_csv(temp_path, index=False)
+        os.replace(temp_path, path)
+        return path, len(report)
+
+
+def read_missing_report(path):
+    return pd.read_csv(path, dtype={'side': str, 'id': str, 'status': str}, keep_default_na=False)
@@ -0,0 +1,106 @@
+"""
+Compact Dtypes
+--------------
+Converts fetched side tables to memory-compact pandas dtypes before they are
+joined, so the wide joined frames don't hold one Python object per cell:
+
+- low-cardinality text (country, industry, status...) -> category
+- other text -> Arrow-backed string (needs pyarrow; object otherwise)
+- integer and float columns -> nullable Int64 / Float64, booleans -> boolean
+- empty strings -> NA
+
+Columns no compact dtype holds exactly are left as they are: integers beyond
+int64 (Snowflake NUMBER(38,0)) and object columns mixing ints with floats,
+which as Float64 would write 5 as '5.0'.
+
+The join then fills unmatched rows with NA instead of "" while keeping each
+column's dtype. NA and "" both write as an empty CSV field, so CSV output is
+unchanged; Parquet output gets real nulls and typed numeric columns.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.api import types
+
+# Text columns with at most this many distinct values per non-null row, and no more than
+# CATEGORY_MAX_VALUES in all, become categoricals
+CATEGORY_MAX_RATIO = 0.1
+CATEGORY_MAX_VALUES = 10000
+
+
+def _string_dtype():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return object
+    return pd.StringDtype('pyarrow')
+
+
+def _object_kind(values):
+    """'int', 'float', 'bool', 'text' or None (mixed) for the non-null cells of an object column."""
+    kinds = set(values.map(type).unique())
+    if not kinds:
+        return None
+    if kinds <= {str}:
+        return 'text'
+    if kinds <= {bool, np.bool_}:
+        return 'bool'
+    if any(issubclass(kind, (bool, np.bool_)) for kind in kinds):
+        return None
+    if all(issubclass(kind, (int, np.integer)) for kind in kinds):
+        return 'int'
+    if all(issubclass(kind, (float, np.floating)) for kind in kinds):
+        return 'float'
+    return None
+
+
+def _as_int64(values):
+    """values as nullable Int64, or unchanged when some value doesn't fit in int64."""
+    try:
+        return values.astype('Int64')
+    except (OverflowError, TypeError, ValueError):
+        return values
+
+
+def compact_text(values, string_dtype):
+    values = values.where(values != '')
+    non_null = int(values.notna().sum())
+    distinct = values.nunique()
+    if non_null and distinct <= CATEGORY_MAX_RATIO * non_null and distinct <= CATEGORY_MAX_VALUES:
+        return values.astype('category')
+    return values.astype(string_dtype)
+
+
+def compact_column(values, string_dtype=None):
+    """The column in its compact dtype, or unchanged when no compact dtype fits."""
+    string_dtype = string_dtype or _string_dtype()
+    dtype = values.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or types.is_extension_array_dtype(dtype) and not types.is_string_dtype(dtype):
+        return values
+    if types.is_bool_dtype(dtype):
+        return values.astype('boolean')
+    if types.is_integer_dtype(dtype):
+        return _as_int64(values)
+    if types.is_float_dtype(dtype):
+        return values.astype('Float64')
+    if types.is_string_dtype(dtype):
+        kind = _object_kind(values.dropna()) if dtype == object else 'text'
+        if kind == 'text':
+            return compact_text(values, string_dtype)
+        if kind == 'int':
+            return _as_int64(values)
+        if kind == 'float':
+            return values.astype(float).astype('Float64')
+        if kind == 'bool':
+            return values.astype('boolean')
+    return values
+
+
+def compact_frame(df, keep=()):
+    """Compact every column of df except those in keep (e.g. the join key)."""
+    string_dtype = _string_dtype()
+    out = df.copy(deep=False)
+    for col_idx, col in enumerate(df.columns):
+        if col not in keep:
+            out.isetitem(col_idx, compact_column(df.iloc[:, col_idx], string_dtype))
+    return out
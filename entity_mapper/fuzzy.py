@@ -0,0 +1,219 @@
+"""
+Fuzzy Matching
+--------------
+Proposes candidate matches for entities that have no ID link, using name,
+domain and country. Instead of comparing all pairs, candidates are restricted
+to blocks that share a normalized domain or a (country, name prefix) key, and
+names are scored in bulk with TF-IDF character n-grams and a sparse top-k.
+
+Query and candidate frames use the columns: id, name, domain, country.
+Needs scikit-learn (pip install scikit-learn).
+"""
+
+import logging
+import re
+import numpy as np
+import pandas as pd
+
+DEFAULT_TOP_K = 5
+DEFAULT_MIN_SCORE = 0.5
+DEFAULT_PREFIX_LEN = 3
+NAME_WEIGHT = 0.6
+DOMAIN_WEIGHT = 0.3
+COUNTRY_WEIGHT = 0.1
+# Upper bound on query x candidate cells scored in one sparse product
+MAX_BLOCK_CELLS = 5_000_000
+
+MATCH_COLUMNS = ['id', 'name', 'domain', 'country']
+# Source columns tried, case-insensitively and in order, for each match field
+MATCH_FIELD_CANDIDATES = {
+    'name': ('COMPANY_NAME', 'NAME', 'LEGAL_NAME', 'COMPANY_LEGAL_NAME'),
+    'domain': ('WEBSITE', 'DOMAIN', 'COMPANY_WEBSITE', 'URL'),
+    'country': ('HQ_COUNTRY', 'COUNTRY', 'HQ_COUNTRY_CODE', 'COUNTRY_CODE'),
+}
+
+LEGAL_SUFFIXES = (
+    'inc', 'incorporated', 'llc', 'llp', 'lp', 'ltd', 'limited', 'corp', 'corporation', 'co', 'company',
+    'plc', 'gmbh', 'ag', 'sa', 'sas', 'sarl', 'srl', 'spa', 'bv', 'nv', 'oy', 'ab', 'as', 'pty', 'pte',
+    'kk', 'holdings', 'holding', 'group',
+)
+_SUFFIX_RE = re.compile(r'(?:\s+(?:' + '|'.join(LEGAL_SUFFIXES) + r'))+$')
+
+
+def resolve_match_fields(columns, overrides=None, field_candidates=None, required=('name',)):
+    """Map each match field to a source column (or None); overrides win over MATCH_FIELD_CANDIDATES."""
+    by_upper = {str(col).upper(): col for col in columns}
+    fields = {}
+    for field, candidates in (field_candidates or MATCH_FIELD_CANDIDATES).items():
+        override = (overrides or {}).get(field)
+        if override:
+            if override.upper() not in by_upper:
+                raise ValueError(f"Match column {override!r} for {field} not found; available: {list(columns)}")
+            fields[field] = by_upper[override.upper()]
+        else:
+            fields[field] = next((by_upper[c] for c in candidates if c in by_upper), None)
+    for field in required:
+        if not fields[field]:
+            raise ValueError(f"No {field} column found among {list(columns)}; set one with --match-field")
+    return fields
+
+
+def match_frame(df, ids, fields):
+    """Project source rows onto MATCH_COLUMNS using resolved match fields."""
+    out = pd.DataFrame({'id': np.asarray(ids)}, index=df.index)
+    for field in MATCH_COLUMNS[1:]:
+        out[field] = df[fields[field]].to_numpy() if fields.get(field) else ''
+    return out
+
+
+def normalize_name(names):
+    """Lowercase, drop punctuation and trailing legal suffixes ('Acme, Inc.' -> 'acme')."""
+    names = pd.Series(names, dtype=object).fillna('').astype(str).str.lower()
+    names = names.str.replace('&', ' and ', regex=False)
+    names = names.str.replace(r'[^0-9a-z]+', ' ', regex=True).str.strip()
+    # A pattern string (not the compiled regex) lets Arrow-backed strings use the native engine
+    return names.str.replace(_SUFFIX_RE.pattern, '', regex=True).str.strip()
+
+
+def normalize_domain(domains):
+    """Reduce a website or URL to its bare host ('https://www.acme.com/about' -> 'acme.com')."""
+    domains = pd.Series(domains, dtype=object).fillna('').astype(str).str.strip().str.lower()
+    domains = domains.str.replace(r'^[a-z][a-z0-9+.-]*://', '', regex=True)
+    domains = domains.str.replace(r'^www\d*\.', '', regex=True)
+    return domains.str.split(r'[/?#:]', n=1, regex=True).str[0].fillna('')
+
+
+def normalize_country(countries):
+    return pd.Series(countries, dtype=object).fillna('').astype(str).str.strip().str.upper()
+
+
+def prepare(df, prefix_len=DEFAULT_PREFIX_LEN):
+    """Add normalized fields and blocking keys to a frame with MATCH_COLUMNS."""
+    out = pd.DataFrame({'id': df['id'].astype(str).to_numpy(), 'name': df['name'].to_numpy()})
+    out['norm_name'] = normalize_name(df['name']).to_numpy()
+    out['norm_domain'] = normalize_domain(df['domain']).to_numpy()
+    out['country_key'] = normalize_country(df['country']).to_numpy()
+    out['name_block'] = (out['country_key'] + '|' + out['norm_name'].str.replace(' ', '', regex=False)
+                         .str[:prefix_len]).where(out['norm_name'] != '', '')
+    return out
+
+
+def filter_to_blocks(candidates, domains, name_blocks):
+    """Keep only prepared candidate rows that share a blocking key with the queries."""
+    keep = (candidates['norm_domain'].isin(domains) & (candidates['norm_domain'] != '')) | \
+        (candidates['name_block'].isin(name_blocks) & (candidates['name_block'] != ''))
+    return candidates[keep.to_numpy()]
+
+
+def _vectorizer():
+    try:
+        from sklearn.feature_extraction.text import TfidfVectorizer
+    except ImportError:
+        raise ImportError("Fuzzy matching requires the 'scikit-learn' package (pip install scikit-learn)")
+    return TfidfVectorizer(analyzer='char_wb', ngram_range=(3, 3), dtype=np.float32)
+
+
+def sparse_top_k(scores, k, min_score):
+    """Return (row, col, value) of the k largest entries >= min_score in each row of a CSR matrix."""
+    scores = scores.tocsr()
+    rows = np.repeat(np.arange(scores.shape[0]), np.diff(scores.indptr))
+    keep = scores.data >= min_score
+    rows, cols, values = rows[keep], scores.indices[keep], scores.data[keep]
+    order = np.lexsort((-values, rows))
+    rows, cols, values = rows[order], cols[order], values[order]
+    if not len(rows):
+        return rows, cols, values
+    starts = np.r_[0, np.flatnonzero(np.diff(rows)) + 1]
+    rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+    keep = rank < k
+    return rows[keep], cols[keep], values[keep]
+
+
+def _name_block_pairs(queries, candidates, q_matrix, c_matrix, top_k, min_name_score):
+    q_groups = queries.groupby('name_block').indices
+    c_groups = candidates.groupby('name_block').indices
+    pairs = []
+    for block, q_idx in q_groups.items():
+        if not block or block not in c_groups:
+            continue
+        c_idx = c_groups[block]
+        c_block = c_matrix[c_idx].T.tocsc()
+        step = max(1, MAX_BLOCK_CELLS // max(len(c_idx), 1))
+        for start in range(0, len(q_idx), step):
+            q_slice = q_idx[start:start + step]
+            rows, cols, values = sparse_top_k(q_matrix[q_slice] @ c_block, top_k, min_name_score)
+            pairs.append(pd.DataFrame({'q': q_slice[rows], 'c': c_idx[cols], 'name_score': values}))
+    return pairs
+
+
+def _domain_pairs(queries, candidates):
+    q = pd.DataFrame({'q': np.arange(len(queries)), 'norm_domain': queries['norm_domain'].to_numpy()})
+    c = pd.DataFrame({'c': np.arange(len(candidates)), 'norm_domain': candidates['norm_domain'].to_numpy()})
+    q = q[q['norm_domain'] != '']
+    # A domain shared by many rows (linkedin.com, a parent company's site) would
+    # pair every query with every candidate; such blocks are left to the name blocks
+    cells = q['norm_domain'].value_counts().mul(c['norm_domain'].value_counts(), fill_value=0)
+    oversized = cells[cells > MAX_BLOCK_CELLS]
+    if len(oversized):
+        logging.warning(f"Skipping {len(oversized)} domain blocks over {MAX_BLOCK_CELLS} cells: "
+                        + ', '.join(f"{domain} ({int(n)})" for domain, n in oversized.head(10).items()))
+        q = q[~q['norm_domain'].isin(oversized.index)]
+    return q.merge(c, on='norm_domain')[['q', 'c']]
+
+
+def match_candidates(queries, candidates, top_k=DEFAULT_TOP_K, min_score=DEFAULT_MIN_SCORE,
+                     prefix_len=DEFAULT_PREFIX_LEN, prepared=False):
+    """
+    Score candidate rows for each query row. Returns one row per proposed pair with
+    query_id, candidate_id, their original names, name_score, domain_match, country_match,
+    score and rank,
+    keeping at most top_k pairs per query with score >= min_score.
+    """
+    if not prepared:
+        queries = prepare(queries, prefix_len)
+        candidates = prepare(candidates, prefix_len)
+        candidates = filter_to_blocks(candidates, set(queries['norm_domain']), set(queries['name_block']))
+    queries = queries.reset_index(drop=True)
+    candidates = candidates.reset_index(drop=True)
+    result_columns = ['query_id', 'candidate_id', 'query_name', 'candidate_name',
+                      'name_score', 'domain_match', 'country_match', 'score', 'rank']
+    if queries.empty or candidates.empty:
+        return pd.DataFrame(columns=result_columns)
+    logging.info(f"Fuzzy matching {len(queries)} queries against {len(candidates)} blocked candidates")
+    # Analyze each distinct name once, then expand back to rows
+    codes, distinct = pd.factorize(pd.concat([queries['norm_name'], candidates['norm_name']], ignore_index=True))
+    matrix = _vectorizer().fit_transform(distinct).tocsr()
+    q_matrix = matrix[codes[:len(queries)]]
+    c_matrix = matrix[codes[len(queries):]]
+
+    # Domain matches are scored separately below, so a name-block pair needs
+    # NAME_WEIGHT * s + COUNTRY_WEIGHT >= min_score to survive
+    min_name_score = max(0.0, (min_score - COUNTRY_WEIGHT) / NAME_WEIGHT)
+    pairs = _name_block_pairs(queries, candidates, q_matrix, c_matrix, top_k, min_name_score)
+    domain_pairs = _domain_pairs(queries, candidates)
+    if len(domain_pairs):
+        q_idx, c_idx = domain_pairs['q'].to_numpy(), domain_pairs['c'].to_numpy()
+        name_score = np.asarray(q_matrix[q_idx].multiply(c_matrix[c_idx]).sum(axis=1)).ravel()
+        pairs.append(pd.DataFrame({'q': q_idx, 'c': c_idx, 'name_score': name_score}))
+    if not pairs:
+        return pd.DataFrame(columns=result_columns)
+    pairs = pd.concat(pairs, ignore_index=True).drop_duplicates(['q', 'c'])
+
+    q_idx, c_idx = pairs['q'].to_numpy(), pairs['c'].to_numpy()
+    q_domain = queries['norm_domain'].to_numpy()[q_idx]
+    q_country = queries['country_key'].to_numpy()[q_idx]
+    pairs['domain_match'] = (q_domain != '') & (q_domain == candidates['norm_domain'].to_numpy()[c_idx])
+    pairs['country_match'] = (q_country != '') & (q_country == candidates['country_key'].to_numpy()[c_idx])
+    pairs['score'] = (NAME_WEIGHT * pairs['name_score'] + DOMAIN_WEIGHT * pairs['domain_match']
+                      + COUNTRY_WEIGHT * pairs['country_match']).astype('float32')
+    pairs = pairs[pairs['score'] >= min_score]
+    pairs = pairs.sort_values(['q', 'score'], ascending=[True, False], kind='stable')
+    pairs['rank'] = pairs.groupby('q').cumcount() + 1
+    pairs = pairs[pairs['rank'] <= top_k]
+    pairs['query_id'] = queries['id'].to_numpy()[pairs['q'].to_numpy()]
+    pairs['candidate_id'] = candidates['id'].to_numpy()[pairs['c'].to_numpy()]
+    pairs[['name_score', 'score']] = pairs[['name_score', 'score']].astype('float64').round(4)
+    pairs['query_name'] = queries['name'].to_numpy()[pairs['q'].to_numpy()]
+    pairs['candidate_name'] = candidates['name'].to_numpy()[pairs['c'].to_numpy()]
+    logging.info(f"Fuzzy matching proposed {len(pairs)} candidates for {pairs['q'].nunique()} of {len(queries)} queries")
+    return pairs[result_columns].reset_index(drop=True)
@@ -0,0 +1,246 @@
+"""
+Input Loading
+-------------
+Reads the ID columns (the first two: Pitchbook ID, then Voldemort ID) from
+the input file. Excel workbooks are streamed straight from the sheet XML,
+skipping every cell past column B, and the parsed IDs are kept in a Parquet
+sidecar (<input>.ids.parquet) keyed by the workbook's mtime, size and hash,
+so later runs skip Excel entirely. CSV, Parquet and Feather inputs are read
+directly.
+
+IDs come back as object columns of strings with NaN for empty cells, whatever
+the source; numeric Excel cells are written the way they display, so 123
+becomes '123' rather than '123.0'.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import zipfile
+from xml.etree.ElementTree import iterparse
+import numpy as np
+import pandas as pd
+
+ID_COLUMNS = 2
+SIDECAR_SUFFIX = '.ids.parquet'
+# Bumped whenever the parsed representation changes, so older sidecars are ignored
+SIDECAR_VERSION = 1
+_SIDECAR_KEY = b'entity_mapper_input'
+
+EXCEL = 'excel'
+LEGACY_EXCEL = 'legacy_excel'
+CSV = 'csv'
+PARQUET = 'parquet'
+FEATHER = 'feather'
+INPUT_FORMATS = {
+    '.xlsx': EXCEL, '.xlsm': EXCEL, '.xls': LEGACY_EXCEL,
+    '.csv': CSV, '.csv.gz': CSV, '.csv.zst': CSV, '.txt': CSV,
+    '.parquet': PARQUET, '.pq': PARQUET,
+    '.feather': FEATHER, '.arrow': FEATHER,
+}
+
+_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def input_format(file_path):
+    lower = file_path.lower()
+    for extension in sorted(INPUT_FORMATS, key=len, reverse=True):
+        if lower.endswith(extension):
+            return INPUT_FORMATS[extension]
+    raise ValueError(f"Unsupported input file {file_path!r}; expected one of {sorted(INPUT_FORMATS)}")
+
+
+def _column_index(ref):
+    """Zero-based column of a cell reference ('B12' -> 1)."""
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def _first_sheet_path(workbook):
+    with workbook.open('xl/workbook.xml') as f:
+        sheet = next(el for _, el in iterparse(f) if el.tag == f'{_MAIN_NS}sheet')
+    rel_id = sheet.get(f'{_REL_NS}id')
+    with workbook.open('xl/_rels/workbook.xml.rels') as f:
+        target = next(el.get('Target') for _, el in iterparse(f)
+                      if el.tag == f'{_PKG_REL_NS}Relationship' and el.get('Id') == rel_id)
+    return target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+
+
+def _shared_strings(workbook):
+    if 'xl/sharedStrings.xml' not in workbook.namelist():
+        return []
+    strings = []
+    with workbook.open('xl/sharedStrings.xml') as f:
+        for _, el in iterparse(f):
+            if el.tag == f'{_MAIN_NS}si':
+                strings.append(''.join(t.text or '' for t in el.iter(f'{_MAIN_NS}t')))
+                el.clear()
+    return strings
+
+
+def _cell_value(cell, shared):
+    kind = cell.get('t')
+    if kind == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter(f'{_MAIN_NS}t'))
+    value = cell.find(f'{_MAIN_NS}v')
+    if value is None or value.text is None:
+        return None
+    if kind == 's':
+        return shared[int(value.text)]
+    if kind == 'b':
+        return value.text == '1'
+    if kind in ('str', 'e'):
+        return value.text
+    number = float(value.text)
+    return int(number) if number.is_integer() else number
+
+
+def read_excel_id_columns(file_path, columns=ID_COLUMNS):
+    """Stream the first sheet of an .xlsx, keeping only its first `columns` columns."""
+    with zipfile.ZipFile(file_path) as workbook:
+        shared = _shared_strings(workbook)
+        rows = []
+        with workbook.open(_first_sheet_path(workbook)) as f:
+            for _, el in iterparse(f):
+                if el.tag != f'{_MAIN_NS}row':
+                    continue
+                # Rows missing from the XML are blank rows in the sheet
+                number = int(el.get('r') or len(rows) + 1)
+                rows.extend([None] * columns for _ in range(number - 1 - len(rows)))
+                values = [None] * columns
+                for position, cell in enumerate(el.iter(f'{_MAIN_NS}c')):
+                    ref = cell.get('r')
+                    index = _column_index(ref) if ref else position
+                    if index < columns:
+                        values[index] = _cell_value(cell, shared)
+                rows.append(values)
+                el.clear()
+    # Like read_excel, trailing blank rows are dropped and blank header cells become 'Unnamed: n'
+    while rows and all(value is None for value in rows[-1]):
+        rows.pop()
+    if not rows:
+        return pd.DataFrame()
+    width = max(i + 1 for row in rows for i, value in enumerate(row) if value is not None)
+    names = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(rows[0][:width])]
+    return pd.DataFrame([row[:width] for row in rows[1:]], columns=names, dtype=object)
+
+
+def read_csv_id_columns(file_path, columns=ID_COLUMNS):
+    header = pd.read_csv(file_path, nrows=0).columns
+    return pd.read_csv(file_path, usecols=list(range(min(columns, len(header)))), dtype=str,
+                       keep_default_na=False, na_values=[''])
+
+
+def read_id_columns(file_path, columns=ID_COLUMNS):
+    fmt = input_format(file_path)
+    if fmt == EXCEL:
+        return read_excel_id_columns(file_path, columns)
+    if fmt == LEGACY_EXCEL:
+        df = pd.read_excel(file_path)
+        return df.iloc[:, :columns]
+    if fmt == CSV:
+        return read_csv_id_columns(file_path, columns)
+    if fmt == PARQUET:
+        import pyarrow.parquet as pq
+        names = pq.read_schema(file_path).names[:columns]
+        return pd.read_parquet(file_path, columns=names)
+    import pyarrow.feather as feather
+    table = feather.read_table(file_path, memory_map=True)
+    return table.select(list(range(min(columns, table.num_columns)))).to_pandas()
+
+
+def as_id_strings(df, stringify=True):
+    """Object columns with every non-empty cell as a string and NaN for empty ones."""
+    out = pd.DataFrame(index=df.index)
+    for col_idx, name in enumerate(df.columns):
+        values = df.iloc[:, col_idx]
+        if stringify:
+            values = values.map(str, na_action='ignore')
+        out[name] = values.astype(object).where(values.notna(), np.nan)
+    return out
+
+
+def sidecar_path(file_path):
+    return f"{file_path}{SIDECAR_SUFFIX}"
+
+
+def _file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_state(file_path):
+    stat = os.stat(file_path)
+    return {'version': SIDECAR_VERSION, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def read_sidecar(file_path):
+    """The cached IDs for file_path, or None when there is no sidecar or the workbook changed."""
+    import pyarrow.parquet as pq
+    path = sidecar_path(file_path)
+    if not os.path.exists(path):
+        return None
+    metadata = pq.read_schema(path).metadata or {}
+    stored = json.loads(metadata.get(_SIDECAR_KEY, b'{}'))
+    state = _source_state(file_path)
+    if stored.get('version') != SIDECAR_VERSION or stored.get('size') != state['size']:
+        return None
+    if stored.get('mtime_ns') != state['mtime_ns']:
+        # Touched or copied but possibly unchanged: fall back to the content hash
+        digest = _file_digest(file_path)
+        if stored.get('sha256') != digest:
+            return None
+        df = as_id_strings(pd.read_parquet(path), stringify=False)
+        write_sidecar(file_path, df, digest)
+        return df
+    return as_id_strings(pd.read_parquet(path), stringify=False)
+
+
+def write_sidecar(file_path, df, digest=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    state = dict(_source_state(file_path), sha256=digest or _file_digest(file_path))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), _SIDECAR_KEY: json.dumps(state)})
+    path = sidecar_path(file_path)
+    temp_path = f"{path}.tmp"
+    pq.write_table(table, temp_path)
+    os.replace(temp_path, path)
+
+
+def load_input_data(file_path, use_cache=True):
+    try:
+        logging.info(f"Loading input file: {file_path}")
+        cacheable = use_cache and input_format(file_path) == EXCEL
+        df = None
+        if cacheable:
+            try:
+                df = read_sidecar(file_path)
+            except (ImportError, OSError, ValueError) as e:
+                logging.warning(f"Ignoring input cache {sidecar_path(file_path)}: {e}")
+            if df is not None:
+                logging.info(f"Loaded IDs from input cache {sidecar_path(file_path)}")
+        if df is None:
+            df = as_id_strings(read_id_columns(file_path))
+            if cacheable:
+                try:
+                    write_sidecar(file_path, df)
+                except (ImportError, OSError) as e:
+                    logging.warning(f"Could not write input cache {sidecar_path(file_path)}: {e}")
+        logging.info(f"Input file columns: {df.columns.tolist()}")
+        logging.info(f"Input file shape: {df.shape}")
+        return df
+    except Exception as e:
+        logging.error(f"Failed to load input file: {e}")
+        raise
@@ -0,0 +1,294 @@
+"""
+Join Stage
+----------
+Vectorized left joins of fetched Snowflake tables onto a column of IDs.
+Replaces the per-row iterrows()/at[] loops: each side table is indexed once by
+its key column and the whole ID column is looked up in a single reindex.
+
+A side table that returns several rows for one ID is reduced to one row per
+ID before the join under a dedup policy (last, first, latest:COLUMN,
+aggregate or error). The `all` policy keeps every row instead, so an ID
+matching n rows fans out to n output rows, and the join aborts before
+building the product when it would exceed its row budget.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Normalization rules tried in order when matching Voldemort BQ_IDs
+EXACT = 'exact'
+LSTRIP_ZEROS = 'lstrip_zeros'
+INT_CANONICAL = 'int_canonical'
+BQ_ID_RULES = (EXACT, LSTRIP_ZEROS, INT_CANONICAL)
+
+# Dedup policies for side tables with several rows per ID
+LAST = 'last'
+FIRST = 'first'
+LATEST = 'latest'
+AGGREGATE = 'aggregate'
+ERROR = 'error'
+ALL = 'all'
+DEDUP_POLICIES = (LAST, FIRST, LATEST, AGGREGATE, ERROR, ALL)
+# Joins the distinct values AGGREGATE finds for one ID in one column
+AGGREGATE_SEPARATOR = ' | '
+
+
+class DuplicateKeyError(ValueError):
+    """A side table has several rows for one ID under the `error` dedup policy."""
+
+
+class FanoutError(ValueError):
+    """A join under the `all` dedup policy would produce more rows than its budget."""
+
+
+def parse_dedup_policy(value):
+    """(policy, column) for 'last', 'first', 'latest:COLUMN', 'aggregate', 'error' or 'all'."""
+    policy, _, column = value.partition(':')
+    policy = policy.strip().lower()
+    column = column.strip() or None
+    if policy not in DEDUP_POLICIES:
+        raise ValueError(f"Unknown dedup policy {value!r}; expected one of {list(DEDUP_POLICIES)}")
+    if (policy == LATEST) != (column is not None):
+        raise ValueError(f"Use latest:COLUMN to keep the row with the latest COLUMN per ID, got {value!r}")
+    return policy, column
+
+
+def as_key(values, strip=False):
+    """Stringify IDs the same way str() does, so 'nan'/'None' keys behave like the old dict lookups."""
+    keys = pd.Series(values).map(str)
+    if strip:
+        keys = keys.str.strip()
+    return keys
+
+
+def index_by_key(df, key_col, strip=False):
+    """Index a side table by its stringified key column, keeping the last row per key."""
+    keys = as_key(df[key_col], strip=strip) if key_col in df.columns else pd.Series('', index=df.index)
+    indexed = df.set_axis(pd.Index(keys.to_numpy(), name=None), axis=0)
+    return indexed[~indexed.index.duplicated(keep='last')]
+
+
+def duplicate_counts(keys):
+    """(IDs with more than one row, rows beyond the first for those IDs)."""
+    counts = pd.Series(keys).value_counts()
+    duplicated = counts[counts > 1]
+    return len(duplicated), int((duplicated - 1).sum())
+
+
+def _aggregate_values(values):
+    distinct = list(dict.fromkeys(value for value in values if not pd.isna(value)))
+    if not distinct:
+        return None
+    if len(distinct) == 1:
+        return distinct[0]
+    return AGGREGATE_SEPARATOR.join(map(str, distinct))
+
+
+def _aggregate_duplicates(df, keys, key_col, duplicated):
+    """One row per duplicated key: the distinct non-null values of each column, at the key's first row."""
+    first_rows = np.flatnonzero(duplicated & ~keys.duplicated(keep='first').to_numpy())
+    groups = df[duplicated].groupby(keys[duplicated].to_numpy(), sort=False)
+    aggregated = groups.agg({col: ('first' if col == key_col else _aggregate_values) for col in df.columns})
+    single_rows = np.flatnonzero(~duplicated)
+    combined = pd.concat([df.iloc[single_rows], aggregated.set_axis(df.index[first_rows])])
+    return combined.iloc[np.argsort(np.concatenate([single_rows, first_rows]), kind='stable')]
+
+
+def dedup_by_key(df, key_col, policy=LAST, column=None, strip=False):
+    """
+    One row per stringified key under policy, keeping the kept rows in fetch order.
+    ALL returns df unchanged (the join fans out instead); ERROR raises DuplicateKeyError.
+    """
+    if policy == ALL or key_col not in df.columns or df.empty:
+        return df
+    keys = as_key(df[key_col], strip=strip).reset_index(drop=True)
+    duplicated = keys.duplicated(keep=False).to_numpy()
+    if not duplicated.any():
+        return df
+    if policy == ERROR:
+        examples = keys[duplicated].unique()[:5].tolist()
+        count, extra = duplicate_counts(keys[duplicated])
+        raise DuplicateKeyError(f"{count} {key_col} values have more than one row ({extra} extra rows), "
+                                f"e.g. {examples}; pick a --dedup policy")
+    if policy == FIRST:
+        return df[~keys.duplicated(keep='first').to_numpy()]
+    if policy == LAST:
+        return df[~keys.duplicated(keep='last').to_numpy()]
+    if policy == LATEST:
+        if column not in df.columns:
+            raise ValueError(f"Dedup column {column} is not among the fetched {key_col} table's columns")
+        # Ascending by column with nulls first, so the last row per key is the latest one
+        order = df[column].reset_index(drop=True).sort_values(kind='stable', na_position='first').index.to_numpy()
+        keep = ~keys.iloc[order].duplicated(keep='last').to_numpy()
+        return df.iloc[np.sort(order[keep])]
+    if policy == AGGREGATE:
+        return _aggregate_duplicates(df, keys, key_col, duplicated)
+    raise ValueError(f"Unknown dedup policy: {policy}")
+
+
+def fan_out(side_df, key_col, key_index, positions, strip=False, max_rows=None):
+    """
+    Expand the one-row-per-key matches of key_index to every side_df row with the
+    matched key. Returns (input row per output row, side_df row position or -1),
+    or None when no matched key has more than one row. Raises FanoutError before
+    materializing anything when the output would exceed max_rows.
+    """
+    if key_col not in side_df.columns:
+        return None
+    codes, uniques = pd.factorize(as_key(side_df[key_col], strip=strip))
+    counts = np.bincount(codes, minlength=len(uniques))
+    if not (counts > 1).any():
+        return None
+    frame_codes = pd.Index(uniques).get_indexer(key_index.frame.index)
+    hit = positions >= 0
+    matched_codes = np.where(hit, frame_codes[np.where(hit, positions, 0)], -1)
+    row_counts = np.where(hit, counts[np.maximum(matched_codes, 0)], 1)
+    total = int(row_counts.sum())
+    if max_rows is not None and total > max_rows:
+        raise FanoutError(f"Duplicate {key_col} rows would fan {len(positions)} rows out to {total}, over the "
+                          f"budget of {max_rows}; raise --max-fanout or pick another --dedup policy")
+    if total == len(positions):
+        return None
+    rows = np.repeat(np.arange(len(positions)), row_counts)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    by_code = np.argsort(codes, kind='stable')
+    offsets = np.arange(total) - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+    row_codes = matched_codes[rows]
+    side_positions = np.where(row_codes >= 0, by_code[starts[np.maximum(row_codes, 0)] + offsets], -1)
+    return rows, side_positions
+
+
+def normalize_keys(keys, rule):
+    """Vectorized normalized form of each key under a rule; None where the rule does not apply."""
+    keys = pd.Series(keys, dtype=object)
+    if rule == EXACT:
+        return keys
+    if rule == LSTRIP_ZEROS:
+        return keys.str.lstrip('0')
+    if rule == INT_CANONICAL:
+        # str(int(x)) for all-digit strings: leading zeros dropped, all-zero -> '0'
+        digits = keys.str.isdigit().fillna(False).astype(bool)
+        stripped = keys.str.lstrip('0')
+        return stripped.where(stripped != '', '0').where(digits, None)
+    raise ValueError(f"Unknown ID normalization rule: {rule}")
+
+
+def key_variants(keys, rules=BQ_ID_RULES):
+    """
+    Every normalized form of the keys, so one IN-list fetch returns rows stored
+    under any of them. Only the input's own spellings can be listed: a side row
+    stored with zeros the input lacks ('0007' for input '7') is not fetched, so
+    KeyIndex only matches it if it arrives some other way. crosswalk
+    --server-join compares LTRIM(BQ_ID, '0') in Snowflake and has no such gap.
+    """
+    keys = pd.Series(keys, dtype=object)
+    forms = pd.concat([normalize_keys(keys, rule) for rule in rules], ignore_index=True)
+    return forms[forms.notna() & (forms != '')].unique().tolist()
+
+
+class KeyIndex:
+    """
+    Canonical-ID index of a side table. Built once per fetched table, it maps
+    every normalized form of the key column (one lookup per rule) to a row, so
+    both sides of the join are normalized the same way: '007', '7' and '0007'
+    all meet under LSTRIP_ZEROS whichever side carries the zeros.
+    """
+
+    def __init__(self, df, key_col, strip=False, rules=(EXACT,)):
+        self.rules = tuple(rules)
+        self.strip = strip
+        self.frame = index_by_key(df, key_col, strip=strip)
+        raw = pd.Series(self.frame.index.to_numpy(dtype=object), dtype=object)
+        self._lookups = {}
+        for rule in self.rules:
+            normalized = normalize_keys(raw, rule)
+            usable = (normalized.notna() & (normalized != '')).to_numpy()
+            positions = np.flatnonzero(usable)
+            normalized = normalized.to_numpy(dtype=object)[usable]
+            # When several keys share a normalized form, the one already in that form wins
+            order = np.argsort(normalized == raw.to_numpy(dtype=object)[usable], kind='stable')
+            lookup = pd.Index(normalized[order])
+            keep = ~lookup.duplicated(keep='last')
+            self._lookups[rule] = (lookup[keep], positions[order][keep])
+
+    def match(self, keys):
+        """
+        Resolve each key using the rules in order.
+        Returns (row position in self.frame or -1, rule per row or None).
+        """
+        keys = pd.Series(keys, dtype=object).reset_index(drop=True)
+        if self.strip:
+            keys = keys.str.strip()
+        positions = np.full(len(keys), -1, dtype=np.intp)
+        rule_hit = pd.Series(None, index=keys.index, dtype=object)
+        for rule in self.rules:
+            pending = np.flatnonzero(positions < 0)
+            if not len(pending):
+                break
+            candidate = normalize_keys(keys.iloc[pending], rule)
+            lookup, lookup_positions = self._lookups[rule]
+            found = lookup.get_indexer(candidate.to_numpy(dtype=object))
+            hit = (found >= 0) & (candidate.notna() & (candidate != '')).to_numpy()
+            positions[pending[hit]] = lookup_positions[found[hit]]
+            rule_hit.iloc[pending[hit]] = rule
+        return positions, rule_hit
+
+    def keys_at(self, positions):
+        """Side-table key per position; None for unmatched (-1) positions."""
+        keys = np.full(len(positions), None, dtype=object)
+        hit = positions >= 0
+        keys[hit] = self.frame.index.to_numpy(dtype=object).take(positions[hit])
+        return keys
+
+
+def rule_counts(rule_hit, rules=BQ_ID_RULES):
+    """Number of rows each normalization rule matched."""
+    counts = rule_hit.value_counts()
+    return {rule: int(counts.get(rule, 0)) for rule in rules}
+
+
+def match_side(keys, side_df, key_col, strip=False, rules=(EXACT,), duplicates=LAST, max_rows=None):
+    """
+    The row matches behind a left join of side_df onto keys, without taking any
+    side columns: (source frame, key row per output row or None when every key
+    gives one row, source row position per output row or -1, rule per output row).
+    """
+    key_index = KeyIndex(side_df, key_col, strip=strip, rules=rules)
+    positions, rule_hit = key_index.match(keys)
+    expanded = fan_out(side_df, key_col, key_index, positions, strip, max_rows) if duplicates == ALL else None
+    if expanded is None:
+        return key_index.frame, None, positions, rule_hit
+    rows, positions = expanded
+    return side_df, rows, positions, rule_hit.iloc[rows]
+
+
+def left_join_prefixed(keys, side_df, key_col, prefix, strip=False, rules=(EXACT,), fill_value="",
+                       duplicates=LAST, max_rows=None):
+    """
+    Left-join side_df onto a column of keys through a KeyIndex.
+    Every side column is returned as f"{prefix}{col}", aligned to keys' index;
+    unmatched rows are filled with fill_value, or with NA in the column's own
+    dtype when fill_value is None. With duplicates=ALL a key matching several
+    side rows repeats its index label once per row (at most max_rows rows).
+    Returns (joined_df, rule_per_row).
+    """
+    keys = pd.Series(keys)
+    indexed, rows, positions, rule_hit = match_side(keys, side_df, key_col, strip, rules, duplicates, max_rows)
+    index = keys.index if rows is None else keys.index.take(rows)
+    hit = positions >= 0
+    columns = {}
+    for col_idx, col in enumerate(indexed.columns):
+        if fill_value is None:
+            columns[f"{prefix}{col}"] = pd.api.extensions.take(indexed.iloc[:, col_idx].array, positions,
+                                                               allow_fill=True)
+            continue
+        values = indexed.iloc[:, col_idx].to_numpy()
+        if hit.all():
+            columns[f"{prefix}{col}"] = values.take(positions)
+        else:
+            filled = np.full(len(positions), fill_value, dtype=object)
+            filled[hit] = values.take(positions[hit])
+            columns[f"{prefix}{col}"] = filled
+    joined = pd.DataFrame(columns, index=index)
+    rule_hit.index = index
+    return joined, rule_hit
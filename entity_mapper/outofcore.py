@@ -0,0 +1,163 @@
+"""
+Out-of-core Join
+----------------
+The --join-backend duckdb join. Matching is unchanged: every side is matched
+to the ID columns through the same KeyIndex rules, dedup policies and fan-out
+as the pandas join, which only produces one row position per output row. The
+wide product, i.e. taking every side column at those positions, then runs in
+an in-process DuckDB instead of pandas:
+
+- the ID columns, the positions and the fetched side tables are registered
+  as Arrow tables (Arrow-backed string columns are handed over without a copy);
+- DuckDB joins on the positions across all cores, spilling to a temp
+  directory once it reaches --join-memory-limit;
+- the result is streamed back in --chunk-rows record batches that go straight
+  to the writer, so the joined rows never sit in pandas memory all at once.
+
+Rows, order and column names are the pandas join's, and integers come back as
+nullable Int64 so CSV output is byte-identical. Needs the `duckdb` package.
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from entity_mapper.join import EXACT, LAST, match_side
+
+PANDAS = 'pandas'
+DUCKDB = 'duckdb'
+JOIN_BACKENDS = (PANDAS, DUCKDB)
+ROW_COLUMN = '__row'
+POSITION_COLUMN = '__pos'
+
+
+def require_backend(backend):
+    """Fail fast when the chosen join backend's package is missing."""
+    if backend == DUCKDB:
+        try:
+            import duckdb  # noqa: F401
+        except ImportError:
+            raise ImportError("--join-backend duckdb requires the 'duckdb' package (pip install duckdb)")
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _arrow_table(df):
+    """df as an Arrow table; object columns pyarrow can't type (mixed values) are stringified."""
+    import pyarrow as pa
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    arrays = []
+    for col_idx in range(df.shape[1]):
+        values = df.iloc[:, col_idx]
+        try:
+            arrays.append(pa.Array.from_pandas(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array(values.map(lambda value: None if pd.isna(value) else str(value)), pa.string()))
+    return pa.Table.from_arrays(arrays, names=[str(col) for col in df.columns])
+
+
+def _nullable_dtype(arrow_type):
+    # Integers and booleans with nulls would otherwise come back as float/object and print as '5.0'
+    import pyarrow as pa
+    if pa.types.is_integer(arrow_type):
+        return pd.Int64Dtype()
+    if pa.types.is_boolean(arrow_type):
+        return pd.BooleanDtype()
+    return None
+
+
+class DuckDBJoin:
+    """
+    Left joins of side tables onto a frame of ID columns, matched up front and
+    materialized in DuckDB. add_side() mirrors left_join_prefixed: keys are the
+    current base rows' keys, and a fanned-out side repeats the base rows (and
+    every earlier side's positions) it matched more than once.
+    """
+
+    def __init__(self, base):
+        self.base = base.reset_index(drop=True)
+        self._sides = []
+
+    def add_side(self, keys, side_df, key_col, prefix, strip=False, rules=(EXACT,), duplicates=LAST, max_rows=None):
+        """Match side_df to keys and queue its columns as f"{prefix}{col}"; returns the rule per output row."""
+        source, rows, positions, rule_hit = match_side(pd.Series(keys), side_df, key_col, strip, rules,
+                                                       duplicates, max_rows)
+        if rows is not None:
+            self.base = self.base.take(rows).reset_index(drop=True)
+            self._sides = [(side_prefix, frame, side_positions.take(rows))
+                           for side_prefix, frame, side_positions in self._sides]
+        self._sides.append((prefix, source, positions))
+        return rule_hit.reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.base)
+
+    def _expressions(self):
+        """Output column name -> SQL expression, in pandas join order."""
+        expressions = {col: f"b.{_quote(col)}" for col in self.base.columns}
+        for side_idx, (prefix, frame, _) in enumerate(self._sides):
+            for col in frame.columns:
+                expressions[f"{prefix}{col}"] = f"s{side_idx}.{_quote(col)}"
+        return expressions
+
+    @property
+    def columns(self):
+        return list(self._expressions())
+
+    def query(self, select=None):
+        """The join as SQL; select is [(column, output name)] (default: every column as named)."""
+        expressions = self._expressions()
+        select = select or [(col, col) for col in expressions]
+        select_sql = ', '.join(f"{expressions[col]} AS {_quote(name)}" for col, name in select)
+        joins = ''.join(f"\n        LEFT JOIN side{side_idx} s{side_idx} ON s{side_idx}.{_quote(POSITION_COLUMN)} = "
+                        f"b.{_quote(f'{POSITION_COLUMN}{side_idx}')}" for side_idx in range(len(self._sides)))
+        return f"""
+        SELECT {select_sql}
+        FROM base b{joins}
+        ORDER BY b.{_quote(ROW_COLUMN)}
+        """
+
+    def _register(self, con):
+        import pyarrow as pa
+        base = _arrow_table(self.base).append_column(ROW_COLUMN, pa.array(np.arange(len(self.base))))
+        for side_idx, (_, frame, positions) in enumerate(self._sides):
+            base = base.append_column(f'{POSITION_COLUMN}{side_idx}',
+                                      pa.array(positions.astype(np.int64), mask=positions < 0))
+            side = _arrow_table(frame).append_column(POSITION_COLUMN, pa.array(np.arange(len(frame))))
+            con.register(f'side{side_idx}', side)
+        con.register('base', base)
+
+    def iter_frames(self, select=None, chunk_rows=50000, memory_limit=None, temp_dir=None, threads=None):
+        """Run the join and yield it as pandas frames of up to chunk_rows rows."""
+        import duckdb
+        spill_dir = tempfile.mkdtemp(prefix='.entity_mapper_join.', dir=temp_dir)
+        settings = {'temp_directory': spill_dir}
+        if memory_limit:
+            settings['memory_limit'] = memory_limit
+        if threads:
+            settings['threads'] = threads
+        con = duckdb.connect(':memory:', config=settings)
+        try:
+            self._register(con)
+            reader = con.execute(self.query(select)).fetch_record_batch(chunk_rows)
+            empty = True
+            for batch in reader:
+                empty = False
+                yield batch.to_pandas(types_mapper=_nullable_dtype)
+            if empty:
+                # Still give the writer a header
+                yield pd.DataFrame(columns=[name for _, name in select] if select else self.columns)
+        finally:
+            con.close()
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def spill_directory(config):
+    """Where DuckDB spills: --join-temp-dir, else next to the output file."""
+    return config.join_temp_dir or os.path.dirname(os.path.abspath(config.output_file))
@@ -0,0 +1,635 @@
+"""
+Mapping Pipeline
+----------------
+The fetch -> join -> write stages behind each subcommand. Every subcommand
+produces a stream of joined chunks (a single chunk unless streaming is on)
+that the writer consumes as they arrive.
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from entity_mapper.config import PITCHBOOK_COMMON_TABLE, PITCHBOOK_FEED_TABLE, VOLDEMORT_TABLE
+from entity_mapper.diagnostics import MatchDiagnostics
+from entity_mapper.dtypes import compact_frame
+from entity_mapper.delta import (ADDED, CHANGE_COLUMN, REMOVED, CrosswalkDelta, iter_kept_rows, load_previous_pairs,
+                                 remove_snapshot, snapshot_path, write_snapshot)
+from entity_mapper.fuzzy import (filter_to_blocks, match_candidates, match_frame, prepare,
+                                 resolve_match_fields)
+from entity_mapper.join import (ALL, BQ_ID_RULES, EXACT, LAST, KeyIndex, as_key, dedup_by_key, duplicate_counts,
+                                left_join_prefixed, parse_dedup_policy, rule_counts)
+from entity_mapper.outofcore import DUCKDB, DuckDBJoin, spill_directory
+from entity_mapper.pushdown import BQ_RULE_COLUMN, PB_HIT_COLUMN, build_crosswalk_join_query
+from entity_mapper.sources import (get_bulk_company_common, get_bulk_voldemort_firmographics,
+                                   get_crosswalk_pairs, get_pitchbook_data, get_table_columns,
+                                   get_voldemort_data, iter_crosswalk_chunks, iter_match_candidates)
+from entity_mapper.report import in_context, stage
+from entity_mapper.streaming import concat_frames, iter_query, iter_row_chunks
+from entity_mapper.verify import verify_pairs
+from entity_mapper.writer import write_chunks
+
+
+# Fuzzy match side -> (metadata table, ID column)
+MATCH_SIDES = {
+    'pitchbook': (PITCHBOOK_COMMON_TABLE, 'COMPANY_ID'),
+    'voldemort': (VOLDEMORT_TABLE, 'BQ_ID'),
+}
+FUZZY_OUTPUT_COLUMNS = ['pitchbook_id', 'bq_id', 'unmatched_side', 'candidate_id', 'query_name', 'candidate_name',
+                        'name_score', 'domain_match', 'country_match', 'score', 'rank']
+
+
+def fetch_concurrently(pool, *fetches):
+    """Run each fetch(conn) on its own pooled connection and return the results in order."""
+    def run(fetch):
+        with pool.connection() as conn:
+            return fetch(conn)
+    with ThreadPoolExecutor(max_workers=len(fetches), thread_name_prefix='side-fetch') as executor:
+        futures = [executor.submit(in_context(run), fetch) for fetch in fetches]
+        return [future.result() for future in futures]
+
+
+def timed_fetch(name, fetch, ids):
+    """Wrap fetch(conn) so each call is recorded as run-report stage `name`."""
+    def run(conn):
+        with stage(name) as timed:
+            df = fetch(conn)
+            timed.add(rows_in=len(ids), rows_out=len(df))
+            return df
+    return run
+
+
+def timed_chunks(name, chunks):
+    """Yield from chunks, recording each pull as run-report stage `name`."""
+    chunks = iter(chunks)
+    while True:
+        with stage(name) as timed:
+            chunk = next(chunks, None)
+            if chunk is not None:
+                timed.add(rows_out=len(chunk))
+        if chunk is None:
+            return
+        yield chunk
+
+
+def compact_side(config, side_df, id_col):
+    """The side table in compact dtypes (its ID column is left for KeyIndex to stringify)."""
+    if not config.compact_dtypes:
+        return side_df
+    with stage('compact') as timed:
+        side_df = compact_frame(side_df, keep=(id_col,))
+        timed.add(rows_in=len(side_df), rows_out=len(side_df))
+    return side_df
+
+
+def dedup_policy(config, table):
+    """(policy, column) for table: its --dedup TABLE=POLICY override, else the default policy."""
+    return parse_dedup_policy(config.dedup_policies.get(table, config.dedup_policy))
+
+
+def dedup_side(config, side_df, table, id_col, side, stats=None, strip=False):
+    """Check side_df for IDs with several rows and reduce it to one row per ID under the table's policy."""
+    if side_df.empty or id_col not in side_df.columns:
+        return side_df
+    policy, column = dedup_policy(config, table)
+    with stage(f'{side}_dedup') as timed:
+        rows_in = len(side_df)
+        count, extra = duplicate_counts(as_key(side_df[id_col], strip=strip))
+        if count:
+            if stats is not None:
+                stats[f'{side}_duplicates'] = stats.get(f'{side}_duplicates', 0) + count
+            action = {ALL: "keeping every row (fan-out)"}.get(policy, f"applying the {policy} policy")
+            logging.warning(f"{table}: {count} {id_col} values have more than one row ({extra} extra rows); {action}")
+            side_df = dedup_by_key(side_df, id_col, policy, column, strip=strip)
+        timed.add(rows_in=rows_in, rows_out=len(side_df))
+    return side_df
+
+
+def fanout_limit(config, rows):
+    """Most rows a chunk of rows may grow to through --dedup all joins."""
+    return max(int(config.max_fanout * rows), rows)
+
+
+def add_joined(result_df, joined):
+    """Append a side's joined columns, repeating the rows a fanned-out join matched more than once."""
+    if len(joined) != len(result_df):
+        result_df = result_df.loc[joined.index].reset_index(drop=True)
+        joined = joined.reset_index(drop=True)
+    return pd.concat([result_df, joined], axis=1)
+
+
+def join_fill_value(config):
+    """Compact frames fill unmatched cells with NA in each column's dtype; object frames with ''."""
+    return None if config.compact_dtypes else ""
+
+
+def iter_input_chunks(input_df, config):
+    if not config.stream or input_df.empty:
+        yield input_df
+        return
+    yield from iter_row_chunks(input_df, config.chunk_rows)
+
+
+def record_diagnostics(stats, side, keys, rule_hit=None):
+    """Add each output row's ID and the rule that matched it (None: unmatched) to the missing-ID diagnostics."""
+    if stats is None:
+        return
+    if rule_hit is None:
+        rule_hit = pd.Series(None, index=range(len(keys)), dtype=object)
+    stats.setdefault('diagnostics', MatchDiagnostics()).add(side, keys, rule_hit)
+
+
+def record_matches(stats, side, rule_hit, rules=(EXACT,), keys=None):
+    """
+    Accumulate a side's matched-row count and its per-normalization-rule
+    breakdown; keys (the ID per row of rule_hit) also go to the diagnostics.
+    """
+    if stats is None:
+        return
+    stats[side] = stats.get(side, 0) + int(rule_hit.notna().sum())
+    by_rule = stats.setdefault(f'{side}_rules', dict.fromkeys(rules, 0))
+    for rule, count in rule_counts(rule_hit, rules).items():
+        by_rule[rule] = by_rule.get(rule, 0) + count
+    if keys is not None:
+        record_diagnostics(stats, side, keys, rule_hit)
+
+
+def log_match_stats(stats):
+    logging.info(f"Filled data: {stats.get('pitchbook', 0)} rows with Pitchbook data, "
+                 f"{stats.get('voldemort', 0)} rows with Voldemort data")
+    if stats.get('pitchbook_duplicates') or stats.get('voldemort_duplicates'):
+        logging.info(f"Duplicate IDs in the fetched tables: {stats.get('pitchbook_duplicates', 0)} Pitchbook, "
+                     f"{stats.get('voldemort_duplicates', 0)} Voldemort")
+    by_rule = stats.get('voldemort_rules')
+    if by_rule:
+        logging.info("Voldemort matches by BQ_ID rule: " + ", ".join(f"{rule}={count}" for rule, count in by_rule.items()))
+
+
+def build_complete_frame(input_df, pitchbook_df, voldemort_df, stats=None, fill_value="",
+                         pb_duplicates=LAST, vd_duplicates=LAST, max_rows=None):
+    result_df = id_frame(input_df)
+    logging.info(f"Starting with {len(result_df)} rows")
+    # Join on columns rather than rows so an empty fetch still yields a stable header
+    pb_keys = as_key(result_df['pitchbook_id'])
+    if len(pitchbook_df.columns):
+        logging.info(f"Adding {len(pitchbook_df.columns)} Pitchbook columns")
+        pb_joined, pb_hits = left_join_prefixed(pb_keys, pitchbook_df, 'COMPANY_ID', 'pb_',
+                                                fill_value=fill_value, duplicates=pb_duplicates, max_rows=max_rows)
+        result_df = add_joined(result_df, pb_joined)
+        record_matches(stats, 'pitchbook', pb_hits, keys=pb_keys.loc[pb_hits.index])
+    else:
+        record_diagnostics(stats, 'pitchbook', pb_keys)
+    vd_keys = as_key(result_df['bq_id'])
+    if len(voldemort_df.columns):
+        logging.info(f"Adding {len(voldemort_df.columns)} Voldemort columns")
+        # Try the raw ID, then without leading zeros, then its int() canonical form
+        vd_joined, vd_hits = left_join_prefixed(vd_keys, voldemort_df, 'BQ_ID', 'vd_',
+                                                strip=True, rules=BQ_ID_RULES, fill_value=fill_value,
+                                                duplicates=vd_duplicates, max_rows=max_rows)
+        result_df = add_joined(result_df, vd_joined)
+        record_matches(stats, 'voldemort', vd_hits, BQ_ID_RULES, keys=vd_keys.loc[vd_hits.index])
+    else:
+        record_diagnostics(stats, 'voldemort', vd_keys)
+    return result_df
+
+
+def build_pitchbook_only_frame(input_df, pitchbook_df, stats=None, fill_value="", pb_duplicates=LAST,
+                               max_rows=None):
+    result_df = id_frame(input_df, voldemort=False)
+    # Join on columns rather than rows so an empty fetch still yields a stable header
+    pb_keys = as_key(result_df['pitchbook_id'])
+    if len(pitchbook_df.columns):
+        pb_joined, pb_hits = left_join_prefixed(pb_keys, pitchbook_df, 'COMPANY_ID', 'pb_',
+                                                fill_value=fill_value, duplicates=pb_duplicates, max_rows=max_rows)
+        result_df = add_joined(result_df, pb_joined)
+        record_matches(stats, 'pitchbook', pb_hits, keys=pb_keys.loc[pb_hits.index])
+    else:
+        record_diagnostics(stats, 'pitchbook', pb_keys)
+    return result_df
+
+
+def build_crosswalk_frame(crosswalk_df, pb_df, vd_df, stats=None, fill_value="", pb_duplicates=LAST,
+                          vd_duplicates=LAST, max_rows=None):
+    # Assume first column is Pitchbook ID, second is Voldemort ID
+    result_df = id_frame(crosswalk_df)
+    # Join through the same canonical-ID index as the Excel path (checked on columns,
+    # not rows, so an empty fetch still yields a stable header)
+    pb_keys = as_key(result_df['pitchbook_id'])
+    if len(pb_df.columns):
+        pb_joined, pb_hits = left_join_prefixed(pb_keys, pb_df, 'COMPANY_ID', 'pb_',
+                                                fill_value=fill_value, duplicates=pb_duplicates, max_rows=max_rows)
+        result_df = add_joined(result_df, pb_joined)
+        record_matches(stats, 'pitchbook', pb_hits, keys=pb_keys.loc[pb_hits.index])
+    else:
+        record_diagnostics(stats, 'pitchbook', pb_keys)
+    vd_keys = as_key(result_df['bq_id'])
+    if len(vd_df.columns):
+        vd_joined, vd_hits = left_join_prefixed(vd_keys, vd_df, 'BQ_ID', 'vd_',
+                                                strip=True, rules=BQ_ID_RULES, fill_value=fill_value,
+                                                duplicates=vd_duplicates, max_rows=max_rows)
+        result_df = add_joined(result_df, vd_joined)
+        record_matches(stats, 'voldemort', vd_hits, BQ_ID_RULES, keys=vd_keys.loc[vd_hits.index])
+    else:
+        record_diagnostics(stats, 'voldemort', vd_keys)
+    # Drop duplicate key columns if present
+    result_df = result_df.drop(columns=['pb_COMPANY_ID', 'vd_BQ_ID'], errors='ignore')
+    # Rename vd_ and vd_BQ_ columns to bq_
+    result_df = result_df.rename(columns={col: 'bq_' + (col[6:] if col.startswith('vd_BQ_') else col[3:])
+                                          for col in result_df.columns if col.startswith('vd_')})
+    # Reorder columns: pitchbook_id, all pb_*, bq_id, all bq_* (each side in its SELECT order)
+    pb_cols = [col for col in result_df.columns if col.startswith('pb_')]
+    bq_cols = [col for col in result_df.columns if col.startswith('bq_') and col != 'bq_id']
+    ordered_cols = ['pitchbook_id'] + pb_cols + ['bq_id'] + bq_cols
+    # Add any remaining columns (shouldn't be any, but just in case)
+    ordered_cols += [col for col in result_df.columns if col not in ordered_cols]
+    return result_df[ordered_cols]
+
+
+def crosswalk_layout(columns):
+    """(joined column, output name) in the order build_crosswalk_frame drops, renames and arranges them."""
+    renamed = [(col, 'bq_' + (col[6:] if col.startswith('vd_BQ_') else col[3:]) if col.startswith('vd_') else col)
+               for col in columns if col not in ('pb_COMPANY_ID', 'vd_BQ_ID')]
+    ordered = ([pair for pair in renamed if pair[1] == 'pitchbook_id'] +
+               [pair for pair in renamed if pair[1].startswith('pb_')] +
+               [pair for pair in renamed if pair[1] == 'bq_id'] +
+               [pair for pair in renamed if pair[1].startswith('bq_') and pair[1] != 'bq_id'])
+    return ordered + [pair for pair in renamed if pair not in ordered]
+
+
+def out_of_core_join(config, base, pitchbook_df, pitchbook_table, voldemort_df=None, stats=None):
+    """
+    A DuckDBJoin of the Pitchbook side on base['pitchbook_id'] and the Voldemort
+    side on base['bq_id'], matched exactly as the pandas builders match them.
+    """
+    join = DuckDBJoin(base)
+    max_rows = fanout_limit(config, len(base))
+    if len(pitchbook_df.columns):
+        pb_hits = join.add_side(as_key(join.base['pitchbook_id']), pitchbook_df, 'COMPANY_ID', 'pb_',
+                                duplicates=dedup_policy(config, pitchbook_table)[0], max_rows=max_rows)
+        record_matches(stats, 'pitchbook', pb_hits, keys=as_key(join.base['pitchbook_id']))
+    else:
+        record_diagnostics(stats, 'pitchbook', as_key(join.base['pitchbook_id']))
+    if voldemort_df is not None and len(voldemort_df.columns):
+        vd_hits = join.add_side(as_key(join.base['bq_id']), voldemort_df, 'BQ_ID', 'vd_', strip=True,
+                                rules=BQ_ID_RULES, duplicates=dedup_policy(config, VOLDEMORT_TABLE)[0],
+                                max_rows=max_rows)
+        record_matches(stats, 'voldemort', vd_hits, BQ_ID_RULES, keys=as_key(join.base['bq_id']))
+    elif voldemort_df is not None:
+        record_diagnostics(stats, 'voldemort', as_key(join.base['bq_id']))
+    return join
+
+
+def iter_out_of_core_frames(config, join, select=None):
+    """The joined rows in chunk_rows frames, each pull recorded as the join stage."""
+    return timed_chunks('join', join.iter_frames(select, config.chunk_rows, config.join_memory_limit,
+                                                 spill_directory(config), config.join_threads))
+
+
+def id_frame(input_df, voldemort=True):
+    """The pitchbook_id (and bq_id) columns the builders start from."""
+    result_df = pd.DataFrame()
+    result_df['pitchbook_id'] = input_df.iloc[:, 0].astype(str)
+    if voldemort:
+        result_df['bq_id'] = input_df.iloc[:, 1].astype(str).str.replace("'", "")
+    return result_df
+
+
+def add_verification(result_df, config):
+    """Append the per-pair confidence, reason vector and check scores to a crosswalk frame."""
+    verification = verify_pairs(result_df, 'pb_', 'bq_', config.match_fields.get('pitchbook'),
+                                config.match_fields.get('voldemort'))
+    scored = verification['verify_confidence'].notna()
+    logging.info(f"Verified {int(scored.sum())} of {len(result_df)} pairs; mean confidence "
+                 f"{verification.loc[scored, 'verify_confidence'].mean():.3f}")
+    return pd.concat([result_df, verification], axis=1)
+
+
+def write_output(joined_chunks, output_path):
+    try:
+        rows, columns = write_chunks(joined_chunks, output_path)
+        logging.info(f"Successfully saved output to: {output_path}")
+        logging.info(f"Generated CSV with {rows} rows and {len(columns)} columns")
+        return True
+    except Exception as e:
+        logging.error(f"Failed to write output: {e}", exc_info=True)
+        return False
+
+
+def write_missing_report(stats, config):
+    """Log the per-side ID match summary and write <output>.missing.csv from the join's diagnostics."""
+    diagnostics = stats.get('diagnostics')
+    if not config.missing_report or diagnostics is None:
+        return
+    try:
+        with stage('diagnostics') as timed:
+            path, rows = diagnostics.write(config.output_file)
+            timed.add(rows_out=rows)
+        logging.info(f"Missing-ID report ({rows} IDs without an exact match) saved to {path}")
+    except Exception as e:
+        logging.warning(f"Could not write the missing-ID report: {e}")
+
+
+def run_excel(pool, config, input_df):
+    if len(input_df.columns) < 2:
+        logging.error(f"Input file doesn't have enough columns. Expected at least 2, got {len(input_df.columns)}")
+        return False
+    stats = {}
+    def joined_chunks():
+        for chunk in iter_input_chunks(input_df, config):
+            pitchbook_ids = chunk.iloc[:, 0].dropna().astype(str).tolist()
+            voldemort_ids = chunk.iloc[:, 1].dropna().astype(str).str.replace("'", "").tolist()
+            logging.info(f"Extracted {len(pitchbook_ids)} Pitchbook IDs and {len(voldemort_ids)} Voldemort IDs")
+            pitchbook_df, voldemort_df = fetch_concurrently(
+                pool,
+                timed_fetch('pitchbook_fetch', lambda conn: get_pitchbook_data(conn, pitchbook_ids, config),
+                            pitchbook_ids),
+                timed_fetch('voldemort_fetch', lambda conn: get_voldemort_data(conn, voldemort_ids, config),
+                            voldemort_ids))
+            pitchbook_df = dedup_side(config, pitchbook_df, PITCHBOOK_FEED_TABLE, 'COMPANY_ID', 'pitchbook', stats)
+            voldemort_df = dedup_side(config, voldemort_df, VOLDEMORT_TABLE, 'BQ_ID', 'voldemort', stats, strip=True)
+            pitchbook_df = compact_side(config, pitchbook_df, 'COMPANY_ID')
+            voldemort_df = compact_side(config, voldemort_df, 'BQ_ID')
+            if config.join_backend == DUCKDB:
+                with stage('join') as timed:
+                    join = out_of_core_join(config, id_frame(chunk), pitchbook_df, PITCHBOOK_FEED_TABLE,
+                                            voldemort_df, stats)
+                    timed.add(rows_in=len(chunk))
+                yield from iter_out_of_core_frames(config, join)
+                continue
+            with stage('join') as timed:
+                result_df = build_complete_frame(chunk, pitchbook_df, voldemort_df, stats, join_fill_value(config),
+                                                 dedup_policy(config, PITCHBOOK_FEED_TABLE)[0],
+                                                 dedup_policy(config, VOLDEMORT_TABLE)[0],
+                                                 fanout_limit(config, len(chunk)))
+                timed.add(rows_in=len(chunk), rows_out=len(result_df))
+            yield result_df
+    if not write_output(joined_chunks(), config.output_file):
+        return False
+    log_match_stats(stats)
+    write_missing_report(stats, config)
+    return True
+
+
+def run_pitchbook_only(pool, config, input_df):
+    if input_df.empty or input_df.shape[1] < 1:
+        logging.error(f"Input file doesn't have enough columns. Expected at least 1, got {input_df.shape[1]}")
+        return False
+    stats = {}
+    def joined_chunks():
+        for chunk in iter_input_chunks(input_df, config):
+            pitchbook_ids = chunk.iloc[:, 0].dropna().astype(str).tolist()
+            logging.info(f"Extracted {len(pitchbook_ids)} Pitchbook IDs")
+            with pool.connection() as conn, stage('pitchbook_fetch') as timed:
+                pitchbook_df = get_pitchbook_data(conn, pitchbook_ids, config)
+                timed.add(rows_in=len(pitchbook_ids), rows_out=len(pitchbook_df))
+            pitchbook_df = dedup_side(config, pitchbook_df, PITCHBOOK_FEED_TABLE, 'COMPANY_ID', 'pitchbook', stats)
+            pitchbook_df = compact_side(config, pitchbook_df, 'COMPANY_ID')
+            if config.join_backend == DUCKDB:
+                with stage('join') as timed:
+                    join = out_of_core_join(config, id_frame(chunk, voldemort=False), pitchbook_df,
+                                            PITCHBOOK_FEED_TABLE, stats=stats)
+                    timed.add(rows_in=len(chunk))
+                yield from iter_out_of_core_frames(config, join)
+                continue
+            with stage('join') as timed:
+                result_df = build_pitchbook_only_frame(chunk, pitchbook_df, stats, join_fill_value(config),
+                                                       dedup_policy(config, PITCHBOOK_FEED_TABLE)[0],
+                                                       fanout_limit(config, len(chunk)))
+                timed.add(rows_in=len(chunk), rows_out=len(result_df))
+            yield result_df
+    if not write_output(joined_chunks(), config.output_file):
+        return False
+    write_missing_report(stats, config)
+    return True
+
+
+def iter_pooled_crosswalk_chunks(pool, config):
+    with pool.connection() as conn:
+        yield from iter_crosswalk_chunks(conn, config)
+
+
+def iter_server_joined_chunks(pool, config):
+    with pool.connection() as conn:
+        query = build_crosswalk_join_query(conn, config)
+        yield from iter_query(conn, query, "Joining crosswalk to Pitchbook and Voldemort in Snowflake",
+                              batch_rows=config.chunk_rows)
+
+
+def run_crosswalk_server_join(pool, config):
+    """Crosswalk output from one server-side join; only verification runs on the client."""
+    stats = {}
+    rows = 0
+    def joined_chunks():
+        nonlocal rows
+        for result_df in timed_chunks('server_join', iter_server_joined_chunks(pool, config)):
+            pb_hits = pd.Series(np.where(result_df[PB_HIT_COLUMN].to_numpy() == 1, EXACT, None), dtype=object)
+            record_matches(stats, 'pitchbook', pb_hits, keys=as_key(result_df['pitchbook_id'].to_numpy()))
+            record_matches(stats, 'voldemort', pd.Series(result_df[BQ_RULE_COLUMN].to_numpy(), dtype=object),
+                           BQ_ID_RULES, keys=as_key(result_df['bq_id'].to_numpy()))
+            result_df = result_df.drop(columns=[PB_HIT_COLUMN, BQ_RULE_COLUMN])
+            if config.compact_dtypes:
+                with stage('compact') as timed:
+                    result_df = compact_frame(result_df, keep=('pitchbook_id', 'bq_id'))
+                    timed.add(rows_in=len(result_df), rows_out=len(result_df))
+            if config.verify:
+                with stage('verify') as timed:
+                    result_df = add_verification(result_df, config)
+                    timed.add(rows_in=len(result_df), rows_out=len(result_df))
+            rows += len(result_df)
+            yield result_df
+    if not write_output(joined_chunks(), config.output_file):
+        return False
+    if not rows:
+        logging.error("No crosswalk pairs found.")
+        return False
+    log_match_stats(stats)
+    write_missing_report(stats, config)
+    save_pair_snapshot(None, config.output_file)
+    return True
+
+
+def iter_delta_chunks(delta, crosswalk_chunks):
+    for crosswalk_df in crosswalk_chunks:
+        with stage('delta') as timed:
+            new_df = delta.new_pairs(crosswalk_df)
+            timed.add(rows_in=len(crosswalk_df), rows_out=len(new_df))
+        yield new_df
+
+
+def save_pair_snapshot(delta, output_path):
+    """Write the pairs delta collected next to output_path; without a delta, drop an earlier run's snapshot."""
+    try:
+        if delta is None:
+            if remove_snapshot(output_path):
+                logging.info(f"Removed the outdated pair snapshot {snapshot_path(output_path)}")
+            return
+        path = write_snapshot(output_path, delta.current_pairs())
+        logging.info(f"Crosswalk pair snapshot saved to {path}")
+    except Exception as e:
+        logging.warning(f"Could not update the crosswalk pair snapshot: {e}")
+
+
+def run_crosswalk(pool, config, crosswalk_df=None):
+    """
+    crosswalk_df: pairs the caller already fetched (a --shards worker's slice), in
+    which case the caller also writes the pair snapshot.
+    """
+    owns_snapshot = crosswalk_df is None
+    if config.server_join:
+        return run_crosswalk_server_join(pool, config)
+    previous_pairs = None
+    if config.previous_output:
+        with stage('delta') as timed:
+            previous_pairs = load_previous_pairs(config.previous_output, config.chunk_rows)
+            timed.add(rows_out=len(previous_pairs))
+        logging.info(f"Diffing the crosswalk against {len(previous_pairs)} pairs from {config.previous_output}")
+    # A shard's caller snapshots the whole crosswalk, so a shard only needs the delta for --previous.
+    # A plain full run without --snapshot skips the delta (and its pair hashing) entirely.
+    snapshot = owns_snapshot and (config.pair_snapshot or previous_pairs is not None)
+    delta = CrosswalkDelta(previous_pairs) if snapshot or previous_pairs is not None else None
+    if crosswalk_df is not None:
+        crosswalk_chunks = iter_row_chunks(crosswalk_df, config.chunk_rows) if config.stream else [crosswalk_df]
+    elif config.stream:
+        # The crosswalk stream holds one connection while both side fetches borrow their own
+        pool.ensure_size(3)
+        crosswalk_chunks = timed_chunks('crosswalk_fetch', iter_pooled_crosswalk_chunks(pool, config))
+    else:
+        with pool.connection() as conn, stage('crosswalk_fetch') as timed:
+            crosswalk_df = get_crosswalk_pairs(conn, config)
+            timed.add(rows_out=len(crosswalk_df))
+        if crosswalk_df.empty:
+            logging.error("No crosswalk pairs found. Exiting.")
+            return False
+        crosswalk_chunks = [crosswalk_df]
+    stats = {}
+    def joined_chunks():
+        for crosswalk_df in iter_delta_chunks(delta, crosswalk_chunks) if delta else crosswalk_chunks:
+            if crosswalk_df.empty:
+                continue
+            pitchbook_ids = crosswalk_df.iloc[:, 0].dropna().astype(str).tolist()
+            voldemort_ids = crosswalk_df.iloc[:, 1].dropna().astype(str).tolist()
+            pb_df, vd_df = fetch_concurrently(
+                pool,
+                timed_fetch('pitchbook_fetch', lambda conn: get_bulk_company_common(conn, pitchbook_ids, config),
+                            pitchbook_ids),
+                timed_fetch('voldemort_fetch',
+                            lambda conn: get_bulk_voldemort_firmographics(conn, voldemort_ids, config),
+                            voldemort_ids))
+            pb_df = dedup_side(config, pb_df, PITCHBOOK_COMMON_TABLE, 'COMPANY_ID', 'pitchbook', stats)
+            vd_df = dedup_side(config, vd_df, VOLDEMORT_TABLE, 'BQ_ID', 'voldemort', stats, strip=True)
+            pb_df = compact_side(config, pb_df, 'COMPANY_ID')
+            vd_df = compact_side(config, vd_df, 'BQ_ID')
+            if config.join_backend == DUCKDB:
+                with stage('join') as timed:
+                    join = out_of_core_join(config, id_frame(crosswalk_df), pb_df, PITCHBOOK_COMMON_TABLE, vd_df,
+                                            stats)
+                    timed.add(rows_in=len(crosswalk_df))
+                result_frames = iter_out_of_core_frames(config, join, crosswalk_layout(join.columns))
+            else:
+                with stage('join') as timed:
+                    result_df = build_crosswalk_frame(crosswalk_df, pb_df, vd_df, stats, join_fill_value(config),
+                                                      dedup_policy(config, PITCHBOOK_COMMON_TABLE)[0],
+                                                      dedup_policy(config, VOLDEMORT_TABLE)[0],
+                                                      fanout_limit(config, len(crosswalk_df)))
+                    timed.add(rows_in=len(crosswalk_df), rows_out=len(result_df))
+                result_frames = [result_df]
+            for result_df in result_frames:
+                if config.verify:
+                    with stage('verify') as timed:
+                        result_df = add_verification(result_df, config)
+                        timed.add(rows_in=len(result_df), rows_out=len(result_df))
+                if config.delta_only:
+                    result_df[CHANGE_COLUMN] = ADDED
+                yield result_df
+    def output_chunks():
+        yield from joined_chunks()
+        if previous_pairs is None:
+            return
+        delta.log_summary()
+        if config.delta_only:
+            yield delta.removed_pairs().assign(**{CHANGE_COLUMN: REMOVED})
+        else:
+            # Unchanged rows are copied from the previous output after the newly joined ones
+            yield from timed_chunks('delta_merge', iter_kept_rows(config.previous_output, delta.removed_keys(),
+                                                                  config.chunk_rows))
+    if not write_output(output_chunks(), config.output_file):
+        return False
+    log_match_stats(stats)
+    write_missing_report(stats, config)
+    if owns_snapshot:
+        save_pair_snapshot(delta if snapshot else None, config.output_file)
+    return True
+
+
+def side_matches(keys, side_df, id_col, strip=False, rules=(EXACT,)):
+    """Return (side table indexed by ID, matched side ID per crosswalk row or None)."""
+    key_index = KeyIndex(side_df, id_col, strip=strip, rules=rules)
+    positions, _ = key_index.match(keys)
+    return key_index.frame, pd.Series(key_index.keys_at(positions), dtype=object)
+
+
+def fuzzy_match_side(pool, config, queries, side):
+    """Score the query entities against every row of a side's table, keeping only blocked candidates in memory."""
+    table, id_col = MATCH_SIDES[side]
+    queries = prepare(queries)
+    domains, name_blocks = set(queries['norm_domain']), set(queries['name_block'])
+    with pool.connection() as conn, stage('fuzzy_candidates') as timed:
+        fields = resolve_match_fields(get_table_columns(conn, table), config.match_fields.get(side))
+        logging.info(f"Matching {side} candidates on {fields}")
+        blocked = []
+        for chunk in iter_match_candidates(conn, config, table, id_col, fields):
+            blocked.append(filter_to_blocks(prepare(chunk), domains, name_blocks))
+            timed.add(rows_in=len(chunk), rows_out=len(blocked[-1]))
+    with stage('fuzzy_match') as timed:
+        candidates = concat_frames(blocked)
+        scored = match_candidates(queries, candidates, top_k=config.fuzzy_top_k,
+                                  min_score=config.fuzzy_min_score, prepared=True)
+        timed.add(rows_in=len(candidates), rows_out=len(scored))
+    return scored
+
+
+def run_fuzzy_match(pool, config):
+    with pool.connection() as conn, stage('crosswalk_fetch') as timed:
+        crosswalk_df = get_crosswalk_pairs(conn, config)
+        timed.add(rows_out=len(crosswalk_df))
+    if crosswalk_df.empty:
+        logging.error("No crosswalk pairs found. Exiting.")
+        return False
+    pb_keys = as_key(crosswalk_df.iloc[:, 0]).reset_index(drop=True)
+    bq_keys = as_key(crosswalk_df.iloc[:, 1]).str.replace("'", "").reset_index(drop=True)
+    pitchbook_ids = crosswalk_df.iloc[:, 0].dropna().astype(str).tolist()
+    voldemort_ids = crosswalk_df.iloc[:, 1].dropna().astype(str).tolist()
+    pb_df, vd_df = fetch_concurrently(
+        pool,
+        timed_fetch('pitchbook_fetch', lambda conn: get_bulk_company_common(conn, pitchbook_ids, config),
+                    pitchbook_ids),
+        timed_fetch('voldemort_fetch', lambda conn: get_bulk_voldemort_firmographics(conn, voldemort_ids, config),
+                    voldemort_ids))
+    pb_indexed, pb_matched = side_matches(pb_keys, pb_df, 'COMPANY_ID')
+    vd_indexed, vd_matched = side_matches(bq_keys, vd_df, 'BQ_ID', strip=True, rules=BQ_ID_RULES)
+    unmatchable = int((pb_matched.isna() & vd_matched.isna()).sum())
+    if unmatchable:
+        logging.warning(f"{unmatchable} crosswalk rows have no metadata on either side; nothing to match them on")
+
+    proposals = [pd.DataFrame(columns=FUZZY_OUTPUT_COLUMNS)]
+    # A row whose ID resolves on one side only gets candidates from the other side's table
+    for known_side, known_indexed, known_matched, unmatched_side, other_matched in (
+            ('pitchbook', pb_indexed, pb_matched, 'voldemort', vd_matched),
+            ('voldemort', vd_indexed, vd_matched, 'pitchbook', pb_matched)):
+        rows = (known_matched.notna() & other_matched.isna()).to_numpy()
+        if not rows.any():
+            continue
+        logging.info(f"{int(rows.sum())} crosswalk rows have no {unmatched_side} match; proposing candidates")
+        query_ids = known_matched[rows].unique()
+        known_rows = known_indexed.loc[query_ids]
+        fields = resolve_match_fields(known_rows.columns, config.match_fields.get(known_side))
+        scored = fuzzy_match_side(pool, config, match_frame(known_rows, query_ids, fields), unmatched_side)
+        targets = pd.DataFrame({'pitchbook_id': pb_keys[rows], 'bq_id': bq_keys[rows],
+                                'query_id': known_matched[rows]})
+        scored = targets.merge(scored, on='query_id').drop(columns='query_id')
+        scored['unmatched_side'] = unmatched_side
+        proposals.append(scored[FUZZY_OUTPUT_COLUMNS])
+    result_df = pd.concat(proposals, ignore_index=True)
+    logging.info(f"Proposed {len(result_df)} fuzzy candidates for "
+                 f"{result_df[['pitchbook_id', 'bq_id']].drop_duplicates().shape[0]} crosswalk rows")
+    return write_output([result_df], config.output_file)
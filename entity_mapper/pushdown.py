@@ -0,0 +1,127 @@
+"""
+Server-side Join
+----------------
+Builds one SQL statement that joins the crosswalk to COMPANY_COMMON and
+VOLDEMORT_FIRMOGRAPHICS inside Snowflake, with the pb_/bq_ aliasing done in
+the SELECT, so the client streams only the joined result instead of pulling
+the crosswalk, sending every ID back in IN lists and joining in pandas.
+
+The BQ_ID match mirrors join.BQ_ID_RULES: an exact (trimmed) match first,
+then the zero-stripped form, preferring the side key already in that form;
+all-zero IDs meet at '0' as under INT_CANONICAL.
+
+Every table's rows are numbered with SEQ8() as they are read, which is the
+order a plain SELECT of it returns. That makes the result deterministic and
+the same as the client join's: rows come out in crosswalk read order, and a
+side key with several rows keeps the one read last, as under --dedup last.
+"""
+
+from entity_mapper.config import CROSSWALK_TABLE, PITCHBOOK_COMMON_TABLE, VOLDEMORT_TABLE
+from entity_mapper.join import EXACT, INT_CANONICAL, LSTRIP_ZEROS
+from entity_mapper.sources import check_columns, get_table_columns
+
+# Helper columns the query adds for match statistics; dropped before writing
+PB_HIT_COLUMN = '__pb_hit'
+BQ_RULE_COLUMN = '__bq_rule'
+
+
+def side_columns(conn, config, table, id_col):
+    """Columns selected from a side table: its projection (ID first) or every column."""
+    columns = config.columns.get(table)
+    if columns:
+        columns = [id_col] + list(columns)
+    else:
+        columns = get_table_columns(conn, table)
+    selected = {}
+    for column in check_columns(table, columns):
+        selected.setdefault(column.upper(), column)
+    return list(selected.values())
+
+
+def crosswalk_id_columns(conn, config):
+    columns = config.columns.get(CROSSWALK_TABLE) or get_table_columns(conn, CROSSWALK_TABLE)
+    if len(columns) < 2:
+        raise ValueError("Crosswalk table must have at least two columns (Pitchbook and Voldemort IDs)")
+    return check_columns(CROSSWALK_TABLE, columns[:2])
+
+
+def _canonical(key):
+    # LSTRIP_ZEROS, with INT_CANONICAL's '0' for all-zero IDs; NULL where neither applies
+    return f"CASE WHEN {key} = '' THEN NULL WHEN LTRIM({key}, '0') = '' THEN '0' ELSE LTRIM({key}, '0') END"
+
+
+def _first_per(partition, order, select, source):
+    return f"""SELECT * FROM (
+        SELECT {select}, ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY {order}) AS "__row"
+        FROM {source}
+    ) ranked WHERE "__row" = 1"""
+
+
+def _output_name(prefix, column):
+    # Same renaming as pipeline.build_crosswalk_frame: vd_BQ_X -> bq_X, vd_X -> bq_X
+    if prefix == 'bq_' and column.upper().startswith('BQ_'):
+        return f"bq_{column[3:]}"
+    return f"{prefix}{column}"
+
+
+def crosswalk_join_query(pb_id_col, bq_id_col, pb_columns, vd_columns):
+    """
+    The crosswalk left-joined to both metadata tables. Output columns are
+    pitchbook_id, pb_* (COMPANY_ID dropped), bq_id, bq_* (BQ_ID dropped), then
+    PB_HIT_COLUMN and BQ_RULE_COLUMN.
+    """
+    pb_select = ', '.join(pb_columns)
+    vd_select = ', '.join(vd_columns)
+    pb_key = 'CAST(COMPANY_ID AS VARCHAR)'
+    bq_key = 'TRIM(xw."bq_id")'
+    pb_out = [f'pb.{col} AS "{_output_name("pb_", col)}"' for col in pb_columns if col.upper() != 'COMPANY_ID']
+    vd_out = [f'CASE WHEN e."__key" IS NOT NULL THEN e.{col} ELSE c.{col} END AS "{_output_name("bq_", col)}"'
+              for col in vd_columns if col.upper() != 'BQ_ID']
+    rule = (f"CASE WHEN e.\"__key\" IS NOT NULL THEN '{EXACT}' "
+            f"WHEN c.\"__key\" IS NOT NULL THEN (CASE WHEN LTRIM({bq_key}, '0') = '' THEN '{INT_CANONICAL}' "
+            f"ELSE '{LSTRIP_ZEROS}' END) END")
+    side_key = '"__key"'
+    keyed_vd = f'(SELECT vd.*, {_canonical(side_key)} AS "__canon" FROM vd) keyed'
+    # Per key the row read last wins; across keys sharing a canonical form, the key already in it first
+    last_read = '"__seq" DESC'
+    return f"""
+    WITH xw AS (
+        SELECT CAST({pb_id_col} AS VARCHAR) AS "pitchbook_id",
+               REPLACE(CAST({bq_id_col} AS VARCHAR), '''', '') AS "bq_id",
+               SEQ8() AS "__pos"
+        FROM {CROSSWALK_TABLE}
+    ),
+    pb_rows AS (
+        SELECT {pb_key} AS "__key", {pb_select}, SEQ8() AS "__seq"
+        FROM {PITCHBOOK_COMMON_TABLE}
+    ),
+    pb AS (
+        {_first_per('"__key"', last_read, '*', 'pb_rows')}
+    ),
+    vd AS (
+        SELECT TRIM(CAST(BQ_ID AS VARCHAR)) AS "__key", {vd_select}, SEQ8() AS "__seq"
+        FROM {VOLDEMORT_TABLE}
+    ),
+    vd_exact AS (
+        {_first_per('"__key"', last_read, 'vd.*', 'vd')}
+    ),
+    vd_canon AS (
+        {_first_per('"__canon"', f'CASE WHEN "__key" = "__canon" THEN 0 ELSE 1 END, {last_read}', '*', keyed_vd)}
+    )
+    SELECT xw."pitchbook_id", {', '.join(pb_out + ['xw."bq_id"'] + vd_out)},
+           CASE WHEN pb."__key" IS NOT NULL THEN 1 ELSE 0 END AS "{PB_HIT_COLUMN}",
+           {rule} AS "{BQ_RULE_COLUMN}"
+    FROM xw
+    LEFT JOIN pb ON pb."__key" = xw."pitchbook_id"
+    LEFT JOIN vd_exact e ON e."__key" = {bq_key}
+    LEFT JOIN vd_canon c ON e."__key" IS NULL AND c."__canon" IS NOT NULL AND c."__canon" = {_canonical(bq_key)}
+    ORDER BY xw."__pos"
+    """
+
+
+def build_crosswalk_join_query(conn, config):
+    """Resolve the column lists (from projections or a LIMIT 0 probe) and build the join."""
+    pb_id_col, bq_id_col = crosswalk_id_columns(conn, config)
+    return crosswalk_join_query(pb_id_col, bq_id_col,
+                                side_columns(conn, config, PITCHBOOK_COMMON_TABLE, 'COMPANY_ID'),
+                                side_columns(conn, config, VOLDEMORT_TABLE, 'BQ_ID'))
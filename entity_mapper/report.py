@@ -0,0 +1,267 @@
+"""
+Run Report
+----------
+Per-stage instrumentation for a mapping run: wall time, calls, rows in/out,
+bytes fetched, peak RSS and Snowflake query IDs, written as JSON next to the
+output. Stages are opened with `with stage('name') as s:` anywhere in the
+pipeline; they are no-ops unless a RunReport is active, and they follow work
+into thread pools that submit through `in_context`.
+
+The join stage can optionally be profiled with cProfile or pyinstrument
+(pip install pyinstrument).
+"""
+
+import contextvars
+import functools
+import importlib.util
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+_active_report = contextvars.ContextVar('entity_mapper_report', default=None)
+_active_stage = contextvars.ContextVar('entity_mapper_stage', default=None)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, or None where it can't be read."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / 1024 ** 2, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def frame_bytes(df):
+    """In-memory size of a fetched frame, counting string contents."""
+    return int(df.memory_usage(index=False, deep=True).sum()) if len(df.columns) else 0
+
+
+class StageStats:
+    """Totals for every call of one named stage; calls may overlap across threads."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.bytes_fetched = 0
+        self.queries = []
+        self.peak_rss_mb = None
+        self._lock = threading.Lock()
+
+    def add(self, rows_in=0, rows_out=0, bytes_fetched=0):
+        with self._lock:
+            self.rows_in += rows_in
+            self.rows_out += rows_out
+            self.bytes_fetched += bytes_fetched
+
+    def add_query(self, query_id, description, rows, nbytes, seconds):
+        with self._lock:
+            self.queries.append({'query_id': query_id, 'description': description, 'rows': rows,
+                                 'bytes': nbytes, 'seconds': round(seconds, 3)})
+            self.bytes_fetched += nbytes
+
+    def _finish_call(self, seconds):
+        with self._lock:
+            self.calls += 1
+            self.seconds += seconds
+            self.peak_rss_mb = peak_rss_mb()
+
+    def absorb(self, stats):
+        """Add another process's totals for this stage (a to_dict() result)."""
+        with self._lock:
+            self.calls += stats['calls']
+            self.seconds += stats['seconds']
+            self.rows_in += stats['rows_in']
+            self.rows_out += stats['rows_out']
+            self.bytes_fetched += stats['bytes_fetched']
+            self.queries.extend(stats['queries'])
+            peaks = [peak for peak in (self.peak_rss_mb, stats['peak_rss_mb']) if peak is not None]
+            self.peak_rss_mb = max(peaks) if peaks else None
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'seconds': round(self.seconds, 3),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'bytes_fetched': self.bytes_fetched,
+            'peak_rss_mb': self.peak_rss_mb,
+            'query_ids': [query['query_id'] for query in self.queries if query['query_id']],
+            'queries': self.queries,
+        }
+
+
+class _NullStage:
+    def add(self, rows_in=0, rows_out=0, bytes_fetched=0):
+        pass
+
+
+class RunReport:
+    """Stage statistics for one run, in the order the stages were first entered."""
+
+    def __init__(self, command, output_file=None, profile=None, profile_stage='join'):
+        if profile and profile not in PROFILERS:
+            raise ValueError(f"Unknown profiler {profile!r}; expected one of {PROFILERS}")
+        if profile == 'pyinstrument' and importlib.util.find_spec('pyinstrument') is None:
+            raise ImportError("--profile pyinstrument requires the 'pyinstrument' package (pip install pyinstrument)")
+        self.command = command
+        self.output_file = output_file
+        self.profile = profile
+        self.profile_stage = profile_stage
+        self.started = time.time()
+        self.status = 'running'
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._profile_sessions = []
+
+    def stage_stats(self, name):
+        with self._lock:
+            if name not in self.stages:
+                self.stages[name] = StageStats(name)
+            return self.stages[name]
+
+    def absorb(self, stages):
+        """Fold in the stages of a worker process's report; seconds add up across workers."""
+        for name, stats in stages.items():
+            self.stage_stats(name).absorb(stats)
+
+    @contextmanager
+    def activate(self):
+        """Make this the report that stage() and record_query() write to."""
+        token = _active_report.set(self)
+        try:
+            yield self
+        finally:
+            _active_report.reset(token)
+
+    def _start_profile(self):
+        if self.profile == 'cprofile':
+            import cProfile
+            if self._profiler is None:
+                self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            from pyinstrument import Profiler
+            self._profiler = Profiler()
+            self._profiler.start()
+
+    def _stop_profile(self):
+        if self.profile == 'cprofile':
+            self._profiler.disable()
+        else:
+            self._profile_sessions.append(self._profiler.stop())
+
+    def write_profile(self, path):
+        """Write the profiled stage to path (.prof for cProfile, .html for pyinstrument)."""
+        if self.profile == 'cprofile' and self._profiler is not None:
+            self._profiler.dump_stats(path)
+        elif self.profile == 'pyinstrument' and self._profile_sessions:
+            from pyinstrument.renderers import HTMLRenderer
+            from pyinstrument.session import Session
+            session = functools.reduce(Session.combine, self._profile_sessions)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(HTMLRenderer().render(session))
+        else:
+            return None
+        return path
+
+    def to_dict(self):
+        return {
+            'command': self.command,
+            'status': self.status,
+            'output_file': self.output_file,
+            'started_at': datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            'wall_seconds': round(time.time() - self.started, 3),
+            'peak_rss_mb': peak_rss_mb(),
+            'python': platform.python_version(),
+            'stages': {name: stats.to_dict() for name, stats in self.stages.items()},
+        }
+
+    def write(self, path):
+        """Write the report as JSON, atomically."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        os.replace(temp_path, path)
+        return path
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one call of stage `name` in the active report (no-op without one)."""
+    report = _active_report.get()
+    if report is None:
+        yield _NullStage()
+        return
+    stats = report.stage_stats(name)
+    token = _active_stage.set(stats)
+    profiling = report.profile and name == report.profile_stage and threading.current_thread() is threading.main_thread()
+    if profiling:
+        report._start_profile()
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        elapsed = time.perf_counter() - start
+        if profiling:
+            report._stop_profile()
+        stats._finish_call(elapsed)
+        _active_stage.reset(token)
+
+
+def record_query(query_id, description, rows, nbytes, seconds):
+    """Attribute an executed query to the current stage."""
+    stats = _active_stage.get()
+    if stats is None:
+        report = _active_report.get()
+        if report is None:
+            return
+        stats = report.stage_stats('other')
+    stats.add_query(query_id, description, rows, nbytes, seconds)
+
+
+def absorb_stages(stages):
+    """Fold a worker process's report stages into the active report, if any."""
+    report = _active_report.get()
+    if report is not None:
+        report.absorb(stages)
+
+
+def reporting():
+    """True when a RunReport is active, so callers can skip costly measurements otherwise."""
+    return _active_report.get() is not None
+
+
+def in_context(fn):
+    """Wrap fn to run in a copy of the caller's context, for ThreadPoolExecutor.submit."""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)
+
+
+def default_report_file(output_file):
+    return f"{output_file}.report.json"
+
+
+def log_summary(report):
+    for name, stats in report.stages.items():
+        logging.info(f"Stage {name}: {stats.calls} call(s), {stats.seconds:.2f}s, rows in {stats.rows_in}, "
+                     f"rows out {stats.rows_out}, {stats.bytes_fetched / 1024 ** 2:.1f} MB fetched, "
+                     f"{len(stats.queries)} queries")
@@ -0,0 +1,372 @@
+"""
+Lookup Service
+--------------
+Resident mode for enrichment jobs that look up a few IDs at a time: one
+process keeps its pooled Snowflake connections open and holds recently
+fetched COMPANY_DATA_FEED and VOLDEMORT_FIRMOGRAPHICS rows in an in-memory
+LRU cache, so a lookup pays neither the import/connect/version-probe start-up
+of a batch run nor a round trip for IDs it has seen lately.
+
+    python -m entity_mapper serve --port 8765
+    python -m entity_mapper serve --socket /tmp/entity_mapper.sock
+
+    POST /lookup  {"pitchbook_ids": ["12345-67"], "voldemort_ids": ["0042"]}
+        -> {"pitchbook": {"12345-67": {...row...}}, "voldemort": {"0042": null}}
+    GET  /lookup?pitchbook_id=12345-67&voldemort_id=0042
+    GET  /health, GET /stats
+
+Each row comes back keyed by the ID as requested, or null when the table has
+no row for it; Voldemort IDs match under the same BQ_ID rules as the batch
+join. Misses (found or not) are cached too, for --lookup-ttl-seconds.
+
+Cache misses from concurrent requests are coalesced: the first miss opens a
+--coalesce-ms window, every ID requested by any client during it joins the
+same batch, and the batch runs as one IN-list query per side (split only past
+--batch-size IDs). An ID already being fetched is waited on, not re-queried.
+"""
+
+import dataclasses
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from entity_mapper.config import (DEFAULT_LOOKUP_CACHE_ENTRIES, DEFAULT_LOOKUP_TTL_SECONDS, PITCHBOOK_FEED_TABLE,
+                                  VOLDEMORT_TABLE)
+from entity_mapper.join import BQ_ID_RULES, EXACT, KeyIndex, key_variants
+from entity_mapper.sources import fetch_table_by_ids
+
+# Requests asking for more IDs than this are rejected; use the batch subcommands instead
+MAX_REQUEST_IDS = 10_000
+REQUEST_TIMEOUT_SECONDS = 60
+_INVALID_IDS = ('', 'nan', 'none', 'null')
+
+
+class LRUCache:
+    """Thread-safe LRU of id -> row (or None for an ID with no row), each entry expiring after ttl seconds."""
+
+    def __init__(self, max_entries=DEFAULT_LOOKUP_CACHE_ENTRIES, ttl_seconds=DEFAULT_LOOKUP_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, keys):
+        """(found {key: row}, missing [key]) for keys, refreshing the recency of each hit."""
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None or entry[0] < now:
+                    missing.append(key)
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = entry[1]
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, items):
+        if self.max_entries < 1:
+            return
+        expires = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key, row in items.items():
+                self._entries[key] = (expires, row)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'entries': len(self._entries), 'max_entries': self.max_entries, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+
+def frame_records(df):
+    """JSON-ready dict per row: NaN/NaT -> None, numpy scalars -> Python, timestamps -> ISO 8601."""
+    return json.loads(df.to_json(orient='records', date_format='iso', default_handler=str))
+
+
+class EntitySide:
+    """
+    Lookups against one source table. Cache misses are queued and fetched in
+    coalesced batches by whichever pool thread the batch is handed to.
+    """
+
+    def __init__(self, name, table, id_col, pool, config, executor, cache, coalesce_seconds,
+                 strip=False, rules=(EXACT,)):
+        self.name = name
+        self.table = table
+        self.id_col = id_col
+        self.pool = pool
+        self.config = config
+        self.cache = cache
+        self.coalesce_seconds = coalesce_seconds
+        self.strip = strip
+        self.rules = tuple(rules)
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._inflight = {}
+        self._timer = None
+        self.queries = 0
+        self.ids_fetched = 0
+        self.coalesced = 0
+
+    def clean_id(self, value):
+        """The ID as the table is queried for it, or None when it can't match anything."""
+        text = str(value).strip()
+        if self.strip:
+            text = text.replace("'", "")
+        return None if text.lower() in _INVALID_IDS else text
+
+    def request(self, ids):
+        """Start a lookup: serve ids from the cache and queue the rest; finish it with collect()."""
+        cleaned = {str(value): self.clean_id(value) for value in ids}
+        keys = list(dict.fromkeys(key for key in cleaned.values() if key is not None))
+        rows, missing = self.cache.get_many(keys)
+        return cleaned, rows, self._enqueue(missing) if missing else {}
+
+    def collect(self, lookup, timeout=REQUEST_TIMEOUT_SECONDS):
+        """{requested id: row dict or None} for a lookup started by request()."""
+        cleaned, rows, futures = lookup
+        if futures:
+            _, not_done = wait(futures.values(), timeout=timeout)
+            if not_done:
+                raise TimeoutError(f"{self.name} lookup timed out after {timeout}s")
+            rows.update((key, future.result()) for key, future in futures.items())
+        return {value: rows.get(key) for value, key in cleaned.items()}
+
+    def lookup(self, ids, timeout=REQUEST_TIMEOUT_SECONDS):
+        return self.collect(self.request(ids), timeout)
+
+    def _enqueue(self, keys):
+        futures = {}
+        with self._lock:
+            for key in keys:
+                future = self._inflight.get(key) or self._pending.get(key)
+                if future is None:
+                    future = self._pending[key] = Future()
+                else:
+                    self.coalesced += 1
+                futures[key] = future
+            if len(self._pending) >= self.config.id_batch_size:
+                self._flush_locked()
+            elif self._pending and self._timer is None:
+                self._timer = threading.Timer(self.coalesce_seconds, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return futures
+
+    def _flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            self._inflight.update(batch)
+            self._executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch):
+        try:
+            rows = self.fetch(list(batch))
+        except Exception as e:
+            logging.error(f"{self.name} lookup of {len(batch)} IDs failed: {e}")
+            for future in batch.values():
+                future.set_exception(e)
+        else:
+            self.cache.put_many(rows)
+            for key, future in batch.items():
+                future.set_result(rows.get(key))
+        finally:
+            with self._lock:
+                for key, future in batch.items():
+                    if self._inflight.get(key) is future:
+                        del self._inflight[key]
+
+    def fetch(self, keys):
+        """Query the table for keys and resolve each one to its row dict or None."""
+        query_ids = key_variants(keys, self.rules) if self.rules != (EXACT,) else keys
+        with self.pool.connection() as conn:
+            df = fetch_table_by_ids(conn, self.config, self.table, self.id_col, query_ids,
+                                    f"Looking up {len(keys)} {self.name} IDs")
+        with self._lock:
+            self.queries += 1
+            self.ids_fetched += len(keys)
+        if df.empty or self.id_col not in df.columns:
+            return dict.fromkeys(keys)
+        key_index = KeyIndex(df, self.id_col, strip=self.strip, rules=self.rules)
+        positions, _ = key_index.match(keys)
+        records = frame_records(key_index.frame.reset_index(drop=True))
+        return {key: records[position] if position >= 0 else None for key, position in zip(keys, positions)}
+
+    def stats(self):
+        return {'queries': self.queries, 'ids_fetched': self.ids_fetched, 'coalesced': self.coalesced,
+                'pending': len(self._pending), 'inflight': len(self._inflight), 'cache': self.cache.stats()}
+
+
+class LookupService:
+    """The per-side lookups over one warm connection pool."""
+
+    def __init__(self, pool, config):
+        self.pool = pool
+        # Checkpointed batches would answer a repeated lookup from disk forever, past the LRU TTL
+        config = dataclasses.replace(config, checkpoint_dir=None)
+        self.config = config
+        self.started = time.time()
+        self.requests = 0
+        self._lock = threading.Lock()
+        coalesce_seconds = config.coalesce_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=max(pool.size, 1), thread_name_prefix='lookup')
+        self.sides = {
+            'pitchbook': EntitySide('Pitchbook', PITCHBOOK_FEED_TABLE, 'COMPANY_ID', pool, config, self._executor,
+                                    LRUCache(config.lookup_cache_entries, config.lookup_ttl_seconds),
+                                    coalesce_seconds),
+            'voldemort': EntitySide('Voldemort', VOLDEMORT_TABLE, 'BQ_ID', pool, config, self._executor,
+                                    LRUCache(config.lookup_cache_entries, config.lookup_ttl_seconds),
+                                    coalesce_seconds, strip=True, rules=BQ_ID_RULES),
+        }
+
+    def lookup(self, pitchbook_ids=(), voldemort_ids=()):
+        with self._lock:
+            self.requests += 1
+        requested = {'pitchbook': list(pitchbook_ids or ()), 'voldemort': list(voldemort_ids or ())}
+        if sum(len(ids) for ids in requested.values()) > MAX_REQUEST_IDS:
+            raise ValueError(f"At most {MAX_REQUEST_IDS} IDs per request")
+        # Both sides are queued before either is waited on, so their queries overlap
+        started = {name: self.sides[name].request(ids) for name, ids in requested.items() if ids}
+        deadline = time.monotonic() + REQUEST_TIMEOUT_SECONDS
+        return {name: self.sides[name].collect(lookup, max(deadline - time.monotonic(), 0))
+                for name, lookup in started.items()}
+
+    def stats(self):
+        return {'uptime_seconds': round(time.time() - self.started, 1), 'requests': self.requests,
+                'pool_size': self.pool.size, **{name: side.stats() for name, side in self.sides.items()}}
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _id_list(value, field_name):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ValueError(f"{field_name} must be a list of IDs")
+    return [value_ for value_ in value if value_ is not None]
+
+
+class LookupHandler(BaseHTTPRequestHandler):
+    service = None
+    protocol_version = 'HTTP/1.1'
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _lookup(self, pitchbook_ids, voldemort_ids):
+        start = time.perf_counter()
+        try:
+            result = self.service.lookup(pitchbook_ids, voldemort_ids)
+        except ValueError as e:
+            return self._send_json(400, {'error': str(e)})
+        except TimeoutError as e:
+            return self._send_json(504, {'error': str(e)})
+        except Exception as e:
+            return self._send_json(502, {'error': f"Lookup failed: {e}"})
+        result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        self._send_json(200, result)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            return self._send_json(200, {'status': 'ok'})
+        if url.path == '/stats':
+            return self._send_json(200, self.service.stats())
+        if url.path == '/lookup':
+            query = parse_qs(url.query)
+            return self._lookup(query.get('pitchbook_id', []), query.get('voldemort_id', []))
+        self._send_json(404, {'error': f"Unknown path {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/lookup':
+            return self._send_json(404, {'error': f"Unknown path {url.path}"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("Request body must be a JSON object")
+            pitchbook_ids = _id_list(body.get('pitchbook_ids'), 'pitchbook_ids')
+            voldemort_ids = _id_list(body.get('voldemort_ids'), 'voldemort_ids')
+        except ValueError as e:
+            return self._send_json(400, {'error': f"Bad request: {e}"})
+        self._lookup(pitchbook_ids, voldemort_ids)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service, config):
+    """An HTTP server for service on config.service_socket, or else config.service_host/port."""
+    handler = type('BoundLookupHandler', (LookupHandler,), {'service': service})
+    if config.service_socket:
+        if os.path.exists(config.service_socket):
+            os.remove(config.service_socket)
+        return UnixHTTPServer(config.service_socket, handler)
+    return ThreadingHTTPServer((config.service_host, config.service_port), handler)
+
+
+def server_address(server):
+    if isinstance(server.server_address, tuple):
+        host, port = server.server_address[:2]
+        return f"http://{host}:{port}"
+    return f"unix:{server.server_address}"
+
+
+def run_service(pool, config):
+    """Serve lookups from the (already warmed) pool until interrupted."""
+    service = LookupService(pool, config)
+    server = make_server(service, config)
+    logging.info(f"Lookup service listening on {server_address(server)} with {pool.size} warm connections")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Lookup service stopping")
+    finally:
+        server.server_close()
+        service.close()
+        if config.service_socket and os.path.exists(config.service_socket):
+            os.remove(config.service_socket)
+    return True
@@ -0,0 +1,210 @@
+"""
+Sharded Execution
+-----------------
+Splits the input rows (or the fetched crosswalk) into --shards contiguous
+slices and runs the fetch → join → write pipeline for each slice in its own
+worker process with its own connection pool, so normalization, joining and
+serialization use one core per shard.
+
+Slices are contiguous row ranges rather than hash buckets: each worker writes
+its rows in input order, so the shard files concatenate into exactly the rows,
+order and columns of a single-process run. CSV shard bodies are appended to
+the output without being parsed again; Parquet shards are re-encoded into one
+file. With --partitioned the shard files are kept as a dataset directory
+(<output>/part-00000.csv, ...) instead.
+"""
+
+import csv
+import dataclasses
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from entity_mapper.connection import ConnectionPool
+from entity_mapper.delta import CrosswalkDelta
+from entity_mapper.diagnostics import MatchDiagnostics, missing_report_path, read_missing_report
+from entity_mapper.pipeline import run_crosswalk, run_excel, run_pitchbook_only, save_pair_snapshot
+from entity_mapper.report import RunReport, absorb_stages, stage
+from entity_mapper.sources import get_crosswalk_pairs
+from entity_mapper.writer import CSV, PARQUET, ChunkWriter, detect_format
+
+SHARDED_COMMANDS = ('excel', 'crosswalk', 'pitchbook-only')
+
+
+def shard_suffix(output_path):
+    file_format, compression = detect_format(output_path)
+    if file_format == PARQUET:
+        return '.parquet'
+    return {'gzip': '.csv.gz', 'zstd': '.csv.zst'}.get(compression, '.csv')
+
+
+def shard_file(directory, index, suffix):
+    return os.path.join(directory, f"part-{index:05d}{suffix}")
+
+
+def shard_slices(rows, shards):
+    """Contiguous, near-equal [start, stop) row ranges; never more shards than rows."""
+    bounds = np.linspace(0, rows, min(shards, max(rows, 1)) + 1).astype(int)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def shard_config(config, index, output_file):
+    checkpoint_dir = os.path.join(config.checkpoint_dir, f"shard-{index:05d}") if config.checkpoint_dir else None
+    return dataclasses.replace(config, output_file=output_file, checkpoint_dir=checkpoint_dir, report_file='',
+                               profile=None, shards=1)
+
+
+def run_shard(command, config, rows_df, connect, index, log_file, verbose):
+    """Worker process entry point: run one slice and return (success, rows, report stages)."""
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.insert(0, logging.FileHandler(log_file))
+    logging.basicConfig(level=logging.DEBUG if verbose else logging.INFO, handlers=handlers, force=True,
+                        format=f"%(asctime)s - %(levelname)s - shard {index} - %(message)s")
+    report = RunReport(command, config.output_file)
+    pool = ConnectionPool(config, size=config.pool_size, connect=connect)
+    try:
+        with report.activate():
+            if command == 'excel':
+                success = run_excel(pool, config, rows_df)
+            elif command == 'pitchbook-only':
+                success = run_pitchbook_only(pool, config, rows_df)
+            else:
+                success = run_crosswalk(pool, config, crosswalk_df=rows_df)
+    finally:
+        pool.close()
+    stages = report.to_dict()['stages']
+    rows = stages.get('write', {}).get('rows_out', 0)
+    return success, rows, stages
+
+
+def merge_columns(column_lists):
+    """Widest column list first, then any columns only some shards have (a side fetch that came back empty)."""
+    merged = []
+    for columns in sorted(column_lists, key=len, reverse=True):
+        merged += [col for col in columns if col not in merged]
+    return merged
+
+
+def _csv_header(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), [])
+
+
+def concatenate_shards(paths, rows, output_path, chunk_rows):
+    """Write the shard files, in order, as one output with the single-process columns."""
+    file_format, _ = detect_format(output_path)
+    with ChunkWriter(output_path) as writer:
+        if file_format == CSV:
+            headers = [_csv_header(path) for path in paths]
+            columns = merge_columns(headers)
+            for path, header, shard_rows in zip(paths, headers, rows):
+                with stage('shard_merge') as timed:
+                    if header == columns:
+                        with open(path, newline='', encoding='utf-8') as source:
+                            source.readline()
+                            writer.copy_csv(source, columns, shard_rows)
+                    else:
+                        # Rare: this shard lacks a side's columns, so re-serialize it in the full layout
+                        for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_rows):
+                            writer.write(chunk.reindex(columns=columns, fill_value=''))
+                    timed.add(rows_in=shard_rows, rows_out=shard_rows)
+        else:
+            import pyarrow.parquet as pq
+            columns = merge_columns([pq.read_schema(path).names for path in paths])
+            for path in paths:
+                for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+                    with stage('shard_merge') as timed:
+                        writer.write(batch.to_pandas().reindex(columns=columns))
+                        timed.add(rows_in=batch.num_rows, rows_out=batch.num_rows)
+    return writer.rows_written, writer.columns
+
+
+def merge_missing_reports(paths, output_path):
+    """
+    Fold the shards' missing-ID reports into <output_path>.missing.csv and remove
+    them (so a --partitioned dataset directory holds only its part files).
+    """
+    reports = [report for report in map(missing_report_path, paths) if os.path.exists(report)]
+    if not reports:
+        return
+    diagnostics = MatchDiagnostics()
+    with stage('diagnostics') as timed:
+        for report in reports:
+            shard_report = read_missing_report(report)
+            os.remove(report)
+            diagnostics.absorb(shard_report)
+            timed.add(rows_in=len(shard_report))
+        # Each shard logged its own match summary
+        path, rows = diagnostics.write(output_path, log=False)
+        timed.add(rows_out=rows)
+    logging.info(f"Missing-ID report ({rows} IDs without an exact match) saved to {path}")
+
+
+def _replace_directory(source, target):
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    elif os.path.exists(target):
+        os.remove(target)
+    os.replace(source, target)
+
+
+def run_sharded(command, pool, config, input_df, connect, log_file=None, verbose=False):
+    """Run command over config.shards worker processes; pool is only used to fetch the crosswalk."""
+    if command == 'crosswalk':
+        with pool.connection() as conn, stage('crosswalk_fetch') as timed:
+            rows_df = get_crosswalk_pairs(conn, config)
+            timed.add(rows_out=len(rows_df))
+        if rows_df.empty:
+            logging.error("No crosswalk pairs found. Exiting.")
+            return False
+    else:
+        rows_df = input_df
+    slices = shard_slices(len(rows_df), config.shards)
+    suffix = shard_suffix(config.output_file) if config.partitioned else \
+        ('.parquet' if detect_format(config.output_file)[0] == PARQUET else '.csv')
+    output_dir = os.path.dirname(os.path.abspath(config.output_file))
+    work_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(config.output_file)}.shards.", dir=output_dir)
+    paths = [shard_file(work_dir, index, suffix) for index in range(len(slices))]
+    logging.info(f"Running {len(rows_df)} rows as {len(slices)} shards of about {len(rows_df) // len(slices)} rows")
+    report_stages = []
+    try:
+        with ProcessPoolExecutor(max_workers=len(slices), mp_context=get_context('spawn')) as executor, \
+                stage('shards'):
+            futures = [executor.submit(run_shard, command, shard_config(config, index, path),
+                                       rows_df.iloc[start:stop], connect, index, log_file, verbose)
+                       for index, ((start, stop), path) in enumerate(zip(slices, paths))]
+            results = [future.result() for future in futures]
+        for index, (success, _, stages) in enumerate(results):
+            report_stages.append(stages)
+            if not success:
+                logging.error(f"Shard {index} failed")
+                return False
+        rows = [shard_rows for _, shard_rows, _ in results]
+        if config.missing_report:
+            try:
+                merge_missing_reports(paths, config.output_file)
+            except Exception as e:
+                logging.warning(f"Could not merge the shards' missing-ID reports: {e}")
+        if config.partitioned:
+            _replace_directory(work_dir, config.output_file)
+            logging.info(f"Wrote {sum(rows)} rows as {len(paths)} files in {config.output_file}")
+        else:
+            total, columns = concatenate_shards(paths, rows, config.output_file, config.chunk_rows)
+            logging.info(f"Successfully saved output to: {config.output_file}")
+            logging.info(f"Generated output with {total} rows and {len(columns)} columns")
+        if command == 'crosswalk':
+            delta = None
+            if config.pair_snapshot:
+                delta = CrosswalkDelta()
+                delta.new_pairs(rows_df)
+            save_pair_snapshot(delta, config.output_file)
+        return True
+    finally:
+        for stages in report_stages:
+            absorb_stages(stages)
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,176 @@
+"""
+Source Fetches
+--------------
+Pulls rows from the Pitchbook, Voldemort and crosswalk tables in Snowflake.
+The input ID file is read by entity_mapper.inputs.
+"""
+
+import hashlib
+import logging
+import re
+import pandas as pd
+from functools import partial
+from entity_mapper.batching import fetch_by_ids
+from entity_mapper.cache import open_cache
+from entity_mapper.checkpoint import open_checkpoint
+from entity_mapper.config import (CROSSWALK_TABLE, PITCHBOOK_COMMON_TABLE, PITCHBOOK_FEED_TABLE,
+                                  VOLDEMORT_TABLE)
+from entity_mapper.connection import call_with_retries, execute_query
+from entity_mapper.join import key_variants
+from entity_mapper.streaming import iter_query, iter_row_chunks
+
+
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_$]*$')
+
+
+def check_columns(table, columns):
+    """Reject anything but plain identifiers, since column names are spliced into the SELECT."""
+    for column in columns:
+        if not _IDENTIFIER_RE.match(column):
+            raise ValueError(f"Invalid column name for {table}: {column!r}")
+    return list(columns)
+
+
+def select_list(config, table, required=()):
+    """
+    SELECT list for table: '*' unless config.columns projects it, in which case the
+    required columns (join key, cache watermark) come first, then the configured ones.
+    """
+    columns = config.columns.get(table)
+    if not columns:
+        return '*'
+    selected = {}
+    for column in check_columns(table, list(required) + list(columns)):
+        selected.setdefault(column.upper(), column)
+    return ', '.join(selected.values())
+
+
+def fetch_table_by_ids(conn, config, table, id_col, ids, description):
+    watermark_col = config.cache_watermarks.get(table)
+    columns = select_list(config, table, [id_col] + ([watermark_col] if watermark_col else []))
+    query = f"""
+    SELECT {columns}
+    FROM {table}
+    """
+    # Projected rows are cached apart from full rows so neither is served for the other
+    cache_table = table if columns == '*' else f"{table}~{hashlib.sha1(columns.upper().encode()).hexdigest()[:10]}"
+    return fetch_by_ids(conn, partial(execute_query, stream=config.stream), query, id_col, ids, description,
+                        chunk_size=config.id_batch_size, max_workers=config.query_workers,
+                        cache=open_cache(config.cache_dir, config.cache_ttl_hours, config.cache_max_gb),
+                        cache_table=cache_table, watermark_col=watermark_col,
+                        retries=config.query_retries, retry_backoff=config.retry_backoff,
+                        checkpoint=open_checkpoint(config.checkpoint_dir))
+
+
+def checkpointed_query(conn, config, query, description):
+    """Run a one-off query with retries, reusing its checkpointed result when resuming."""
+    def execute(query, description, params):
+        return call_with_retries(lambda: execute_query(conn, query, description, params, stream=config.stream),
+                                 config.query_retries, config.retry_backoff, description)
+    checkpoint = open_checkpoint(config.checkpoint_dir)
+    if checkpoint is None:
+        return execute(query, description, None)
+    return checkpoint.run(execute, query, description, None)
+
+
+def get_pitchbook_data(conn, pitchbook_ids, config):
+    if not pitchbook_ids:
+        logging.warning("No Pitchbook IDs provided.")
+        return pd.DataFrame()
+    cleaned_ids = [str(id).strip() for id in pitchbook_ids if id and str(id).strip()]
+    if not cleaned_ids:
+        logging.warning("No valid Pitchbook IDs after formatting.")
+        return pd.DataFrame()
+    result_df = fetch_table_by_ids(conn, config, PITCHBOOK_FEED_TABLE, 'COMPANY_ID', cleaned_ids,
+                                   "Querying Pitchbook COMPANY_DATA_FEED - ALL columns")
+    if not result_df.empty:
+        logging.info(f"Retrieved {len(result_df)} rows with {len(result_df.columns)} columns from Pitchbook")
+        logging.debug(f"Pitchbook columns: {result_df.columns.tolist()}")
+    return result_df
+
+
+def get_voldemort_data(conn, voldemort_ids, config):
+    if not voldemort_ids:
+        logging.warning("No Voldemort IDs provided.")
+        return pd.DataFrame()
+    cleaned_ids = []
+    for id in voldemort_ids:
+        if id and str(id).strip() and str(id).strip().lower() not in ('nan', 'none', 'null'):
+            cleaned_ids.append(str(id).strip().replace("'", ""))
+    if not cleaned_ids:
+        logging.warning("No valid Voldemort IDs after formatting.")
+        return pd.DataFrame()
+    # Also ask for the zero-stripped spellings the join's BQ_ID rules can match (not zero-padded ones; see key_variants)
+    cleaned_ids = key_variants(cleaned_ids)
+    result_df = fetch_table_by_ids(conn, config, VOLDEMORT_TABLE, 'BQ_ID', cleaned_ids,
+                                   "Querying Voldemort VOLDEMORT_FIRMOGRAPHICS - ALL columns")
+    if not result_df.empty:
+        logging.info(f"Retrieved {len(result_df)} rows with {len(result_df.columns)} columns from Voldemort")
+        logging.debug(f"Voldemort columns: {result_df.columns.tolist()}")
+    else:
+        # Which IDs went missing is the join's anti-join; see the missing-ID report
+        logging.warning(f"No Voldemort rows matched any of {len(cleaned_ids)} BQ_ID spellings")
+    if len(result_df.columns):
+        result_df.columns = [col[3:] if col.startswith('vd_') else col for col in result_df.columns]
+        logging.info(f"Removed 'vd_' prefix from Voldemort columns")
+    return result_df
+
+
+def get_crosswalk_pairs(conn, config):
+    query = f"""
+    SELECT {select_list(config, CROSSWALK_TABLE)} FROM {CROSSWALK_TABLE}
+    """
+    # Checkpointed too, so a resumed run batches the same IDs in the same order
+    df = checkpointed_query(conn, config, query, "Fetching crosswalk pairs")
+    if df.empty or df.shape[1] < 2:
+        logging.error("Crosswalk table must have at least two columns (Pitchbook and Voldemort IDs)")
+        return pd.DataFrame()
+    return df
+
+
+def iter_crosswalk_chunks(conn, config):
+    """Yield the crosswalk table in chunk_rows-sized pieces, reading it as Arrow batches."""
+    query = f"""
+    SELECT {select_list(config, CROSSWALK_TABLE)} FROM {CROSSWALK_TABLE}
+    """
+    for chunk in iter_query(conn, query, "Streaming crosswalk pairs"):
+        if chunk.shape[1] < 2:
+            raise ValueError("Crosswalk table must have at least two columns (Pitchbook and Voldemort IDs)")
+        for crosswalk_df in iter_row_chunks(chunk, config.chunk_rows):
+            yield crosswalk_df
+
+
+def get_table_columns(conn, table):
+    query = f"SELECT * FROM {table} LIMIT 0"
+    return execute_query(conn, query, f"Reading {table} columns").columns.tolist()
+
+
+def iter_match_candidates(conn, config, table, id_col, fields):
+    """Stream a whole table as narrow id/name/domain/country frames for fuzzy matching."""
+    selected = [f'{id_col} AS "id"'] + [f'{fields[f]} AS "{f}"' if fields.get(f) else f'NULL AS "{f}"'
+                                         for f in ('name', 'domain', 'country')]
+    query = f"""
+    SELECT {', '.join(selected)}
+    FROM {table}
+    """
+    yield from iter_query(conn, query, f"Streaming fuzzy match candidates from {table}",
+                          batch_rows=config.chunk_rows)
+
+
+def get_bulk_company_common(conn, pitchbook_ids, config):
+    if not pitchbook_ids:
+        return pd.DataFrame()
+    # Remove empty and nan
+    pitchbook_ids = [str(i) for i in pitchbook_ids if pd.notna(i) and str(i).strip()]
+    # Snowflake: max 16,384 expressions in an IN clause, so IDs are bound in batches
+    return fetch_table_by_ids(conn, config, PITCHBOOK_COMMON_TABLE, 'COMPANY_ID', pitchbook_ids,
+                              f"Bulk fetching Pitchbook metadata for {len(pitchbook_ids)} IDs")
+
+
+def get_bulk_voldemort_firmographics(conn, voldemort_ids, config):
+    if not voldemort_ids:
+        return pd.DataFrame()
+    voldemort_ids = key_variants([str(i).replace("'", "").strip() for i in voldemort_ids
+                                  if pd.notna(i) and str(i).strip()])
+    return fetch_table_by_ids(conn, config, VOLDEMORT_TABLE, 'BQ_ID', voldemort_ids,
+                              f"Bulk fetching Voldemort metadata for {len(voldemort_ids)} IDs")
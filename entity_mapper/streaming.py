@@ -0,0 +1,96 @@
+"""
+Streaming Fetch
+---------------
+Reads query results as a sequence of DataFrame chunks instead of one
+fetchall() list of tuples. Uses the connector's Arrow-backed
+fetch_pandas_batches() when it is available and falls back to fetchmany().
+
+Only iter_query() consumers (the streamed crosswalk, the server-side join,
+the fuzzy-match candidate scan) hold one chunk at a time. An ID-batch fetch
+through execute_query(stream=True) still returns its whole result as one
+frame: Arrow batches skip the per-row tuples of fetchall(), but the batch's
+rows all end up in memory. --stream bounds those by splitting the input
+into --chunk-rows chunks, so each fetch covers one chunk's IDs.
+"""
+
+import logging
+import time
+import pandas as pd
+from entity_mapper.report import frame_bytes, record_query, reporting
+
+DEFAULT_BATCH_ROWS = 50000
+
+
+def iter_cursor_frames(cursor, batch_rows=DEFAULT_BATCH_ROWS):
+    """Yield DataFrame chunks from an executed cursor; always yields at least one (possibly empty) frame."""
+    columns = [col[0] for col in cursor.description]
+    batches = None
+    fetch_batches = getattr(cursor, 'fetch_pandas_batches', None)
+    if fetch_batches is not None:
+        try:
+            # integer_object_nulls keeps NULL-able NUMBER columns as ints instead of floats
+            batches = fetch_batches(integer_object_nulls=True)
+        except Exception as e:
+            logging.debug(f"Arrow batches unavailable, falling back to fetchmany(): {e}")
+    if batches is None:
+        batches = _iter_fetchmany(cursor, columns, batch_rows)
+    yielded = False
+    for frame in batches:
+        if frame.empty and yielded:
+            continue
+        yielded = True
+        yield frame
+    if not yielded:
+        yield pd.DataFrame(columns=columns)
+
+
+def _iter_fetchmany(cursor, columns, batch_rows):
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            break
+        yield pd.DataFrame(rows, columns=columns)
+
+
+def iter_query(conn, query, description=None, params=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """Execute query and yield its result as DataFrame chunks."""
+    if description:
+        logging.info(f"Streaming query: {description}")
+    logging.debug(f"Full query: {query}")
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        total_rows = 0
+        total_bytes = 0
+        for frame in iter_cursor_frames(cursor, batch_rows):
+            total_rows += len(frame)
+            if reporting():
+                total_bytes += frame_bytes(frame)
+            yield frame
+        logging.info(f"Query streamed {total_rows} rows")
+        if reporting():
+            # Includes time the consumer spent between chunks
+            record_query(getattr(cursor, 'sfqid', None), description, total_rows, total_bytes,
+                         time.perf_counter() - start)
+    finally:
+        cursor.close()
+
+
+def concat_frames(frames):
+    """Concatenate all chunks into one frame (every chunk is held until then), keeping an empty result's columns."""
+    frames = list(frames)
+    non_empty = [frame for frame in frames if not frame.empty]
+    if not non_empty:
+        return frames[0] if frames else pd.DataFrame()
+    if len(non_empty) == 1:
+        return non_empty[0]
+    return pd.concat(non_empty, ignore_index=True)
+
+
+def iter_row_chunks(df, chunk_rows):
+    """Slice an in-memory frame into chunk_rows-sized views."""
+    if chunk_rows < 1:
+        raise ValueError(f"Chunk size must be at least 1, got {chunk_rows}")
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
@@ -0,0 +1,180 @@
+"""
+Pair Verification
+-----------------
+Scores how well the Pitchbook and Voldemort attributes of each joined
+crosswalk pair agree: name similarity, domain, HQ location, founding year and
+employee count. Every check is computed column-wise over the whole frame and
+combined into a confidence plus a '|'-separated reason vector.
+
+Name similarity needs scikit-learn (pip install scikit-learn).
+"""
+
+import re
+import numpy as np
+import pandas as pd
+from entity_mapper.fuzzy import (MATCH_FIELD_CANDIDATES, normalize_country, normalize_domain, normalize_name,
+                                 resolve_match_fields)
+
+VERIFY_FIELD_CANDIDATES = {
+    **MATCH_FIELD_CANDIDATES,
+    'city': ('HQ_CITY', 'CITY', 'HQ_LOCATION_CITY'),
+    'founded': ('YEAR_FOUNDED', 'FOUNDED_YEAR', 'FOUNDING_YEAR', 'FOUNDED'),
+    'employees': ('EMPLOYEES', 'EMPLOYEE_COUNT', 'NUM_EMPLOYEES', 'TOTAL_EMPLOYEES'),
+}
+# Check -> weight; the confidence is the weighted mean of the checks both sides have data for
+CHECK_WEIGHTS = {
+    'name': 0.4,
+    'domain': 0.25,
+    'location': 0.15,
+    'founded': 0.1,
+    'employees': 0.1,
+}
+# Check score thresholds for the reason labels: >= first is a match, >= second is partial
+REASON_THRESHOLDS = {
+    'name': (0.8, 0.5),
+    'domain': (1.0, 1.0),
+    'location': (1.0, 0.5),
+    'founded': (1.0, 0.5),
+    'employees': (0.67, 0.33),
+}
+_CITY_SEPARATORS = re.compile(r'[\W_]+')
+VERIFY_COLUMNS = ['verify_confidence', 'verify_reasons'] + [f'verify_{check}' for check in CHECK_WEIGHTS]
+
+
+def _hashing_vectorizer():
+    try:
+        from sklearn.feature_extraction.text import HashingVectorizer
+    except ImportError:
+        raise ImportError("Verification requires the 'scikit-learn' package (pip install scikit-learn)")
+    # Stateless, so scores do not depend on which other rows share the chunk
+    return HashingVectorizer(analyzer='char_wb', ngram_range=(3, 3), n_features=2 ** 20,
+                             alternate_sign=False, norm='l2', dtype=np.float32)
+
+
+def on_distinct(normalize, values):
+    """Apply a column-wise normalizer to the distinct values only and expand back to rows."""
+    codes, distinct = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+    return pd.Series(np.asarray(normalize(pd.Series(distinct, dtype=object)), dtype=object).take(codes))
+
+
+def name_similarity(left, right):
+    """Row-wise cosine similarity of character 3-grams; NaN where either name is blank."""
+    left = on_distinct(normalize_name, left).to_numpy()
+    right = on_distinct(normalize_name, right).to_numpy()
+    scores = (left == right).astype(float)
+    # Only names that differ after normalization need their n-grams compared
+    differ = np.flatnonzero(left != right)
+    if len(differ):
+        codes, distinct = pd.factorize(np.concatenate([left[differ], right[differ]]))
+        matrix = _hashing_vectorizer().transform(distinct).tocsr()
+        n = len(differ)
+        similarity = np.asarray(matrix[codes[:n]].multiply(matrix[codes[n:]]).sum(axis=1)).ravel()
+        scores[differ] = np.minimum(similarity, 1.0)
+    return np.where((left == '') | (right == ''), np.nan, scores)
+
+
+def equality(left, right):
+    """1.0 where both sides are equal, 0.0 where they differ, NaN where either is blank."""
+    left, right = np.asarray(left, dtype=object), np.asarray(right, dtype=object)
+    return np.where((left == '') | (right == ''), np.nan, (left == right).astype(float))
+
+
+def normalize_city(cities):
+    """Casefold and reduce punctuation and whitespace runs to single spaces ('St. Louis ' -> 'st louis')."""
+    # Python's re, not the Arrow string engine, so accented letters count as word characters
+    return pd.Series([_CITY_SEPARATORS.sub(' ', str(city).casefold()).strip() if pd.notna(city) else ''
+                      for city in cities], dtype=object)
+
+
+def location_agreement(country_left, country_right, city_left, city_right):
+    """Country and city agreement averaged over whichever of the two both sides have."""
+    country = equality(on_distinct(normalize_country, country_left), on_distinct(normalize_country, country_right))
+    city = equality(on_distinct(normalize_city, city_left), on_distinct(normalize_city, city_right))
+    both = np.vstack([country, city])
+    present = (~np.isnan(both)).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(present > 0, np.nansum(both, axis=0) / present, np.nan)
+
+
+def founding_year(values):
+    def parse(distinct):
+        years = distinct.fillna('').astype(str).str.extract(r'((?:1[6-9]|20)\d\d)')[0]
+        return pd.to_numeric(years, errors='coerce')
+    return on_distinct(parse, values).to_numpy(dtype=float)
+
+
+def year_agreement(left, right):
+    """1.0 for the same year, 0.5 one year apart, 0.0 otherwise."""
+    gap = np.abs(founding_year(left) - founding_year(right))
+    return np.where(np.isnan(gap), np.nan, np.select([gap == 0, gap <= 1], [1.0, 0.5], 0.0))
+
+
+def employee_ratio(left, right):
+    """Smaller over larger employee count, so 1.0 is identical and 0.1 is a 10x gap."""
+    left = pd.to_numeric(pd.Series(left, dtype=object), errors='coerce').to_numpy(dtype=float)
+    right = pd.to_numeric(pd.Series(right, dtype=object), errors='coerce').to_numpy(dtype=float)
+    valid = (left > 0) & (right > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = np.minimum(left, right) / np.maximum(left, right)
+    return np.where(valid, ratio, np.nan)
+
+
+def _side_values(frame, prefix, fields, field):
+    if not fields.get(field):
+        return pd.Series('', index=frame.index, dtype=object)
+    return frame[prefix + fields[field]]
+
+
+def _reason_labels(check, scores):
+    match_at, partial_at = REASON_THRESHOLDS[check]
+    labels = np.select([np.isnan(scores), scores >= match_at, scores >= partial_at],
+                       [f'{check}_missing', f'{check}_match', f'{check}_partial'], f'{check}_mismatch')
+    return pd.Series(labels, dtype=object)
+
+
+def verify_pairs(frame, left_prefix='pb_', right_prefix='bq_', left_overrides=None, right_overrides=None):
+    """
+    Score each row of a joined frame whose two sides are prefixed left_prefix/right_prefix.
+    Returns a frame aligned to frame's index with VERIFY_COLUMNS: the confidence (NaN when no
+    check has data on both sides), the reason vector and each check's score.
+    """
+    def side_fields(prefix, overrides):
+        columns = [col[len(prefix):] for col in frame.columns if col.startswith(prefix)]
+        return resolve_match_fields(columns, overrides, VERIFY_FIELD_CANDIDATES, required=())
+    left_fields = side_fields(left_prefix, left_overrides)
+    right_fields = side_fields(right_prefix, right_overrides)
+
+    def values(field):
+        return (_side_values(frame, left_prefix, left_fields, field),
+                _side_values(frame, right_prefix, right_fields, field))
+
+    name_left, name_right = values('name')
+    domain_left, domain_right = values('domain')
+    country_left, country_right = values('country')
+    city_left, city_right = values('city')
+    checks = {
+        'name': name_similarity(name_left, name_right),
+        'domain': equality(on_distinct(normalize_domain, domain_left), on_distinct(normalize_domain, domain_right)),
+        'location': location_agreement(country_left, country_right, city_left, city_right),
+        'founded': year_agreement(*values('founded')),
+        'employees': employee_ratio(*values('employees')),
+    }
+
+    weighted = np.zeros(len(frame))
+    total_weight = np.zeros(len(frame))
+    for check, weight in CHECK_WEIGHTS.items():
+        present = ~np.isnan(checks[check])
+        weighted += np.where(present, checks[check], 0.0) * weight
+        total_weight += present * weight
+    labels = [_reason_labels(check, checks[check]) for check in CHECK_WEIGHTS]
+    reasons = labels[0]
+    for label in labels[1:]:
+        reasons = reasons + '|' + label
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        confidence = np.where(total_weight > 0, weighted / total_weight, np.nan)
+    result = pd.DataFrame({'verify_confidence': np.round(confidence, 4),
+                           'verify_reasons': reasons.to_numpy()}, index=frame.index)
+    for check in CHECK_WEIGHTS:
+        result[f'verify_{check}'] = np.round(checks[check], 4)
+    return result
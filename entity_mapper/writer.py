@@ -0,0 +1,225 @@
+"""
+Output Writer
+-------------
+Writes joined chunks to disk as they arrive. The format follows the output
+file name: .csv, .csv.gz, .csv.zst or .parquet (one row group per chunk).
+Everything is written to a temp file in the target directory and renamed
+into place on success, so a crash never leaves a half-written output file.
+
+Parquet chunks needn't agree on column types: a column that is all-null in
+one chunk, or integer in one and float in the next, is widened to a type
+every chunk fits (null -> the other type, int -> float, otherwise string),
+and row groups already written are rewritten in the wider type.
+"""
+
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+import pandas as pd
+from entity_mapper.report import stage
+
+CSV = 'csv'
+PARQUET = 'parquet'
+
+
+def detect_format(output_path):
+    """Return (format, compression) for an output path based on its extension."""
+    name = os.path.basename(output_path).lower()
+    if name.endswith('.parquet') or name.endswith('.pq'):
+        return PARQUET, None
+    if name.endswith('.gz'):
+        return CSV, 'gzip'
+    if name.endswith('.zst') or name.endswith('.zstd'):
+        return CSV, 'zstd'
+    return CSV, None
+
+
+def _open_text(path, compression):
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Writing .zst output requires the 'zstandard' package (pip install zstandard)")
+        return zstandard.open(path, 'wt', encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+def _parquet_ready(chunk):
+    # Object columns mix "" fillers with numbers; store them as nullable strings
+    chunk = chunk.copy()
+    for col_idx in range(chunk.shape[1]):
+        values = chunk.iloc[:, col_idx]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Each chunk has its own categories, so store the plain values
+            values = values.astype(object).where(values.notna(), None)
+        if values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+            chunk.isetitem(col_idx, values.astype(str).astype(object).where(values.notna(), None))
+    return chunk
+
+
+def _widen(current, new):
+    """A type that holds a column's values from both chunks: null takes the other type, ints widen to float."""
+    import pyarrow as pa
+    if current == new or pa.types.is_null(new):
+        return current
+    if pa.types.is_null(current):
+        return new
+    try:
+        merged = pa.unify_schemas([pa.schema([('value', current)]), pa.schema([('value', new)])],
+                                  promote_options='permissive')
+        return merged.field('value').type
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+        # Incompatible kinds (or a pyarrow without type promotion): fall back to text
+        return pa.string()
+
+
+class ChunkWriter:
+    """
+    Incremental, atomic writer for joined chunks. The first chunk fixes the
+    column header; later chunks are reindexed to it.
+
+        with ChunkWriter(output_path) as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+    """
+
+    def __init__(self, output_path, file_format=None, compression=None):
+        detected_format, detected_compression = detect_format(output_path)
+        self.output_path = output_path
+        self.file_format = file_format or detected_format
+        self.compression = compression if compression is not None else detected_compression
+        self.columns = None
+        self.rows_written = 0
+        directory = os.path.dirname(os.path.abspath(output_path))
+        fd, self.temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(output_path)}.", suffix='.tmp',
+                                              dir=directory)
+        os.close(fd)
+        self._handle = None
+        self._parquet_writer = None
+        self._schema = None
+
+    def write(self, chunk):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        else:
+            chunk = chunk.reindex(columns=self.columns)
+        if self.file_format == PARQUET:
+            self._write_parquet(chunk)
+        else:
+            self._write_csv(chunk)
+        self.rows_written += len(chunk)
+
+    def _write_csv(self, chunk):
+        header = self._handle is None
+        if header:
+            self._handle = _open_text(self.temp_path, self.compression)
+        chunk.to_csv(self._handle, index=False, header=header)
+
+    def copy_csv(self, source, columns, rows):
+        """
+        Append CSV rows already serialized in this writer's layout (an open text file
+        positioned after its header), without parsing them. The first call fixes the columns.
+        """
+        if self.columns is None:
+            self.columns = list(columns)
+        elif list(columns) != self.columns:
+            raise ValueError(f"CSV columns {list(columns)} don't match the output's {self.columns}")
+        if self._handle is None:
+            self._handle = _open_text(self.temp_path, self.compression)
+            pd.DataFrame(columns=self.columns).to_csv(self._handle, index=False)
+        shutil.copyfileobj(source, self._handle, 1 << 20)
+        self.rows_written += rows
+
+    def _open_parquet(self, schema, path):
+        import pyarrow.parquet as pq
+        self._schema = schema
+        self._parquet_writer = pq.ParquetWriter(path, schema, compression=self.compression or 'snappy')
+
+    def _widen_parquet(self, schema):
+        """Rewrite the row groups written so far in the widened schema and continue in it."""
+        import pyarrow.parquet as pq
+        self._parquet_writer.close()
+        written = pq.ParquetFile(self.temp_path)
+        fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(self.output_path)}.", suffix='.tmp',
+                                         dir=os.path.dirname(self.temp_path))
+        os.close(fd)
+        # The first chunk's pandas dtype hints no longer hold for the widened columns
+        self._open_parquet(schema.remove_metadata(), temp_path)
+        for group in range(written.num_row_groups):
+            table = written.read_row_group(group)
+            self._parquet_writer.write_table(table.cast(self._schema), row_group_size=max(table.num_rows, 1))
+        written.close()
+        os.remove(self.temp_path)
+        self.temp_path = temp_path
+
+    def _write_parquet(self, chunk):
+        import pyarrow as pa
+        table = pa.Table.from_pandas(_parquet_ready(chunk), preserve_index=False)
+        if self._parquet_writer is None:
+            self._open_parquet(table.schema, self.temp_path)
+        else:
+            widened = pa.schema([field.with_type(_widen(field.type, new_field.type))
+                                 for field, new_field in zip(self._schema, table.schema)])
+            if [field.type for field in widened] != [field.type for field in self._schema]:
+                logging.debug(f"Widening Parquet columns to fit chunk {self.rows_written}+: "
+                              + ", ".join(f"{old.name} {old.type} -> {new.type}"
+                                          for old, new in zip(self._schema, widened) if old.type != new.type))
+                self._widen_parquet(widened)
+            table = table.cast(self._schema)
+        self._parquet_writer.write_table(table, row_group_size=max(len(chunk), 1))
+
+    def close(self):
+        """Finish the file and atomically move it to output_path."""
+        if self.columns is None:
+            # No chunks at all: still produce a valid, empty output
+            self.columns = []
+            self.write(pd.DataFrame())
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        # mkstemp creates the file as 0600; give the output the usual umask-based permissions
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(self.temp_path, 0o666 & ~umask)
+        os.replace(self.temp_path, self.output_path)
+        logging.debug(f"Wrote {self.rows_written} rows and {len(self.columns)} columns to {self.output_path}")
+
+    def abort(self):
+        """Discard the partial temp file, leaving any previous output untouched."""
+        for resource in (self._handle, self._parquet_writer):
+            if resource is not None:
+                try:
+                    resource.close()
+                except Exception:
+                    pass
+        self._handle = None
+        self._parquet_writer = None
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def write_chunks(chunks, output_path, file_format=None, compression=None):
+    """Write an iterable of DataFrame chunks to output_path. Returns (rows_written, columns)."""
+    with ChunkWriter(output_path, file_format=file_format, compression=compression) as writer:
+        for chunk in chunks:
+            with stage('write') as timed:
+                writer.write(chunk)
+                timed.add(rows_in=len(chunk), rows_out=len(chunk))
+    return writer.rows_written, writer.columns
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+from entity_mapper.cache import TableCache, fetch_through_cache
+
+TABLE = 'PROD.VOLDEMORT.VOLDEMORT_FIRMOGRAPHICS'
+
+
+class FakeTable:
+    """Rows keyed by ID with an UPDATED watermark; records every fetch_rows call."""
+
+    def __init__(self, rows):
+        self.rows = pd.DataFrame(rows, columns=['ID', 'NAME', 'UPDATED'])
+        self.calls = []
+
+    def __call__(self, ids, since=None):
+        self.calls.append((sorted(ids), since))
+        rows = self.rows[self.rows['ID'].isin(ids)]
+        if since is not None:
+            rows = rows[rows['UPDATED'] > since]
+        return rows.reset_index(drop=True)
+
+
+def _fetch(cache, table, ids):
+    rows = fetch_through_cache(cache, TABLE, 'ID', ids, table, watermark_col='UPDATED')
+    return sorted(map(tuple, rows[['ID', 'NAME']].astype(str).to_numpy().tolist()))
+
+
+@pytest.fixture
+def table():
+    return FakeTable([('1', 'one', 10), ('2', 'two', 20), ('2', 'two b', 5), ('3', 'three', 30)])
+
+
+def test_fresh_ids_come_from_the_cache(tmp_path, table):
+    cache = TableCache(str(tmp_path))
+    first = _fetch(cache, table, ['1', '2', '4'])
+    assert _fetch(cache, table, ['1', '2', '4']) == first
+    assert table.calls == [(['1', '2', '4'], None)]
+
+
+def test_stale_ids_fetch_the_changes_since_the_oldest_watermark(tmp_path, table):
+    _fetch(TableCache(str(tmp_path)), table, ['1', '3'])
+    stale = TableCache(str(tmp_path), ttl_seconds=-1)
+    assert _fetch(stale, table, ['1', '3']) == [('1', 'one'), ('3', 'three')]
+    # ID 1 is unchanged since 10 and keeps its cached row; ID 3 is past it and is fetched again
+    assert table.calls[1:] == [(['1', '3'], 10), (['3'], None)]
+
+
+def test_changed_ids_are_refetched_in_full(tmp_path, table):
+    table.rows.loc[0, 'UPDATED'] = 1
+    _fetch(TableCache(str(tmp_path)), table, ['1', '2'])
+    # One of ID 2's two rows changes: the delta holds only that row, the output needs both
+    table.rows.loc[1, ['NAME', 'UPDATED']] = ['two changed', 40]
+    stale = TableCache(str(tmp_path), ttl_seconds=-1)
+    assert _fetch(stale, table, ['1', '2']) == [('1', 'one'), ('2', 'two b'), ('2', 'two changed')]
+    assert table.calls[1:] == [(['1', '2'], 1), (['2'], None)]
+    # The refetched rows replaced the cached ones
+    assert _fetch(TableCache(str(tmp_path)), table, ['2']) == [('2', 'two b'), ('2', 'two changed')]
+
+
+def test_ids_without_a_cached_watermark_get_a_full_fetch(tmp_path, table):
+    table.rows.loc[0, 'UPDATED'] = None
+    _fetch(TableCache(str(tmp_path)), table, ['1', '3', '4'])
+    stale = TableCache(str(tmp_path), ttl_seconds=-1)
+    assert _fetch(stale, table, ['1', '3', '4']) == [('1', 'one'), ('3', 'three')]
+    assert table.calls[1:] == [(['3'], 30), (['1', '4'], None)]
+
+
+def test_without_a_cache_every_id_is_fetched(table):
+    assert fetch_through_cache(None, TABLE, 'ID', [1, '1', 3], table)['NAME'].tolist() == ['one', 'three']
+    assert table.calls == [(['1', '3'], None)]
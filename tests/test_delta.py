@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from entity_mapper.delta import CrosswalkDelta, PairKeys, iter_kept_rows, pair_hashes, pair_keys
+
+
+def _crosswalk(pairs):
+    return pd.DataFrame(pairs, columns=['PITCHBOOK_ID', 'BQ_ID'])
+
+
+def test_pair_keys_match_the_output_ids():
+    pairs = pair_keys(_crosswalk([('1-1', "'007'"), (None, '8')]))
+    assert pairs.to_dict('list') == {'pitchbook_id': ['1-1', ''], 'bq_id': ['007', '8']}
+
+
+def test_pair_hashes_compare_ids_as_text():
+    as_text = pd.DataFrame({'pitchbook_id': ['1', ''], 'bq_id': ['7', '8']})
+    as_values = pd.DataFrame({'pitchbook_id': pd.Series([1, None], dtype=object), 'bq_id': [7, 8]})
+    assert (pair_hashes(as_text) == pair_hashes(as_values)).all()
+    assert pair_hashes(as_text)[0] != pair_hashes(pd.DataFrame({'pitchbook_id': ['7'], 'bq_id': ['1']}))[0]
+
+
+def test_pair_keys_keep_repeated_pairs_distinct_across_chunks():
+    keys = PairKeys()
+    pair = pd.DataFrame({'pitchbook_id': ['1', '1'], 'bq_id': ['7', '7']})
+    first, second = keys(pair), keys(pair.iloc[:1])
+    hashes = np.concatenate([first, second])
+    assert len(set(hashes.tolist())) == 3
+    # The same sequence split into other chunks gets the same keys
+    assert (PairKeys()(pd.concat([pair, pair.iloc[:1]])) == hashes).all()
+
+
+def test_crosswalk_delta_added_and_removed():
+    previous = pd.DataFrame({'pitchbook_id': ['1', '2', '2'], 'bq_id': ['7', '8', '8']})
+    delta = CrosswalkDelta(previous)
+    first = delta.new_pairs(_crosswalk([('1', '7'), ('2', '8')]))
+    second = delta.new_pairs(_crosswalk([('3', '9')]))
+    assert first.empty
+    assert second['PITCHBOOK_ID'].tolist() == ['3']
+    assert (delta.added, delta.unchanged) == (1, 2)
+    # One of the two ('2', '8') copies is gone
+    assert delta.removed_pairs().to_dict('list') == {'pitchbook_id': ['2'], 'bq_id': ['8']}
+    assert len(delta.current_pairs()) == 3
+
+
+def test_crosswalk_delta_without_previous_pairs_collects_the_snapshot():
+    delta = CrosswalkDelta()
+    chunk = _crosswalk([('1', '7')])
+    assert delta.new_pairs(chunk) is chunk
+    assert delta.added == 1
+    assert delta.current_pairs().to_dict('list') == {'pitchbook_id': ['1'], 'bq_id': ['7']}
+
+
+def test_iter_kept_rows_drops_removed_pairs(tmp_path):
+    output = tmp_path / 'crosswalk.csv'
+    previous = pd.DataFrame({'pitchbook_id': ['1', '2', '2'], 'bq_id': ['7', '8', '8'], 'pb_NAME': ['a', 'b', 'c']})
+    previous.to_csv(output, index=False)
+    delta = CrosswalkDelta(previous[['pitchbook_id', 'bq_id']])
+    delta.new_pairs(_crosswalk([('2', '8'), ('1', '7')]))
+    kept = pd.concat(iter_kept_rows(str(output), delta.removed_keys(), chunk_rows=2))
+    assert kept['pb_NAME'].tolist() == ['a', 'b']
@@ -0,0 +1,47 @@
+"""Whole runs against the local Snowflake stand-in (benchmarks/standin.py)."""
+
+import csv
+import io
+
+import pytest
+
+from entity_mapper.cli import main
+
+pytest.importorskip('duckdb')
+from benchmarks import standin  # noqa: E402
+
+ROWS = 200
+
+
+@pytest.fixture(scope='module')
+def connect(tmp_path_factory):
+    path = standin.build_database(str(tmp_path_factory.mktemp('standin') / 'standin.duckdb'), ROWS,
+                                  backend=standin.DUCKDB, filler_columns=2)
+    return standin.connector(path, standin.DUCKDB)
+
+
+def _crosswalk(connect, tmp_path, name, *args):
+    output = tmp_path / name
+    assert main(['crosswalk', '-o', str(output), '--log-file', '', '--cache-dir', '', *args], connect=connect) == 0
+    return output.read_text()
+
+
+def test_crosswalk_output(connect, tmp_path):
+    rows = list(csv.DictReader(io.StringIO(_crosswalk(connect, tmp_path, 'pandas.csv'))))
+    assert len(rows) == ROWS
+    assert list(rows[0])[:2] == ['pitchbook_id', 'pb_COMPANY_NAME']
+    by_bq_id = {row['bq_id']: row for row in rows}
+    assert by_bq_id['3']['bq_NAME'] == 'COMPANY 3 Health'
+    # Zero-padded BQ_IDs still find their Voldemort row; dangling ones stay empty
+    assert by_bq_id['0010']['bq_NAME'] == 'COMPANY 10 Labs'
+    assert by_bq_id[str(1 + ROWS * 2)]['bq_NAME'] == ''
+
+
+@pytest.mark.parametrize('args', [
+    ['--join-backend', 'duckdb'],
+    ['--server-join'],
+    ['--stream', '--chunk-rows', '64'],
+])
+def test_crosswalk_modes_match_the_pandas_join(connect, tmp_path, args):
+    expected = _crosswalk(connect, tmp_path, 'pandas.csv')
+    assert _crosswalk(connect, tmp_path, 'other.csv', *args) == expected
@@ -0,0 +1,19 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('sklearn')
+from entity_mapper import fuzzy  # noqa: E402
+
+
+def _frame(ids, domains):
+    return pd.DataFrame({'id': ids, 'name': [f'Company {i}' for i in ids], 'domain': domains,
+                         'country': 'US'})
+
+
+def test_oversized_domain_blocks_are_skipped(monkeypatch, caplog):
+    queries = fuzzy.prepare(_frame(['q1', 'q2', 'q3'], ['linkedin.com', 'linkedin.com', 'acme.com']))
+    candidates = fuzzy.prepare(_frame(['c1', 'c2', 'c3'], ['linkedin.com', 'linkedin.com', 'acme.com']))
+    monkeypatch.setattr(fuzzy, 'MAX_BLOCK_CELLS', 3)
+    pairs = fuzzy._domain_pairs(queries, candidates)
+    assert pairs.values.tolist() == [[2, 2]]
+    assert 'linkedin.com (4)' in caplog.text
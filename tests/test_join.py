@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from entity_mapper.join import (AGGREGATE, AGGREGATE_SEPARATOR, ALL, BQ_ID_RULES, ERROR, EXACT, FIRST,
+                                INT_CANONICAL, LAST, LATEST, LSTRIP_ZEROS, DuplicateKeyError, FanoutError,
+                                KeyIndex, dedup_by_key, fan_out, key_variants, left_join_prefixed,
+                                normalize_keys, parse_dedup_policy)
+
+
+def _rules(rule_hit):
+    return [None if pd.isna(rule) else rule for rule in rule_hit]
+
+
+def test_normalize_keys():
+    keys = ['007', '7', '000', 'A01', '']
+    assert normalize_keys(keys, EXACT).tolist() == keys
+    assert normalize_keys(keys, LSTRIP_ZEROS).tolist() == ['7', '7', '', 'A01', '']
+    assert normalize_keys(keys, INT_CANONICAL).tolist() == ['7', '7', '0', None, None]
+    with pytest.raises(ValueError):
+        normalize_keys(keys, 'upper')
+
+
+def test_key_variants_lists_every_usable_form_once():
+    assert key_variants(['007', '7', '000', '']) == ['007', '7', '000', '0']
+
+
+@pytest.mark.parametrize('side_key', ['7', '007', '0007'])
+def test_key_index_meets_zero_padding_on_either_side(side_key):
+    side = pd.DataFrame({'BQ_ID': [side_key], 'NAME': ['Acme']})
+    keys = ['7', '007', '0007', '8']
+    positions, rules = KeyIndex(side, 'BQ_ID', rules=BQ_ID_RULES).match(keys)
+    assert positions.tolist() == [0, 0, 0, -1]
+    assert _rules(rules) == [EXACT if key == side_key else LSTRIP_ZEROS for key in keys[:3]] + [None]
+
+
+def test_key_index_prefers_the_key_already_in_normalized_form():
+    side = pd.DataFrame({'BQ_ID': ['7', '007'], 'NAME': ['plain', 'padded']})
+    index = KeyIndex(side, 'BQ_ID', rules=BQ_ID_RULES)
+    positions, rules = index.match(['0007', '000', '00'])
+    assert index.keys_at(positions).tolist() == ['7', None, None]
+    assert _rules(rules) == [LSTRIP_ZEROS, None, None]
+
+
+def test_key_index_all_zero_ids_meet_at_zero():
+    side = pd.DataFrame({'BQ_ID': ['0'], 'NAME': ['zero']})
+    positions, rules = KeyIndex(side, 'BQ_ID', rules=BQ_ID_RULES).match(['000'])
+    assert positions.tolist() == [0]
+    assert rules.tolist() == [INT_CANONICAL]
+
+
+def test_key_index_strip():
+    side = pd.DataFrame({'BQ_ID': [' 7 '], 'NAME': ['Acme']})
+    positions, _ = KeyIndex(side, 'BQ_ID', strip=True).match(['7 '])
+    assert positions.tolist() == [0]
+
+
+def test_parse_dedup_policy():
+    assert parse_dedup_policy('Last') == (LAST, None)
+    assert parse_dedup_policy('latest: UPDATED_AT') == (LATEST, 'UPDATED_AT')
+    for value in ('latest', 'first:UPDATED_AT', 'newest'):
+        with pytest.raises(ValueError):
+            parse_dedup_policy(value)
+
+
+@pytest.fixture
+def duplicated():
+    return pd.DataFrame({'ID': ['1', '2', '1', '3', '1'],
+                         'NAME': ['a', 'b', 'c', 'd', 'a'],
+                         'UPDATED': [3, 1, 5, 2, None]})
+
+
+@pytest.mark.parametrize('policy, column, names', [
+    (FIRST, None, ['a', 'b', 'd']),
+    (LAST, None, ['b', 'd', 'a']),
+    (LATEST, 'UPDATED', ['b', 'c', 'd']),
+])
+def test_dedup_keeps_one_row_per_key_in_fetch_order(duplicated, policy, column, names):
+    assert dedup_by_key(duplicated, 'ID', policy, column)['NAME'].tolist() == names
+
+
+def test_dedup_aggregate_joins_distinct_values_at_the_first_row(duplicated):
+    deduped = dedup_by_key(duplicated, 'ID', AGGREGATE)
+    assert deduped['ID'].tolist() == ['1', '2', '3']
+    assert deduped['NAME'].tolist() == [f'a{AGGREGATE_SEPARATOR}c', 'b', 'd']
+
+
+def test_dedup_error_and_all(duplicated):
+    with pytest.raises(DuplicateKeyError, match='1 ID values'):
+        dedup_by_key(duplicated, 'ID', ERROR)
+    assert dedup_by_key(duplicated, 'ID', ALL) is duplicated
+    unique = duplicated.drop_duplicates('ID')
+    assert dedup_by_key(unique, 'ID', ERROR) is unique
+
+
+def test_dedup_latest_needs_the_column(duplicated):
+    with pytest.raises(ValueError, match='MISSING'):
+        dedup_by_key(duplicated, 'ID', LATEST, 'MISSING')
+
+
+def test_fan_out_expands_duplicate_keys(duplicated):
+    index = KeyIndex(duplicated, 'ID')
+    positions, _ = index.match(['1', '9', '3'])
+    rows, side_positions = fan_out(duplicated, 'ID', index, positions)
+    assert rows.tolist() == [0, 0, 0, 1, 2]
+    assert side_positions.tolist() == [0, 2, 4, -1, 3]
+
+
+def test_fan_out_budget(duplicated):
+    index = KeyIndex(duplicated, 'ID')
+    positions, _ = index.match(['1', '1'])
+    assert len(fan_out(duplicated, 'ID', index, positions, max_rows=6)[0]) == 6
+    with pytest.raises(FanoutError, match='out to 6'):
+        fan_out(duplicated, 'ID', index, positions, max_rows=5)
+
+
+def test_fan_out_without_duplicates_among_matches(duplicated):
+    index = KeyIndex(duplicated, 'ID')
+    positions, _ = index.match(['2', '3'])
+    assert fan_out(duplicated, 'ID', index, positions) is None
+    assert fan_out(duplicated.drop_duplicates('ID'), 'ID', index, positions) is None
+
+
+def test_left_join_prefixed(duplicated):
+    keys = pd.Series(['3', '9', '1'], index=[10, 11, 12])
+    joined, rules = left_join_prefixed(keys, duplicated, 'ID', 'pb_')
+    assert joined.index.tolist() == [10, 11, 12]
+    assert joined['pb_NAME'].tolist() == ['d', '', 'a']
+    assert _rules(rules) == [EXACT, None, EXACT]
+
+    joined, _ = left_join_prefixed(keys, duplicated, 'ID', 'pb_', duplicates=ALL)
+    assert joined.index.tolist() == [10, 11, 12, 12, 12]
+    assert joined['pb_NAME'].tolist() == ['d', '', 'a', 'c', 'a']
+
+    joined, _ = left_join_prefixed(keys, duplicated, 'ID', 'pb_', fill_value=None)
+    assert np.isnan(joined['pb_UPDATED'].iloc[1])
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from entity_mapper.join import ALL, BQ_ID_RULES, EXACT, LAST, FanoutError, as_key, left_join_prefixed
+
+pytest.importorskip('duckdb')
+from entity_mapper.outofcore import DuckDBJoin  # noqa: E402
+
+BASE = pd.DataFrame({'pitchbook_id': ['1', '2', '3', '4'], 'bq_id': ['007', '8', '0', '9']})
+PITCHBOOK = pd.DataFrame({'COMPANY_ID': ['1', '2', '2', '3'], 'NAME': ['a', 'b', 'b2', None],
+                          'EMPLOYEES': [10, 20, 21, 30]})
+VOLDEMORT = pd.DataFrame({'BQ_ID': ['7', ' 8 ', '000', '9'], 'DOMAIN': ['a.com', 'b.com', 'zero.com', None]})
+
+
+def _pandas_csv(duplicates):
+    joined = BASE
+    for key, side, side_key, prefix, strip, rules in (
+            ('pitchbook_id', PITCHBOOK, 'COMPANY_ID', 'pb_', False, (EXACT,)),
+            ('bq_id', VOLDEMORT, 'BQ_ID', 'vd_', True, BQ_ID_RULES)):
+        side_joined, _ = left_join_prefixed(as_key(joined[key]), side, side_key, prefix, strip=strip, rules=rules,
+                                            duplicates=duplicates)
+        joined = pd.concat([joined.loc[side_joined.index], side_joined], axis=1).reset_index(drop=True)
+    return joined.to_csv(index=False)
+
+
+def _duckdb_csv(duplicates, max_rows=None):
+    join = DuckDBJoin(BASE)
+    join.add_side(as_key(join.base['pitchbook_id']), PITCHBOOK, 'COMPANY_ID', 'pb_', duplicates=duplicates,
+                  max_rows=max_rows)
+    join.add_side(as_key(join.base['bq_id']), VOLDEMORT, 'BQ_ID', 'vd_', strip=True, rules=BQ_ID_RULES,
+                  duplicates=duplicates, max_rows=max_rows)
+    return pd.concat(join.iter_frames(chunk_rows=2), ignore_index=True).to_csv(index=False)
+
+
+@pytest.mark.parametrize('duplicates', [LAST, ALL])
+def test_duckdb_join_matches_the_pandas_join(duplicates):
+    assert _duckdb_csv(duplicates) == _pandas_csv(duplicates)
+
+
+def test_duckdb_join_fan_out_budget():
+    with pytest.raises(FanoutError):
+        _duckdb_csv(ALL, max_rows=len(BASE))
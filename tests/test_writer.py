@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from entity_mapper.writer import CSV, PARQUET, ChunkWriter, detect_format, write_chunks
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def test_detect_format():
+    assert detect_format('out.PARQUET') == (PARQUET, None)
+    assert detect_format('out.csv.gz') == (CSV, 'gzip')
+    assert detect_format('out.csv') == (CSV, None)
+
+
+def test_parquet_widens_a_null_column_to_the_later_type(tmp_path):
+    path = str(tmp_path / 'out.parquet')
+    write_chunks([pd.DataFrame({'id': ['1'], 'name': [None]}),
+                  pd.DataFrame({'id': ['2'], 'name': ['Acme']})], path)
+    table = pq.read_table(path)
+    assert table.schema.field('name').type == pa.string()
+    assert table.column('name').to_pylist() == [None, 'Acme']
+    assert pq.ParquetFile(path).num_row_groups == 2
+
+
+def test_parquet_widens_ints_to_floats(tmp_path):
+    path = str(tmp_path / 'out.parquet')
+    write_chunks([pd.DataFrame({'employees': pd.array([5, None], dtype='Int64')}),
+                  pd.DataFrame({'employees': pd.array([2.5], dtype='Float64')})], path)
+    table = pq.read_table(path)
+    assert pa.types.is_floating(table.schema.field('employees').type)
+    assert table.column('employees').to_pylist() == [5.0, None, 2.5]
+
+
+def test_parquet_falls_back_to_text_for_incompatible_types(tmp_path):
+    path = str(tmp_path / 'out.parquet')
+    write_chunks([pd.DataFrame({'founded': [1999]}), pd.DataFrame({'founded': [pd.Timestamp('2001-01-01')]})],
+                 path)
+    assert pq.read_table(path).schema.field('founded').type == pa.string()
+
+
+def test_later_chunks_follow_the_first_chunk_header(tmp_path):
+    path = str(tmp_path / 'out.csv')
+    rows, columns = write_chunks([pd.DataFrame({'a': [1], 'b': [2]}), pd.DataFrame({'b': [4], 'c': [5]})], path)
+    assert (rows, columns) == (2, ['a', 'b'])
+    assert open(path).read().splitlines() == ['a,b', '1,2', ',4']
+
+
+def test_aborted_writes_leave_the_previous_output(tmp_path):
+    path = tmp_path / 'out.csv'
+    path.write_text('previous\n')
+    with pytest.raises(RuntimeError):
+        with ChunkWriter(str(path)) as writer:
+            writer.write(pd.DataFrame({'a': [1]}))
+            raise RuntimeError('fetch failed')
+    assert path.read_text() == 'previous\n'
+    assert [p.name for p in tmp_path.iterdir()] == ['out.csv']